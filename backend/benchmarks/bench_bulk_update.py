@@ -0,0 +1,62 @@
+"""
+Benchmark: changing the status of many leads, one PATCH per lead vs one bulk call.
+
+The per-lead path is ``patch_buyer`` followed by the history flush each
+request triggers when it finishes; the bulk path is ``bulk_patch_buyers``
+(what ``PATCH buyers/bulk/`` runs) plus one flush.
+
+    python -m benchmarks.bench_bulk_update --leads 500
+"""
+import argparse
+import itertools
+from contextlib import ExitStack
+
+from benchmarks.common import setup_django, bench_collection, seed_buyers, measure, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--leads', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from leads.models import Buyer, BuyerHistory, LeadRollup
+    from leads.bulk import bulk_patch_buyers
+    from leads.history import flush_history
+    from leads.updates import patch_buyer
+
+    with ExitStack() as stack:
+        for document in [Buyer, BuyerHistory, LeadRollup]:
+            stack.enter_context(bench_collection(document, f'{document._meta["collection"]}_bench'))
+        seed_buyers(Buyer, args.leads)
+        buyer_ids = [doc['_id'] for doc in Buyer._get_collection().find({}, {'_id': 1})]
+        # Alternate statuses so every run changes every lead
+        statuses = itertools.cycle(['qualified', 'contacted'])
+
+        def run_individual():
+            data = {'status': next(statuses)}
+            for buyer_id in buyer_ids:
+                patch_buyer(buyer_id, data, 'benchmark')
+                flush_history()
+
+        def run_bulk():
+            results = bulk_patch_buyers(buyer_ids, {'status': next(statuses)}, 'benchmark')
+            flush_history()
+            return results
+
+        individual_time, individual_cmds, _ = measure(run_individual, args.repeat)
+        bulk_time, bulk_cmds, results = measure(run_bulk, args.repeat)
+
+        print(f"--- {len(buyer_ids)} leads")
+        report('individual PATCHes', individual_time, individual_cmds)
+        report('one bulk PATCH', bulk_time, bulk_cmds)
+        print(f"updated {sum(result['status'] == 'updated' for result in results)} leads, "
+              f"speedup {individual_time / bulk_time:.1f}x")
+
+        for document in [Buyer, BuyerHistory, LeadRollup]:
+            document._get_collection().delete_many({})
+
+
+if __name__ == '__main__':
+    main()
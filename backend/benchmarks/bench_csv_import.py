@@ -0,0 +1,84 @@
+"""
+Benchmark: CSV import writes, per-row save() vs batched insert_many.
+
+    python -m benchmarks.bench_csv_import --sizes 200 10000 100000
+"""
+import argparse
+import random
+from contextlib import ExitStack
+
+from benchmarks.common import setup_django, bench_collection, make_buyer_doc, measure, report
+
+
+def make_entries(count, seed=7):
+    """Validated CSV entries as produced by ``validate_csv_row``"""
+    rng = random.Random(seed)
+    entries = []
+    for index in range(count):
+        doc = make_buyer_doc(rng)
+        for field in ['_id', 'owner_id', 'created_at', 'updated_at']:
+            doc.pop(field)
+        entries.append((index + 2, doc, {}))
+    return entries
+
+
+def legacy_import(entries, owner_id):
+    """The original write loop: save() plus a history save() per row"""
+    from leads.models import Buyer, BuyerHistory
+    from leads.rollups import record_created
+
+    saved = []
+    for _, buyer_data, _ in entries:
+        buyer = Buyer(owner_id=owner_id, **buyer_data)
+        buyer.save()
+        saved.append(buyer)
+        BuyerHistory(
+            buyer_id=buyer.id,
+            changed_by=owner_id,
+            diff={'action': 'imported_from_csv'}
+        ).save()
+    record_created(saved)
+    return [buyer.id for buyer in saved]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[200, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=1)
+    args = parser.parse_args()
+
+    setup_django()
+    from leads.models import Buyer, BuyerHistory, LeadRollup
+    from leads.tasks import bulk_create_buyers
+
+    with ExitStack() as stack:
+        for document in [Buyer, BuyerHistory, LeadRollup]:
+            stack.enter_context(bench_collection(document, f'{document._meta["collection"]}_bench'))
+
+        def reset():
+            for document in [Buyer, BuyerHistory, LeadRollup]:
+                document._get_collection().delete_many({})
+
+        for size in args.sizes:
+            entries = make_entries(size)
+
+            def run_legacy():
+                reset()
+                return legacy_import([(n, dict(data), row) for n, data, row in entries], 'benchmark')
+
+            def run_bulk():
+                reset()
+                return bulk_create_buyers([(n, dict(data), row) for n, data, row in entries], 'benchmark')
+
+            legacy_time, legacy_cmds, _ = measure(run_legacy, args.repeat)
+            bulk_time, bulk_cmds, _ = measure(run_bulk, args.repeat)
+
+            print(f"--- {size} rows")
+            report('per-row save()', legacy_time, legacy_cmds)
+            report('batched insert_many', bulk_time, bulk_cmds)
+            print(f"per row: {legacy_time / size * 1e6:.0f} us -> {bulk_time / size * 1e6:.0f} us")
+        reset()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark: dashboard stats via per-choice count() queries vs one $facet pipeline.
+
+    python -m benchmarks.bench_dashboard_stats --leads 100000
+"""
+import argparse
+from datetime import datetime, timedelta
+
+from benchmarks.common import setup_django, bench_collection, seed_buyers, measure, report
+
+
+def legacy_dashboard_stats(Buyer):
+    """The original count-per-choice implementation of ``dashboard_stats``"""
+    from mongoengine import Q
+
+    total_leads = Buyer.objects.count()
+
+    status_counts = {}
+    for status_code, status_name in Buyer.STATUS_CHOICES:
+        status_counts[status_code] = {
+            'name': status_name,
+            'count': Buyer.objects.filter(status=status_code).count()
+        }
+
+    city_counts = {}
+    for city_code, city_name in Buyer.CITY_CHOICES:
+        city_counts[city_code] = {
+            'name': city_name,
+            'count': Buyer.objects.filter(city=city_code).count()
+        }
+
+    property_counts = {}
+    for prop_code, prop_name in Buyer.PROPERTY_TYPE_CHOICES:
+        property_counts[prop_code] = {
+            'name': prop_name,
+            'count': Buyer.objects.filter(property_type=prop_code).count()
+        }
+
+    week_ago = datetime.utcnow() - timedelta(days=7)
+    recent_leads = Buyer.objects.filter(created_at__gte=week_ago).count()
+
+    buyers_with_budget = Buyer.objects.filter(Q(budget_min__gt=0) & Q(budget_max__gt=0))
+    if buyers_with_budget.count() > 0:
+        avg_budget_min = sum(b.budget_min for b in buyers_with_budget) / buyers_with_budget.count()
+        avg_budget_max = sum(b.budget_max for b in buyers_with_budget) / buyers_with_budget.count()
+    else:
+        avg_budget_min = avg_budget_max = 0
+
+    budget_ranges = {
+        'under_50L': buyers_with_budget.filter(budget_max__lt=5000000).count(),
+        '50L_1Cr': buyers_with_budget.filter(
+            Q(budget_min__gte=5000000) & Q(budget_max__lt=10000000)
+        ).count(),
+        '1Cr_2Cr': buyers_with_budget.filter(
+            Q(budget_min__gte=10000000) & Q(budget_max__lt=20000000)
+        ).count(),
+        'above_2Cr': buyers_with_budget.filter(budget_min__gte=20000000).count(),
+    }
+
+    qualified_converted = status_counts['qualified']['count'] + status_counts['converted']['count']
+    conversion_rate = (qualified_converted / total_leads * 100) if total_leads > 0 else 0
+
+    timeline_counts = {}
+    for timeline_code, timeline_name in Buyer.TIMELINE_CHOICES:
+        timeline_counts[timeline_code] = {
+            'name': timeline_name,
+            'count': Buyer.objects.filter(timeline=timeline_code).count()
+        }
+
+    return {
+        'total_leads': total_leads,
+        'recent_leads': recent_leads,
+        'conversion_rate': round(conversion_rate, 1),
+        'avg_budget_min': int(avg_budget_min),
+        'avg_budget_max': int(avg_budget_max),
+        'status_counts': status_counts,
+        'city_counts': city_counts,
+        'property_counts': property_counts,
+        'budget_ranges': budget_ranges,
+        'timeline_counts': timeline_counts,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--leads', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    setup_django()
+    from leads.models import Buyer
+    from leads.aggregations import BuyerSource, compute_dashboard_stats
+
+    with bench_collection(Buyer):
+        print(f"Seeding {args.leads} leads...")
+        seed_buyers(Buyer, args.leads)
+
+        legacy_time, legacy_cmds, legacy = measure(lambda: legacy_dashboard_stats(Buyer), args.repeat)
+        facet_time, facet_cmds, facet = measure(lambda: compute_dashboard_stats(source=BuyerSource()), args.repeat)
+
+        report('legacy count() per choice', legacy_time, legacy_cmds)
+        report('single $facet pipeline', facet_time, facet_cmds)
+        print(f"speedup: {legacy_time / facet_time:.1f}x, responses identical: {legacy == facet}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,67 @@
+"""
+Benchmark: insert throughput of the buyers collection under two index plans.
+
+``previous`` is the per-filter plan (one (filter, sort, _id) index per list
+filter and sort order, 15 indexes); ``current`` is the model's declared
+indexes. Leads are inserted with batched insert_many, as imports do.
+
+    python -m benchmarks.bench_index_writes --leads 50000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import setup_django, make_buyer_doc
+
+FILTER_FIELDS = ['city', 'property_type', 'status', 'timeline']
+
+
+def previous_plan():
+    """Index keys before the plan was trimmed"""
+    plan = [[('owner_id', 1)], [('created_at', 1)], [('phone_normalized', 1), ('updated_at', -1), ('_id', -1)]]
+    for sort_field in ['updated_at', 'created_at']:
+        sort = [(sort_field, -1), ('_id', -1)]
+        plan.append(sort)
+        plan.extend([(field, 1)] + sort for field in FILTER_FIELDS)
+    plan.append([('search_tokens', 1), ('updated_at', -1), ('_id', -1)])
+    return plan
+
+
+def current_plan(Buyer):
+    return [list(spec['fields']) for spec in Buyer._meta['index_specs'] if not spec.get('sparse')]
+
+
+def insert_rate(collection, keys, documents, batch_size):
+    collection.drop()
+    for key in keys:
+        collection.create_index(key)
+    collection.create_index([('email_normalized', 1)], sparse=True)
+    start = time.perf_counter()
+    for offset in range(0, len(documents), batch_size):
+        collection.insert_many(documents[offset:offset + batch_size], ordered=False)
+    elapsed = time.perf_counter() - start
+    collection.drop()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--leads', type=int, default=50000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    setup_django()
+    from leads.models import Buyer
+
+    rng = random.Random(11)
+    documents = [make_buyer_doc(rng) for _ in range(args.leads)]
+    collection = Buyer._get_collection().database['buyers_index_bench']
+
+    for name, keys in [('previous', previous_plan()), ('current', current_plan(Buyer))]:
+        # insert_many adds _id to the dicts; copy so both runs insert the same documents
+        elapsed = insert_rate(collection, keys, [dict(doc) for doc in documents], args.batch_size)
+        print(f"{name:<10} {len(keys) + 1:>3} indexes {elapsed:>8.2f} s {args.leads / elapsed:>10.0f} leads/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: buyer list serialization per 1000 leads, hydrated Buyer objects
+through BuyerSerializer vs raw documents through the compiled representation.
+
+Does not need MongoDB: both paths start from the raw documents a query
+would return, so hydration cost is included in the legacy path.
+
+    python -m benchmarks.bench_list_serialization --leads 10000
+"""
+import argparse
+import random
+import time
+
+from benchmarks.common import setup_django, make_buyer_doc
+
+
+def best_of(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--leads', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from rest_framework.renderers import JSONRenderer
+    from leads.models import Buyer
+    from leads.representation import buyer_representation
+    from leads.serializers import BuyerSerializer
+
+    rng = random.Random(42)
+    documents = [make_buyer_doc(rng) for _ in range(args.leads)]
+    represent, _ = buyer_representation()
+
+    def legacy():
+        return BuyerSerializer([Buyer._from_son(doc) for doc in documents], many=True).data
+
+    def raw():
+        return represent(documents)
+
+    legacy_time, expected = best_of(legacy, args.repeat)
+    raw_time, actual = best_of(raw, args.repeat)
+    assert JSONRenderer().render(actual) == JSONRenderer().render(expected)
+
+    per_thousand = 1000 / args.leads
+    print(f"{'Buyer + BuyerSerializer':<26} {legacy_time * per_thousand * 1000:>8.1f} ms / 1000 leads")
+    print(f"{'raw + compiled':<26} {raw_time * per_thousand * 1000:>8.1f} ms / 1000 leads"
+          f"  ({legacy_time / raw_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark: single-process CSV row validation, validate_csv_row vs the
+compiled CSVRowValidator (row by row and in batches).
+
+Does not need MongoDB.
+
+    python -m benchmarks.bench_row_validator --rows 100000 --batch-size 1000
+"""
+import argparse
+import time
+
+from benchmarks.bench_csv_validation import make_rows
+from benchmarks.common import setup_django
+
+
+def best_of(func, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    setup_django()
+    from leads.models import Buyer
+    from utils.validators import CSVRowValidator, validate_csv_row
+
+    rows = make_rows(args.rows)
+    validator = CSVRowValidator.from_document(Buyer)
+
+    def run_batches():
+        results = []
+        for start in range(0, len(rows), args.batch_size):
+            results.extend(validator.validate_batch(rows[start:start + args.batch_size]))
+        return results
+
+    legacy_time, expected = best_of(lambda: [validate_csv_row(row) for row in rows], args.repeat)
+    row_time, row_results = best_of(lambda: [validator.validate(row) for row in rows], args.repeat)
+    batch_time, batch_results = best_of(run_batches, args.repeat)
+    assert row_results == expected and batch_results == expected
+
+    for label, elapsed in [
+        ('validate_csv_row', legacy_time),
+        ('CSVRowValidator.validate', row_time),
+        ('validate_batch', batch_time),
+    ]:
+        print(f"{label:<26} {args.rows / elapsed:>12,.0f} rows/s  ({legacy_time / elapsed:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+"""
+Benchmark: buyer list search, triple icontains $or vs the search_tokens index.
+
+Each query is timed the way the list endpoint runs it: a count plus the
+first page of 10. docsExamined comes from explain().
+
+    python -m benchmarks.bench_search --leads 1000000
+"""
+import argparse
+
+from benchmarks.common import setup_django, bench_collection, seed_buyers, measure, report
+
+QUERIES = ['priya', 'priya sharma', 'sharma12', 'rahul.iyer', '98765', '+91 98765 4']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--leads', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--skip-seed', action='store_true', help='Reuse the existing scratch collection')
+    args = parser.parse_args()
+
+    setup_django()
+    from mongoengine.queryset.visitor import Q
+    from leads.models import Buyer
+    from leads.search import plan_search
+
+    with bench_collection(Buyer):
+        if not args.skip_seed:
+            print(f"Seeding {args.leads} leads...")
+            seed_buyers(Buyer, args.leads)
+        Buyer.ensure_indexes()
+
+        def run(query):
+            queryset = Buyer.objects.filter(query).order_by('-updated_at')
+            return queryset.count(), [doc['_id'] for doc in queryset.limit(10).as_pymongo()]
+
+        def examined(query):
+            stats = Buyer.objects.filter(query).order_by('-updated_at').explain()
+            return stats.get('executionStats', {}).get('totalDocsExamined')
+
+        for search in QUERIES:
+            legacy_query = Q(full_name__icontains=search) | Q(email__icontains=search) | Q(phone__icontains=search)
+            plan = plan_search(search)
+
+            legacy_time, legacy_cmds, (legacy_count, _) = measure(lambda: run(legacy_query), args.repeat)
+            token_time, token_cmds, (token_count, _) = measure(lambda: run(plan.query), args.repeat)
+
+            print(f"--- {search!r} ({plan.kind}: {plan.terms})")
+            report(f'icontains $or ({legacy_count} hits)', legacy_time, legacy_cmds)
+            report(f'search_tokens ({token_count} hits)', token_time, token_cmds)
+            print(f"docs examined: {examined(legacy_query)} -> {examined(plan.query)}, "
+                  f"speedup {legacy_time / token_time:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
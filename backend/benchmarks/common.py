@@ -0,0 +1,129 @@
+"""
+Shared helpers for the benchmark scripts.
+
+Benchmarks run against a scratch ``buyers_bench`` collection so they never
+touch real leads. Run them from the ``backend`` directory, e.g.::
+
+    python -m benchmarks.bench_dashboard_stats --leads 100000
+"""
+import os
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+from pymongo import monitoring
+
+BENCH_COLLECTION = 'buyers_bench'
+
+
+class CommandCounter(monitoring.CommandListener):
+    """Counts MongoDB commands (round-trips) issued by the client"""
+
+    def __init__(self):
+        self.count = 0
+
+    def started(self, event):
+        self.count += 1
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+    def reset(self):
+        self.count = 0
+
+
+command_counter = CommandCounter()
+
+
+def setup_django():
+    """Register the command counter and configure Django (in that order)"""
+    # Listeners must be registered before settings.py creates the client
+    monitoring.register(command_counter)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'buyer_leads.settings')
+    import django
+    django.setup()
+
+
+@contextmanager
+def bench_collection(document, name=BENCH_COLLECTION):
+    """Point ``document`` at a scratch collection for the duration of the block"""
+    from mongoengine.context_managers import switch_collection
+
+    with switch_collection(document, name) as cls:
+        yield cls
+
+
+def make_buyer_doc(rng, now=None):
+    """Build a raw ``buyers`` document with plausible random values"""
+    from leads.models import Buyer
+
+    now = now or datetime.utcnow()
+    property_type = rng.choice(Buyer.PROPERTY_TYPE_CHOICES)[0]
+    budget_min = rng.randrange(0, 30000000, 100000)
+    created_at = now - timedelta(seconds=rng.randrange(0, 400 * 24 * 3600))
+    first = rng.choice(['Aarav', 'Priya', 'Rahul', 'Sneha', 'Vikram', 'Ananya', 'Rohan', 'Isha'])
+    last = rng.choice(['Sharma', 'Patel', 'Iyer', 'Reddy', 'Khan', 'Mehta', 'Gupta', 'Nair'])
+    serial = rng.randrange(10 ** 8)
+    doc = {
+        '_id': str(uuid.uuid4()),
+        'full_name': f'{first} {last}',
+        'email': f'{first.lower()}.{last.lower()}{serial}@example.com',
+        'phone': f'9{serial:09d}',
+        'city': rng.choice(Buyer.CITY_CHOICES)[0],
+        'property_type': property_type,
+        'purpose': rng.choice(Buyer.PURPOSE_CHOICES)[0],
+        'budget_min': budget_min,
+        'budget_max': budget_min + rng.randrange(0, 10000000, 100000),
+        'timeline': rng.choice(Buyer.TIMELINE_CHOICES)[0],
+        'source': rng.choice(Buyer.SOURCE_CHOICES)[0],
+        'status': rng.choice(Buyer.STATUS_CHOICES)[0],
+        'notes': '',
+        'tags': [],
+        'owner_id': 'benchmark',
+        'created_at': created_at,
+        'updated_at': created_at,
+    }
+    if property_type in ['apartment', 'villa']:
+        doc['bhk'] = rng.choice(Buyer.BHK_CHOICES)[0]
+    doc.update(Buyer.derived_values(doc))
+    return doc
+
+
+def seed_buyers(document, count, seed=42, batch_size=10000):
+    """Replace the scratch collection contents with ``count`` random buyers"""
+    rng = random.Random(seed)
+    collection = document._get_collection()
+    collection.delete_many({})
+    now = datetime.utcnow()
+    batch = []
+    for _ in range(count):
+        batch.append(make_buyer_doc(rng, now))
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def measure(func, repeat=5):
+    """Run ``func`` ``repeat`` times; return (best seconds, commands per run, result)"""
+    best = None
+    result = None
+    commands = 0
+    for _ in range(repeat):
+        command_counter.reset()
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        commands = command_counter.count
+        best = elapsed if best is None else min(best, elapsed)
+    return best, commands, result
+
+
+def report(label, seconds, commands):
+    print(f"{label:<28} {seconds * 1000:>10.1f} ms {commands:>8} round-trips")
@@ -1,6 +1,8 @@
 import os
 from decouple import config
 import mongoengine
+from pymongo import monitoring
+from utils.query_profiler import query_profiler
 
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -31,6 +33,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'utils.query_profiler.QueryProfilerMiddleware',
 ]
 
 ROOT_URLCONF = 'buyer_leads.urls'
@@ -64,9 +67,32 @@ DATABASES = {
 # MongoDB Configuration
 MONGODB_URI = config('MONGODB_URI', default='mongodb://localhost:27017/buyer_leads')
 
+# Per-request query profiling: the command listener has to be registered
+# before the client is created. Adds X-DB-Query-Count/X-DB-Query-Time-Ms
+# headers and feeds /api/debug/queries/ (DEBUG only).
+QUERY_PROFILER_ENABLED = config('QUERY_PROFILER_ENABLED', default=DEBUG, cast=bool)
+QUERY_PROFILER_EXPLAIN = config('QUERY_PROFILER_EXPLAIN', default=False, cast=bool)
+QUERY_PROFILER_SLOWEST = config('QUERY_PROFILER_SLOWEST', default=5, cast=int)
+
+if QUERY_PROFILER_ENABLED:
+    monitoring.register(query_profiler)
+
 # Connect to MongoDB using the URI
 mongoengine.connect(host=MONGODB_URI)
 
+# Serve dashboard/analytics from the pre-aggregated lead_rollups collection.
+# Run `python manage.py rebuild_lead_rollups` after enabling. Reports use the
+# live aggregation until a rebuild has completed, and again from the first
+# write made while disabled (it is not counted) until the next rebuild.
+LEAD_ROLLUPS_ENABLED = config('LEAD_ROLLUPS_ENABLED', default=False, cast=bool)
+
+# Dashboard/analytics responses: served from the cache for
+# ANALYTICS_CACHE_SECONDS, then (or after any buyer write) served stale
+# while one background worker recomputes them, for up to
+# ANALYTICS_CACHE_STALE_SECONDS. 0 disables the cache.
+ANALYTICS_CACHE_SECONDS = config('ANALYTICS_CACHE_SECONDS', default=60, cast=int)
+ANALYTICS_CACHE_STALE_SECONDS = config('ANALYTICS_CACHE_STALE_SECONDS', default=3600, cast=int)
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -80,6 +106,23 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
 }
 
+# JWT user resolution: resolved users are kept in a per-process LRU for
+# AUTH_USER_CACHE_SECONDS. Token claims replace the database read only when
+# AUTH_USER_CACHE_ALIAS names a shared cache (Redis/Memcached), and then for
+# at most AUTH_USER_CLAIMS_SECONDS after the database last confirmed the
+# user. Unset (or a per-process cache), every cache miss reads the database.
+AUTH_USER_CACHE_SECONDS = config('AUTH_USER_CACHE_SECONDS', default=60, cast=int)
+AUTH_USER_CACHE_SIZE = config('AUTH_USER_CACHE_SIZE', default=1024, cast=int)
+AUTH_USER_CACHE_ALIAS = config('AUTH_USER_CACHE_ALIAS', default=None)
+AUTH_USER_CLAIMS_SECONDS = config('AUTH_USER_CLAIMS_SECONDS', default=300, cast=int)
+
+# Verified JWT payloads cached by token hash (until the token's exp)
+JWT_VERIFIED_CACHE_SIZE = config('JWT_VERIFIED_CACHE_SIZE', default=4096, cast=int)
+JWT_VERIFIED_CACHE_SECONDS = config('JWT_VERIFIED_CACHE_SECONDS', default=3600, cast=int)
+
+# Keyset pagination (?cursor=): how long a filtered list's total is cached
+BUYER_LIST_COUNT_CACHE_SECONDS = config('BUYER_LIST_COUNT_CACHE_SECONDS', default=60, cast=int)
+
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -100,4 +143,44 @@ STATIC_URL = '/static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 # Rate Limiting
-RATELIMIT_ENABLE = True
\ No newline at end of file
+RATELIMIT_ENABLE = True
+
+# utils.rate_limit backend: 'cache' (Django cache, fixed window only),
+# 'local' (per process) or 'redis' (RATE_LIMIT_REDIS_URL)
+RATE_LIMIT_BACKEND = config('RATE_LIMIT_BACKEND', default='cache')
+RATE_LIMIT_REDIS_URL = config('RATE_LIMIT_REDIS_URL', default='redis://localhost:6379/0')
+
+# CSV import: rows validated and written per batch
+CSV_IMPORT_BATCH_SIZE = config('CSV_IMPORT_BATCH_SIZE', default=1000, cast=int)
+
+# CSV import: processes used to validate batches of at least
+# CSV_VALIDATION_MIN_PARALLEL_ROWS rows. Opt-in: with the defaults every batch
+# is validated serially, because pickling rows to the pool costs about as much
+# as validating them. To enable it, raise CSV_IMPORT_BATCH_SIZE to at least
+# CSV_VALIDATION_MIN_PARALLEL_ROWS and set the worker count to the cores free
+# for imports; measure first with benchmarks/bench_csv_validation.py.
+CSV_VALIDATION_WORKERS = config('CSV_VALIDATION_WORKERS', default=1, cast=int)
+CSV_VALIDATION_MIN_PARALLEL_ROWS = config('CSV_VALIDATION_MIN_PARALLEL_ROWS', default=5000, cast=int)
+
+# Streaming CSV import: errors / created ids kept in the response
+CSV_IMPORT_MAX_REPORTED_ROWS = config('CSV_IMPORT_MAX_REPORTED_ROWS', default=1000, cast=int)
+
+# Buyer history is written behind create/update requests, in batches of
+# BUYER_HISTORY_BATCH_SIZE or every BUYER_HISTORY_FLUSH_SECONDS
+BUYER_HISTORY_WRITE_BEHIND = config('BUYER_HISTORY_WRITE_BEHIND', default=True, cast=bool)
+BUYER_HISTORY_BATCH_SIZE = config('BUYER_HISTORY_BATCH_SIZE', default=500, cast=int)
+BUYER_HISTORY_FLUSH_SECONDS = config('BUYER_HISTORY_FLUSH_SECONDS', default=1.0, cast=float)
+
+# Background CSV import jobs: worker threads, where uploads wait for them,
+# how often a process heartbeats its unfinished jobs, and how long a job may
+# go without a heartbeat (its process died) before it is failed
+CSV_IMPORT_WORKERS = config('CSV_IMPORT_WORKERS', default=2, cast=int)
+CSV_IMPORT_UPLOAD_DIR = config('CSV_IMPORT_UPLOAD_DIR', default='')
+CSV_IMPORT_HEARTBEAT_SECONDS = config('CSV_IMPORT_HEARTBEAT_SECONDS', default=60, cast=int)
+CSV_IMPORT_STALE_MINUTES = config('CSV_IMPORT_STALE_MINUTES', default=30, cast=int)
+
+# CSV import: what to do with rows matching an existing lead (skip, update or create)
+CSV_IMPORT_DUPLICATE_POLICY = config('CSV_IMPORT_DUPLICATE_POLICY', default='skip')
+
+# CSV export: documents fetched per cursor round-trip
+CSV_EXPORT_BATCH_SIZE = config('CSV_EXPORT_BATCH_SIZE', default=1000, cast=int)
\ No newline at end of file
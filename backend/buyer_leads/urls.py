@@ -1,8 +1,10 @@
 from django.contrib import admin
 from django.urls import path, include
+from utils.query_profiler import debug_queries
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/', include('users.urls')),
     path('api/leads/', include('leads.urls')),
+    path('api/debug/queries/', debug_queries, name='debug-queries'),
 ]
\ No newline at end of file
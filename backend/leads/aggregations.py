@@ -0,0 +1,550 @@
+"""
+Server-side aggregation helpers for the dashboard and analytics endpoints.
+
+Each report is expressed as a single ``$facet`` pipeline so MongoDB computes
+every breakdown in one round-trip instead of one ``count()`` per choice.
+
+Reports read from a *source*: ``BuyerSource`` aggregates the raw ``buyers``
+collection, ``RollupSource`` the pre-aggregated ``lead_rollups`` counters
+(see ``leads.rollups``). Both expose the same accumulators, so every report
+is written once.
+"""
+import time
+from datetime import datetime, timedelta
+from django.conf import settings
+from .models import Buyer, LeadRollup
+from .timeseries import daily_buckets, weekly_buckets, monthly_buckets, bucket_stages, bucket_rows
+
+# Budget buckets as (key, budget_min >= lower, budget_max < upper).
+# ``None`` means the bound is not checked, mirroring the original filters.
+DASHBOARD_BUDGET_RANGES = [
+    ('under_50L', None, 5000000),
+    ('50L_1Cr', 5000000, 10000000),
+    ('1Cr_2Cr', 10000000, 20000000),
+    ('above_2Cr', 20000000, None),
+]
+
+# Analytics budget buckets, same (key, lower, upper) convention as above
+ANALYTICS_BUDGET_RANGES = [
+    ('under_25L', None, 2500000),
+    ('25L_50L', 2500000, 5000000),
+    ('50L_75L', 5000000, 7500000),
+    ('75L_1Cr', 7500000, 10000000),
+    ('1Cr_2Cr', 10000000, 20000000),
+    ('above_2Cr', 20000000, None),
+]
+
+# Leads are considered "budgeted" when both ends of the range are set
+BUDGETED_MATCH = {'budget_min': {'$gt': 0}, 'budget_max': {'$gt': 0}}
+
+TIMELINE_URGENCY_SCORES = {
+    'immediate': 5,
+    '1month': 4,
+    '3months': 3,
+    '6months': 2,
+    '1year': 1
+}
+
+QUALIFIED_STATUSES = ['qualified', 'converted']
+CONTACTED_STATUSES = ['contacted', 'qualified', 'converted']
+BHK_PROPERTY_TYPES = ['apartment', 'villa']
+
+
+def conditional_sum(condition, value=1):
+    """``$sum`` accumulator adding ``value`` for documents matching ``condition``"""
+    return {'$sum': {'$cond': [condition, value, 0]}}
+
+
+def status_in(statuses):
+    """Aggregation expression true when the document status is in ``statuses``"""
+    return {'$in': ['$status', statuses]}
+
+
+def status_is(status_code):
+    return {'$eq': ['$status', status_code]}
+
+
+def budget_range_condition(lower, upper):
+    """Aggregation expression equivalent to a budget bucket filter"""
+    clauses = []
+    if lower is not None:
+        clauses.append({'$gte': ['$budget_min', lower]})
+    if upper is not None:
+        clauses.append({'$lt': ['$budget_max', upper]})
+    return {'$and': clauses}
+
+
+def in_budget_range(budget_min, budget_max, lower, upper):
+    """Python equivalent of ``budget_range_condition``"""
+    if lower is not None and not budget_min >= lower:
+        return False
+    if upper is not None and not budget_max < upper:
+        return False
+    return True
+
+
+def is_budgeted(budget_min, budget_max):
+    """Python equivalent of ``BUDGETED_MATCH``"""
+    return budget_min > 0 and budget_max > 0
+
+
+class BuyerSource:
+    """Aggregates straight from the ``buyers`` collection, one document per lead"""
+
+    date_field = 'created_at'
+
+    def __init__(self, queryset=None):
+        self._queryset = queryset
+
+    @property
+    def queryset(self):
+        return self._queryset if self._queryset is not None else Buyer.objects
+
+    def count(self, condition=None):
+        """Accumulator counting leads, optionally only those matching ``condition``"""
+        if condition is None:
+            return {'$sum': 1}
+        return conditional_sum(condition)
+
+    def midpoint_sum(self):
+        """Accumulator summing the midpoint of each lead's budget range"""
+        return {'$sum': {'$divide': [{'$add': ['$budget_min', '$budget_max']}, 2]}}
+
+    def budget_range_counts(self, ranges):
+        """``$group`` accumulators counting leads per budget bucket"""
+        return {
+            key: conditional_sum(budget_range_condition(lower, upper))
+            for key, lower, upper in ranges
+        }
+
+    def budgeted_summary(self, ranges):
+        """Facet stages summarising leads with a budget (count, sums, buckets)"""
+        group = {
+            '_id': None,
+            'count': {'$sum': 1},
+            'budget_min_sum': {'$sum': '$budget_min'},
+            'budget_max_sum': {'$sum': '$budget_max'},
+        }
+        group.update(self.budget_range_counts(ranges))
+        return [{'$match': BUDGETED_MATCH}, {'$group': group}]
+
+    def counter_group(self, field, by=None):
+        """
+        Facet stages counting leads per value of ``field`` (a choice that is
+        not a rollup dimension), optionally also grouped by dimension ``by``.
+        """
+        group_id = f'${field}' if by is None else {by: f'${by}', field: f'${field}'}
+        return [{'$group': {'_id': group_id, 'count': {'$sum': 1}}}]
+
+
+class RollupSource(BuyerSource):
+    """
+    Aggregates the ``lead_rollups`` counters, one document per
+    day x city x source x status x property_type bucket.
+
+    Date ranges apply to the bucket's day, so a day counts towards a range
+    when its midnight falls inside it.
+    """
+
+    date_field = 'day'
+
+    @property
+    def queryset(self):
+        return self._queryset if self._queryset is not None else LeadRollup.objects
+
+    def count(self, condition=None):
+        if condition is None:
+            return {'$sum': '$count'}
+        return conditional_sum(condition, '$count')
+
+    def midpoint_sum(self):
+        return {'$sum': {'$divide': [{'$add': ['$budget_min_sum', '$budget_max_sum']}, 2]}}
+
+    def budget_range_counts(self, ranges):
+        return {key: {'$sum': f'$budget_ranges.{key}'} for key, _, _ in ranges}
+
+    def budgeted_summary(self, ranges):
+        group = {
+            '_id': None,
+            'count': {'$sum': '$budgeted_count'},
+            'budget_min_sum': {'$sum': '$budgeted_min_sum'},
+            'budget_max_sum': {'$sum': '$budgeted_max_sum'},
+        }
+        group.update(self.budget_range_counts(ranges))
+        return [{'$match': {'budgeted_count': {'$gt': 0}}}, {'$group': group}]
+
+    def counter_group(self, field, by=None):
+        projection = {'pairs': {'$objectToArray': f'${field}'}}
+        if by is not None:
+            projection[by] = 1
+        group_id = '$pairs.k' if by is None else {by: f'${by}', field: '$pairs.k'}
+        return [
+            {'$project': projection},
+            {'$unwind': '$pairs'},
+            {'$group': {'_id': group_id, 'count': {'$sum': '$pairs.v'}}},
+        ]
+
+
+# Marker document written when ``rebuild_rollups`` completes and deleted
+# when a rebuild starts or a write goes uncounted (rollups turned off):
+# reports read the counters only while it exists
+ROLLUP_STATE_COLLECTION = 'lead_rollup_state'
+ROLLUP_REBUILT_ID = 'rebuilt'
+
+# Seconds a process trusts its last read of the marker
+ROLLUP_STATE_TTL = 30
+
+_rollups_rebuilt = (False, None)  # (marker present, monotonic time of the read)
+
+
+def rollup_state():
+    return LeadRollup._get_collection().database[ROLLUP_STATE_COLLECTION]
+
+
+def rollups_rebuilt():
+    """Whether the counters are complete: rebuilt and maintained by every write since"""
+    global _rollups_rebuilt
+    rebuilt, checked_at = _rollups_rebuilt
+    if checked_at is None or time.monotonic() - checked_at > ROLLUP_STATE_TTL:
+        rebuilt = rollup_state().find_one({'_id': ROLLUP_REBUILT_ID}) is not None
+        _rollups_rebuilt = (rebuilt, time.monotonic())
+    return rebuilt
+
+
+def mark_rollups_rebuilt(buckets):
+    global _rollups_rebuilt
+    rollup_state().replace_one(
+        {'_id': ROLLUP_REBUILT_ID},
+        {'_id': ROLLUP_REBUILT_ID, 'finished_at': datetime.utcnow(), 'buckets': buckets},
+        upsert=True,
+    )
+    _rollups_rebuilt = (True, time.monotonic())
+
+
+def clear_rollups_rebuilt():
+    """Delete the rebuilt marker; returns whether it was there"""
+    global _rollups_rebuilt
+    cleared = rollup_state().delete_one({'_id': ROLLUP_REBUILT_ID}).deleted_count > 0
+    _rollups_rebuilt = (False, time.monotonic())
+    return cleared
+
+
+def default_source():
+    """
+    The source reports read from unless told otherwise: the rollups when
+    enabled and complete, the live ``buyers`` aggregation otherwise
+    """
+    if getattr(settings, 'LEAD_ROLLUPS_ENABLED', False) and rollups_rebuilt():
+        return RollupSource()
+    return BuyerSource()
+
+
+def date_range_match(source, start, end):
+    return {source.date_field: {'$gte': start, '$lte': end}}
+
+
+def group_count(source, field, **accumulators):
+    """Facet stages counting leads per value of the dimension ``field``"""
+    group = {'_id': f'${field}', 'count': source.count()}
+    group.update(accumulators)
+    return [{'$group': group}]
+
+
+def total_count(source, match=None):
+    """Facet stages counting leads, optionally restricted by ``match``"""
+    stages = [{'$match': match}] if match else []
+    return stages + [{'$group': {'_id': None, 'count': source.count()}}]
+
+
+def in_range(stages, match):
+    """Prefix facet ``stages`` with a ``$match``"""
+    return [{'$match': match}] + stages
+
+
+def run_facets(source, facets, match=None):
+    """
+    Run all ``facets`` in a single aggregation and return the first result
+    document, i.e. a dict of facet name -> list of rows.
+    """
+    pipeline = []
+    if match:
+        pipeline.append({'$match': match})
+    pipeline.append({'$facet': facets})
+    results = list(source.queryset.aggregate(pipeline))
+    return results[0] if results else {name: [] for name in facets}
+
+
+def facet_total(rows):
+    """Extract the value produced by a ``total_count`` facet"""
+    return rows[0]['count'] if rows else 0
+
+
+def facet_group(rows, key='count'):
+    """Turn ``group_count`` rows into a {value: count} mapping"""
+    return {row['_id']: row[key] for row in rows}
+
+
+def facet_single(rows):
+    """The single row of an ``_id: None`` group, or an empty dict"""
+    return rows[0] if rows else {}
+
+
+def choice_counts(counts, choices):
+    """Expand a {code: count} mapping into the {code: {name, count}} response shape"""
+    return {
+        code: {'name': name, 'count': counts.get(code, 0)}
+        for code, name in choices
+    }
+
+
+def percentage(part, whole):
+    return round((part / whole * 100), 1) if whole > 0 else 0
+
+
+def dashboard_stats_pipeline(source, now=None):
+    """Facets backing the ``stats/`` endpoint"""
+    now = now or datetime.utcnow()
+    week_ago = now - timedelta(days=7)
+
+    return {
+        'total': total_count(source),
+        'recent': total_count(source, {source.date_field: {'$gte': week_ago}}),
+        'status': group_count(source, 'status'),
+        'city': group_count(source, 'city'),
+        'property_type': group_count(source, 'property_type'),
+        'timeline': source.counter_group('timeline'),
+        'budget': source.budgeted_summary(DASHBOARD_BUDGET_RANGES),
+    }
+
+
+def compute_dashboard_stats(now=None, source=None):
+    """Compute the ``stats/`` response with a single aggregation round-trip"""
+    source = source or default_source()
+    facets = run_facets(source, dashboard_stats_pipeline(source, now))
+
+    total_leads = facet_total(facets['total'])
+    status_counts = choice_counts(facet_group(facets['status']), Buyer.STATUS_CHOICES)
+
+    budget = facet_single(facets['budget'])
+    budgeted = budget.get('count', 0)
+    if budgeted > 0:
+        avg_budget_min = budget['budget_min_sum'] / budgeted
+        avg_budget_max = budget['budget_max_sum'] / budgeted
+    else:
+        avg_budget_min = avg_budget_max = 0
+    budget_ranges = {key: budget.get(key, 0) for key, _, _ in DASHBOARD_BUDGET_RANGES}
+
+    # Conversion rate (qualified + converted / total)
+    qualified_converted = (
+        status_counts['qualified']['count'] + status_counts['converted']['count']
+    )
+
+    return {
+        'total_leads': total_leads,
+        'recent_leads': facet_total(facets['recent']),
+        'conversion_rate': percentage(qualified_converted, total_leads),
+        'avg_budget_min': int(avg_budget_min),
+        'avg_budget_max': int(avg_budget_max),
+        'status_counts': status_counts,
+        'city_counts': choice_counts(facet_group(facets['city']), Buyer.CITY_CHOICES),
+        'property_counts': choice_counts(
+            facet_group(facets['property_type']), Buyer.PROPERTY_TYPE_CHOICES
+        ),
+        'budget_ranges': budget_ranges,
+        'timeline_counts': choice_counts(facet_group(facets['timeline']), Buyer.TIMELINE_CHOICES),
+    }
+
+
+def compute_analytics(days, now=None, source=None):
+    """Compute the ``analytics/`` response with a single aggregation round-trip"""
+    source = source or default_source()
+    end_date = now or datetime.utcnow()
+    start_date = end_date - timedelta(days=days)
+    range_match = date_range_match(source, start_date, end_date)
+    days_series = daily_buckets(start_date, days)
+
+    budget_group = {'_id': None}
+    budget_group.update(source.budget_range_counts(ANALYTICS_BUDGET_RANGES))
+
+    facets = {
+        'total': total_count(source, range_match),
+        'source': in_range(group_count(
+            source, 'source', converted=source.count(status_in(QUALIFIED_STATUSES))
+        ), range_match),
+        'city': in_range(group_count(source, 'city', budget_sum=source.midpoint_sum()), range_match),
+        'property_type': in_range(group_count(source, 'property_type'), range_match),
+        'property_bhk': in_range(source.counter_group('bhk', by='property_type'), range_match),
+        'budget': in_range([{'$group': budget_group}], range_match),
+        'timeline': in_range(source.counter_group('timeline'), range_match),
+    }
+    if days_series:
+        facets['daily'] = bucket_stages(days_series, field=source.date_field, count=source.count())
+    facets = run_facets(source, facets)
+
+    total_leads = facet_total(facets['total'])
+
+    daily = bucket_rows(days_series, facets.get('daily', []))
+    daily_leads = {key: row['count'] for key, row in daily.items()}
+
+    source_rows = {row['_id']: row for row in facets['source']}
+    source_performance = {}
+    for source_code, source_name in Buyer.SOURCE_CHOICES:
+        row = source_rows.get(source_code, {})
+        source_count = row.get('count', 0)
+        converted_count = row.get('converted', 0)
+        source_performance[source_code] = {
+            'name': source_name,
+            'leads': source_count,
+            'converted': converted_count,
+            'conversion_rate': percentage(converted_count, source_count)
+        }
+
+    city_rows = {row['_id']: row for row in facets['city']}
+    city_performance = {}
+    for city_code, city_name in Buyer.CITY_CHOICES:
+        row = city_rows.get(city_code, {})
+        city_count = row.get('count', 0)
+        avg_budget = row['budget_sum'] / city_count if city_count > 0 else 0
+        city_performance[city_code] = {
+            'name': city_name,
+            'leads': city_count,
+            'avg_budget': int(avg_budget),
+            'percentage': percentage(city_count, total_leads)
+        }
+
+    property_counts = facet_group(facets['property_type'])
+    bhk_counts = {
+        (row['_id'].get('property_type'), row['_id'].get('bhk')): row['count']
+        for row in facets['property_bhk']
+    }
+    property_analysis = {}
+    for prop_code, prop_name in Buyer.PROPERTY_TYPE_CHOICES:
+        prop_count = property_counts.get(prop_code, 0)
+
+        # BHK distribution for apartments and villas
+        bhk_dist = {}
+        if prop_code in BHK_PROPERTY_TYPES:
+            for bhk_code, bhk_name in Buyer.BHK_CHOICES:
+                bhk_dist[bhk_code] = {'name': bhk_name, 'count': bhk_counts.get((prop_code, bhk_code), 0)}
+
+        property_analysis[prop_code] = {
+            'name': prop_name,
+            'leads': prop_count,
+            'bhk_distribution': bhk_dist,
+            'percentage': percentage(prop_count, total_leads)
+        }
+
+    budget = facet_single(facets['budget'])
+    budget_analysis = {key: budget.get(key, 0) for key, _, _ in ANALYTICS_BUDGET_RANGES}
+
+    timeline_counts = facet_group(facets['timeline'])
+    timeline_urgency = {}
+    for timeline_code, timeline_name in Buyer.TIMELINE_CHOICES:
+        timeline_count = timeline_counts.get(timeline_code, 0)
+        timeline_urgency[timeline_code] = {
+            'name': timeline_name,
+            'leads': timeline_count,
+            'urgency_score': TIMELINE_URGENCY_SCORES.get(timeline_code, 0),
+            'percentage': percentage(timeline_count, total_leads)
+        }
+
+    return {
+        'date_range': {
+            'start_date': start_date.strftime('%Y-%m-%d'),
+            'end_date': end_date.strftime('%Y-%m-%d'),
+            'days': days
+        },
+        'total_leads': total_leads,
+        'daily_leads': daily_leads,
+        'source_performance': source_performance,
+        'city_performance': city_performance,
+        'property_analysis': property_analysis,
+        'budget_analysis': budget_analysis,
+        'timeline_urgency': timeline_urgency
+    }
+
+
+def compute_trends(now=None, months=12, weeks=8, source=None):
+    """Compute the ``analytics/trends/`` response with a single aggregation round-trip"""
+    source = source or default_source()
+    end_date = now or datetime.utcnow()
+    month_series = monthly_buckets(end_date, months)
+    week_series = weekly_buckets(end_date, weeks)
+
+    status_output = {
+        status_code: source.count(status_is(status_code))
+        for status_code, _ in Buyer.STATUS_CHOICES
+    }
+    week_output = {'converted': source.count(status_in(QUALIFIED_STATUSES))}
+
+    facets = run_facets(source, {
+        'monthly': bucket_stages(month_series, status_output, source.date_field, source.count()),
+        'weekly': bucket_stages(week_series, week_output, source.date_field, source.count()),
+    })
+
+    monthly_trends = {}
+    for key, row in bucket_rows(month_series, facets['monthly'], status_output).items():
+        monthly_trends[key] = {'total_leads': row['count']}
+        for status_code, _ in Buyer.STATUS_CHOICES:
+            monthly_trends[key][status_code] = row[status_code]
+
+    weekly_trends = {}
+    for key, row in bucket_rows(week_series, facets['weekly'], week_output).items():
+        weekly_trends[key] = {
+            'leads': row['count'],
+            'conversion_rate': percentage(row['converted'], row['count'])
+        }
+
+    return {
+        'monthly_trends': monthly_trends,
+        'weekly_trends': weekly_trends
+    }
+
+
+def compute_conversion(days, now=None, source=None):
+    """Compute the ``analytics/conversion/`` response with a single aggregation round-trip"""
+    source = source or default_source()
+    end_date = now or datetime.utcnow()
+    start_date = end_date - timedelta(days=days)
+
+    facets = run_facets(source, {
+        'funnel': [{'$group': {
+            '_id': None,
+            'total_leads': source.count(),
+            'contacted': source.count(status_in(CONTACTED_STATUSES)),
+            'qualified': source.count(status_in(QUALIFIED_STATUSES)),
+            'converted': source.count(status_is('converted')),
+        }}],
+        'source': group_count(source, 'source', converted=source.count(status_is('converted'))),
+    }, match=date_range_match(source, start_date, end_date))
+
+    funnel = facet_single(facets['funnel'])
+    funnel_stages = {
+        stage: funnel.get(stage, 0)
+        for stage in ['total_leads', 'contacted', 'qualified', 'converted']
+    }
+    total_leads = funnel_stages['total_leads']
+    funnel_rates = {
+        'contact_rate': percentage(funnel_stages['contacted'], total_leads),
+        'qualification_rate': percentage(funnel_stages['qualified'], total_leads),
+        'conversion_rate': percentage(funnel_stages['converted'], total_leads),
+    }
+
+    source_rows = {row['_id']: row for row in facets['source']}
+    source_conversion = {}
+    for source_code, source_name in Buyer.SOURCE_CHOICES:
+        row = source_rows.get(source_code, {})
+        source_total = row.get('count', 0)
+        source_converted = row.get('converted', 0)
+        source_conversion[source_code] = {
+            'name': source_name,
+            'total_leads': source_total,
+            'converted': source_converted,
+            'conversion_rate': percentage(source_converted, source_total)
+        }
+
+    return {
+        'funnel_stages': funnel_stages,
+        'funnel_rates': funnel_rates,
+        'source_conversion': source_conversion,
+    }
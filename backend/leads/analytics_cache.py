@@ -0,0 +1,122 @@
+"""
+Response cache for the dashboard and analytics endpoints.
+
+Results are cached per endpoint and query params together with the data
+generation they were computed from. Every buyer write bumps the generation
+(``bump_generation``, called from the rollup write hooks), which makes
+older entries stale rather than deleting them:
+
+* fresh (current generation, younger than ``ANALYTICS_CACHE_SECONDS``):
+  served as is;
+* stale (older generation or past the TTL, but younger than
+  ``ANALYTICS_CACHE_STALE_SECONDS``): served as is while one background
+  worker recomputes it;
+* missing or too old: computed in the request.
+
+So only the very first request for a params combination waits.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+GENERATION_KEY = 'leads_analytics_generation'
+
+# Longest a recomputation may take before another request may start one
+REFRESH_LOCK_SECONDS = 60
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_refresh_executor():
+    """The background recompute pool, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='analytics-refresh')
+        return _executor
+
+
+def cache_seconds():
+    return getattr(settings, 'ANALYTICS_CACHE_SECONDS', 60)
+
+
+def current_generation():
+    return cache.get(GENERATION_KEY) or 0
+
+
+def bump_generation():
+    """Mark every cached analytics result as out of date"""
+    if cache.add(GENERATION_KEY, 1, None):
+        return 1
+    try:
+        return cache.incr(GENERATION_KEY)
+    except ValueError:
+        # Evicted between add and incr
+        cache.set(GENERATION_KEY, 1, None)
+        return 1
+
+
+def cache_key(name, params):
+    digest = hashlib.sha256(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()[:32]
+    return f'leads_analytics:{name}:{digest}'
+
+
+def _store(key, generation, data):
+    stale_seconds = getattr(settings, 'ANALYTICS_CACHE_STALE_SECONDS', 3600)
+    cache.set(key, {'generation': generation, 'computed_at': time.time(), 'data': data}, stale_seconds)
+
+
+def _refresh(key, compute):
+    try:
+        # Read the generation first: a write during compute leaves the result stale
+        generation = current_generation()
+        _store(key, generation, compute())
+    except Exception:
+        logger.exception('Background analytics refresh failed for %s', key)
+    finally:
+        cache.delete(f'{key}:refreshing')
+
+
+def cached_result(name, params, compute):
+    """
+    ``compute()``'s result for endpoint ``name`` and ``params``, from the
+    cache when possible. Returns (data, state) where state is 'hit',
+    'stale' or 'miss'.
+    """
+    if cache_seconds() <= 0:
+        return compute(), 'miss'
+
+    key = cache_key(name, params)
+    generation = current_generation()
+    entry = cache.get(key)
+
+    if entry is None:
+        data = compute()
+        _store(key, generation, data)
+        return data, 'miss'
+
+    age = time.time() - entry['computed_at']
+    if entry['generation'] == generation and age < cache_seconds():
+        return entry['data'], 'hit'
+
+    # One recomputation at a time per key, across processes sharing the cache
+    if cache.add(f'{key}:refreshing', 1, REFRESH_LOCK_SECONDS):
+        get_refresh_executor().submit(_refresh, key, compute)
+    return entry['data'], 'stale'
+
+
+def cached_response(name, params, compute):
+    """``Response`` for ``cached_result``, with its cache state in ``X-Cache``"""
+    data, state = cached_result(name, params, compute)
+    response = Response(data)
+    response['X-Cache'] = state.upper()
+    return response
@@ -0,0 +1,136 @@
+"""
+Bulk updates and deletes of leads (``buyers/bulk/``).
+
+``bulk_patch_buyers`` applies one validated patch to many leads. One
+``find`` reads their stored values (for the per-lead rule checks, the
+history diff and the rollup move), one unordered ``bulk_write`` applies
+the changes, and the history entries are queued as one batch. Each
+``UpdateOne`` is guarded by the version that was read, so a lead changed
+in between is reported as a conflict instead of being overwritten. Leads
+the patch would not change are not written.
+
+``bulk_delete_buyers`` removes many leads with one ``delete_many``.
+
+Both return one result per requested id, in request order.
+"""
+from datetime import datetime
+from pymongo import UpdateOne
+from rest_framework import serializers
+from .models import Buyer
+from .history import history_document, history_writer
+from .rollups import ROLLUP_FIELDS, record_deleted, record_updated, rollup_snapshot
+from .updates import check_rules, mongo_values, version_filter
+
+# Leads per bulk request
+MAX_BULK_IDS = 500
+
+
+def bulk_patch_buyers(buyer_ids, data, changed_by, expected_versions=None):
+    """
+    Apply validated partial ``data`` to every lead in ``buyer_ids``.
+
+    ``expected_versions`` optionally maps ids to the version the client
+    last saw. Each result's ``status`` is ``updated``, ``unchanged``,
+    ``not_found``, ``conflict`` or ``invalid`` (with ``error``); existing
+    leads also report their ``version``.
+    """
+    buyer_ids = list(dict.fromkeys(buyer_ids))
+    expected_versions = expected_versions or {}
+    values = mongo_values(data)
+    derived = any(field in values for field in Buyer.DERIVED_SOURCE_FIELDS)
+    now = datetime.utcnow()
+    # MongoDB keeps milliseconds; the stored updated_at identifies our writes
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+
+    collection = Buyer._get_collection()
+    stored = {document['_id']: document for document in collection.find({'_id': {'$in': buyer_ids}})}
+
+    results = {}
+    operations = []
+    pending = []
+    for buyer_id in buyer_ids:
+        before = stored.get(buyer_id)
+        if before is None:
+            results[buyer_id] = {'id': buyer_id, 'status': 'not_found'}
+            continue
+        version = before.get('version') or 0
+        expected = expected_versions.get(buyer_id)
+        if expected is not None and expected != version:
+            results[buyer_id] = {'id': buyer_id, 'status': 'conflict', 'version': version}
+            continue
+
+        changes = {
+            field: f"{before.get(field)} → {value}"
+            for field, value in values.items() if before.get(field) != value
+        }
+        if not changes:
+            results[buyer_id] = {'id': buyer_id, 'status': 'unchanged', 'version': version}
+            continue
+        after = dict(before, **values)
+        try:
+            check_rules(after)
+        except serializers.ValidationError as e:
+            error = '; '.join(str(message) for message in e.detail)
+            results[buyer_id] = {'id': buyer_id, 'status': 'invalid', 'error': error, 'version': version}
+            continue
+
+        update_values = dict(values, updated_at=now)
+        if derived:
+            update_values.update(Buyer.derived_values(after))
+        after.update(update_values, version=version + 1)
+        operations.append(UpdateOne(
+            {'_id': buyer_id, 'version': version_filter(version)},
+            {'$set': update_values, '$inc': {'version': 1}},
+        ))
+        pending.append((before, after, changes))
+
+    applied = pending
+    if operations:
+        result = collection.bulk_write(operations, ordered=False)
+        if result.matched_count < len(operations):
+            # Some leads changed after the read; only ours carry this write's
+            # updated_at at the version it set
+            current = {
+                document['_id']: document
+                for document in collection.find(
+                    {'_id': {'$in': [before['_id'] for before, _, _ in pending]}},
+                    {'version': 1, 'updated_at': 1},
+                )
+            }
+            applied = []
+            for before, after, changes in pending:
+                document = current.get(before['_id'])
+                if document is None:
+                    results[before['_id']] = {'id': before['_id'], 'status': 'not_found'}
+                elif document.get('version') == after['version'] and document.get('updated_at') == now:
+                    applied.append((before, after, changes))
+                else:
+                    results[before['_id']] = {
+                        'id': before['_id'], 'status': 'conflict', 'version': document.get('version') or 0,
+                    }
+
+    for _, after, _ in applied:
+        results[after['_id']] = {'id': after['_id'], 'status': 'updated', 'version': after['version']}
+    if applied:
+        record_updated([(rollup_snapshot(before), rollup_snapshot(after)) for before, after, _ in applied])
+        history_writer().add_many([
+            history_document(before['_id'], changed_by, dict(changes, action='bulk_updated'), now)
+            for before, _, changes in applied
+        ])
+    return [results[buyer_id] for buyer_id in buyer_ids]
+
+
+def bulk_delete_buyers(buyer_ids):
+    """Delete every lead in ``buyer_ids``; each result's ``status`` is ``deleted`` or ``not_found``"""
+    buyer_ids = list(dict.fromkeys(buyer_ids))
+    collection = Buyer._get_collection()
+    stored = list(collection.find({'_id': {'$in': buyer_ids}}, ROLLUP_FIELDS))
+    if stored:
+        collection.delete_many({'_id': {'$in': [document['_id'] for document in stored]}})
+        record_deleted(stored)
+
+    deleted = {document['_id'] for document in stored}
+    return [
+        {'id': buyer_id, 'status': 'deleted' if buyer_id in deleted else 'not_found'}
+        for buyer_id in buyer_ids
+    ]
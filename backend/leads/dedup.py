@@ -0,0 +1,116 @@
+"""
+Duplicate detection for CSV imports.
+
+For each import batch the existing buyers sharing a normalized email or
+phone with any row are fetched with one ``$in`` query and indexed in
+memory, so checking a row is a dict lookup. Rows that match an existing
+lead, or an earlier row of the same batch, are handled by the import's
+duplicate policy:
+
+* ``skip``   - leave the existing lead alone and do not import the row
+* ``update`` - write the row's changed values to the existing lead (reported
+               as a ``conflict`` if the lead was edited since it was read)
+* ``create`` - import the row as a new lead anyway (it is still reported)
+"""
+from django.conf import settings
+from .models import Buyer
+from utils.validators import normalize_email, normalize_phone_number
+
+DUPLICATE_POLICIES = ['skip', 'update', 'create']
+
+
+def default_duplicate_policy():
+    return getattr(settings, 'CSV_IMPORT_DUPLICATE_POLICY', 'skip')
+
+
+def duplicate_keys(data):
+    """(field, value) keys a lead can be matched on, in priority order"""
+    keys = []
+    email = normalize_email(data.get('email'))
+    if email:
+        keys.append(('email_normalized', email))
+    phone = normalize_phone_number(data.get('phone'))
+    if phone:
+        keys.append(('phone_normalized', phone))
+    return keys
+
+
+def fetch_existing(keys):
+    """Existing buyer documents matching any of ``keys``, in a single query"""
+    values = {}
+    for field, value in keys:
+        values.setdefault(field, set()).add(value)
+    if not values:
+        return []
+    query = {'$or': [{field: {'$in': sorted(found)}} for field, found in values.items()]}
+    return list(Buyer._get_collection().find(query, {'search_tokens': 0}))
+
+
+class DuplicateIndex:
+    """In-memory hash index of the leads an import batch can collide with"""
+
+    def __init__(self, documents=()):
+        self.index = {}
+        for document in documents:
+            for field in ('email_normalized', 'phone_normalized'):
+                if document.get(field):
+                    self.index.setdefault((field, document[field]), ('buyer', document))
+
+    @classmethod
+    def for_entries(cls, entries):
+        keys = {key for _, data, _ in entries for key in duplicate_keys(data)}
+        return cls(fetch_existing(keys))
+
+    def match(self, data):
+        """(('buyer', document) or ('row', row number), matched field) or None"""
+        for key in duplicate_keys(data):
+            if key in self.index:
+                return self.index[key], key[0].split('_')[0]
+        return None
+
+    def add_row(self, row_num, data):
+        for key in duplicate_keys(data):
+            self.index.setdefault(key, ('row', row_num))
+
+
+def resolve_duplicates(entries, policy):
+    """
+    Split validated import entries by ``policy``.
+
+    Returns (entries to create, (entry, existing document) pairs to update,
+    duplicate reports), where a report is
+    ``{'row', 'action', 'matched_on', 'duplicate_of', 'duplicate_of_row'}``.
+    """
+    index = DuplicateIndex.for_entries(entries)
+    to_create, to_update, duplicates = [], [], []
+
+    for entry in entries:
+        row_num, data, _ = entry
+        found = index.match(data)
+        if found is None:
+            to_create.append(entry)
+            index.add_row(row_num, data)
+            continue
+
+        (kind, target), matched_on = found
+        report = {
+            'row': row_num,
+            'matched_on': matched_on,
+            'duplicate_of': target['_id'] if kind == 'buyer' else None,
+            'duplicate_of_row': target if kind == 'row' else None,
+        }
+        if policy == 'create':
+            report['action'] = 'created'
+            to_create.append(entry)
+            index.add_row(row_num, data)
+        elif policy == 'update' and kind == 'buyer':
+            report['action'] = 'updated'
+            to_update.append((entry, target))
+            # Later rows for the same lead are skipped rather than applied twice
+            for key in duplicate_keys(data) + duplicate_keys(target):
+                index.index[key] = ('row', row_num)
+        else:
+            report['action'] = 'skipped'
+        duplicates.append(report)
+
+    return to_create, to_update, duplicates
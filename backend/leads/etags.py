@@ -0,0 +1,61 @@
+"""
+ETags for conditional GETs of the buyer list and detail.
+
+Used with ``django.views.decorators.http.condition``, so a matching
+``If-None-Match`` is answered with 304 before the view queries or
+serializes any lead:
+
+* detail: the lead's id, ``version`` and ``updated_at``, read with a
+  projection on ``_id``;
+* list: a collection-wide change counter and the request's host, path
+  and query params.
+
+The counter is a document in ``change_counters`` that the write hooks
+(``record_created``/``record_updated``/``record_deleted``) ``$inc`` after
+every create, update, import or delete. Being incremented by the server
+after the write, it only moves forward, unlike timestamps stamped in
+Python before a write commits.
+"""
+import hashlib
+from .models import Buyer
+
+# Query params that do not change the list body
+IGNORED_LIST_PARAMS = {'_'}
+
+CHANGE_COUNTERS_COLLECTION = 'change_counters'
+BUYERS_COUNTER_ID = 'buyers'
+
+
+def _etag(*parts):
+    digest = hashlib.sha256('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def buyer_etag(request, pk=None, **kwargs):
+    document = Buyer._get_collection().find_one({'_id': pk}, {'version': 1, 'updated_at': 1})
+    if document is None:
+        return None
+    return _etag('buyer', pk, document.get('version', 0), document.get('updated_at'))
+
+
+def _change_counters():
+    return Buyer._get_collection().database[CHANGE_COUNTERS_COLLECTION]
+
+
+def bump_list_marker():
+    """Record that leads were written; called by the write hooks after the write"""
+    _change_counters().update_one({'_id': BUYERS_COUNTER_ID}, {'$inc': {'value': 1}}, upsert=True)
+
+
+def list_marker():
+    """Changes whenever any lead is created, updated or deleted"""
+    counter = _change_counters().find_one({'_id': BUYERS_COUNTER_ID}) or {}
+    return counter.get('value', 0)
+
+
+def buyer_list_etag(request, **kwargs):
+    params = sorted(
+        (key, value) for key, values in request.GET.lists() if key not in IGNORED_LIST_PARAMS for value in values
+    )
+    # Pagination links are absolute, so the host is part of the body
+    return _etag('buyers', request.get_host(), request.path, params, list_marker())
@@ -0,0 +1,225 @@
+"""
+Write-behind buffer for ``BuyerHistory`` entries.
+
+Create and update requests hand their history entry to ``record_history``
+instead of saving it; a background thread writes buffered entries with one
+``insert_many`` when ``BUYER_HISTORY_BATCH_SIZE`` entries are waiting,
+every ``BUYER_HISTORY_FLUSH_SECONDS``, after each request has finished
+(``request_finished``), and at interpreter exit. Reads of a lead's history
+flush first, so a process always sees its own writes.
+
+With ``BUYER_HISTORY_WRITE_BEHIND = False`` every entry is written before
+``record_history`` returns.
+
+Reads go through the ``(buyer_id, -changed_at, -_id)`` index: one lead's
+history is keyset-paginated (``HistoryPagination``) and ``recent_history``
+fetches the latest entries of many leads with one aggregation.
+"""
+import atexit
+import logging
+import threading
+from datetime import datetime
+from django.conf import settings
+from django.core.signals import request_finished
+from rest_framework.exceptions import ValidationError
+from .models import Buyer, BuyerHistory
+
+logger = logging.getLogger(__name__)
+
+# Bulk history: leads per request and entries per lead
+MAX_BULK_HISTORY_IDS = 100
+MAX_BULK_HISTORY_LIMIT = 20
+
+
+def history_document(buyer_id, changed_by, diff, changed_at=None):
+    """Raw ``buyer_history`` document for one change"""
+    return BuyerHistory(
+        buyer_id=buyer_id,
+        changed_by=changed_by,
+        changed_at=changed_at or datetime.utcnow(),
+        diff=diff,
+    ).to_mongo().to_dict()
+
+
+class HistoryWriter:
+    """
+    Buffers history documents and inserts them in batches from a daemon
+    thread. ``synchronous`` writers insert on every ``add``.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, synchronous=False, collection=None):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self._collection = collection
+        self._buffer = []
+        self._condition = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._flush_requested = False
+        self._closed = False
+        self._thread = None
+
+    @property
+    def collection(self):
+        return self._collection if self._collection is not None else BuyerHistory._get_collection()
+
+    def add(self, document):
+        self.add_many([document])
+
+    def add_many(self, documents):
+        if not documents:
+            return
+        if self.synchronous or self._closed:
+            self._write(list(documents))
+            return
+        with self._condition:
+            self._buffer.extend(documents)
+            self._start()
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+
+    def request_flush(self):
+        """Ask the background thread to write what is buffered now, without waiting"""
+        with self._condition:
+            if self._buffer:
+                self._flush_requested = True
+                self._condition.notify()
+
+    def flush(self):
+        """Write everything buffered so far before returning"""
+        with self._write_lock:
+            documents = self._take()
+            self._insert(documents)
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        self.flush()
+
+    def pending(self):
+        return len(self._buffer)
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+
+    def _take(self):
+        with self._condition:
+            documents, self._buffer = self._buffer, []
+            self._flush_requested = False
+            return documents
+
+    def _insert(self, documents):
+        for start in range(0, len(documents), self.batch_size):
+            batch = documents[start:start + self.batch_size]
+            try:
+                self.collection.insert_many(batch, ordered=False)
+            except Exception:
+                logger.exception('Failed to write %d buyer history entries', len(batch))
+
+    def _write(self, documents):
+        with self._write_lock:
+            self._insert(documents)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                if not self._closed and len(self._buffer) < self.batch_size and not self._flush_requested:
+                    self._condition.wait(self.flush_interval)
+                closed = self._closed
+            # Taking the buffer under the write lock keeps batches in order and
+            # means a flush() that returns has seen every earlier entry written
+            with self._write_lock:
+                self._insert(self._take())
+            if closed:
+                return
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def history_writer():
+    """The process-wide writer, created on first use"""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = HistoryWriter(
+                batch_size=getattr(settings, 'BUYER_HISTORY_BATCH_SIZE', 500),
+                flush_interval=getattr(settings, 'BUYER_HISTORY_FLUSH_SECONDS', 1.0),
+                synchronous=not getattr(settings, 'BUYER_HISTORY_WRITE_BEHIND', True),
+            )
+            atexit.register(_writer.close)
+        return _writer
+
+
+def record_history(buyer_id, changed_by, diff):
+    """Queue a history entry for a lead"""
+    history_writer().add(history_document(buyer_id, changed_by, diff))
+
+
+def flush_history():
+    """Make buffered history visible to queries issued by this process"""
+    if _writer is not None:
+        _writer.flush()
+
+
+def _request_finished(sender, **kwargs):
+    if _writer is not None:
+        _writer.request_flush()
+
+
+request_finished.connect(_request_finished, dispatch_uid='leads.history.request_finished')
+
+
+def history_query(buyer_ids, field=None, changed_by=None):
+    """
+    Raw filter for the history of ``buyer_ids``, optionally only entries that
+    changed Buyer ``field`` or were made by ``changed_by``.
+    """
+    query = {'buyer_id': buyer_ids[0] if len(buyer_ids) == 1 else {'$in': list(buyer_ids)}}
+    if field:
+        if field not in Buyer._fields:
+            raise ValidationError({'field': f'Unknown field: {field}'})
+        query[f'diff.{field}'] = {'$exists': True}
+    if changed_by:
+        query['changed_by'] = changed_by
+    return query
+
+
+def recent_history(buyer_ids, limit=5, field=None, changed_by=None):
+    """
+    ``{buyer_id: [raw entries, newest first]}`` with up to ``limit`` entries
+    for each of ``buyer_ids``, from a single aggregation.
+
+    Each lead gets its own ``$match``/``$sort``/``$limit`` branch, chained with
+    ``$unionWith``, so every branch walks the ``(buyer_id, -changed_at, -_id)``
+    index and stops after ``limit`` entries however long the history is.
+    """
+    collection = BuyerHistory._get_collection()
+
+    def latest(buyer_id):
+        return [
+            {'$match': history_query([buyer_id], field, changed_by)},
+            {'$sort': {'changed_at': -1, '_id': -1}},
+            {'$limit': limit},
+        ]
+
+    if not buyer_ids:
+        return {}
+    first, *others = buyer_ids
+    pipeline = latest(first) + [
+        {'$unionWith': {'coll': collection.name, 'pipeline': latest(buyer_id)}} for buyer_id in others
+    ]
+    flush_history()
+    history = {buyer_id: [] for buyer_id in buyer_ids}
+    for entry in collection.aggregate(pipeline):
+        history[entry['buyer_id']].append(entry)
+    for entries in history.values():
+        # Union output order is per branch; keep each lead newest first
+        entries.sort(key=lambda entry: (entry['changed_at'], entry['_id']), reverse=True)
+    return history
@@ -0,0 +1,168 @@
+"""
+Index plan for the buyer list.
+
+The list view filters by equality on a few choice fields, optionally
+searches ``search_tokens``, and sorts by a timestamp (``-updated_at`` by
+default) with ``_id`` as the keyset tie-break. Indexes follow the ESR rule:
+Equality fields first, then the Sort keys, then Range fields (the keyset
+cursor is a range on the sort keys, so it rides on the sort suffix).
+
+The default order gets one ``(filter, -updated_at, -_id)`` index per
+filter field: the most selective filter picks the index, the others are
+applied while fetching, and pages come out in sort order. The same indexes
+answer the ``count()`` the page-number list runs on every filtered request,
+which would otherwise scan the collection. ``-created_at`` lists (not used
+by the frontend) ride the ``(-created_at, -_id)`` index and filter while
+fetching. Each index is maintained by every insert, import batch and PATCH,
+so other sort orders do not get per-filter copies; ``advise_indexes``
+explains every list and count shape to check the plan.
+"""
+from datetime import datetime
+
+# Equality filters of BuyerListCreateView.get_queryset (query param -> field)
+LIST_FILTER_FIELDS = ['city', 'property_type', 'status', 'timeline']
+
+# Sort orders the list is served with (the frontend uses the default)
+LIST_SORT_FIELDS = ['updated_at', 'created_at']
+
+DEFAULT_SORT_FIELD = 'updated_at'
+
+
+def _sort_keys(sort_field):
+    return [f'-{sort_field}', '-id']
+
+
+def list_indexes():
+    """mongoengine index specs covering the list view's filters, sorts and token search"""
+    # (-created_at, -_id) also serves the analytics created_at date ranges
+    specs = [{'fields': _sort_keys(sort_field)} for sort_field in LIST_SORT_FIELDS]
+    specs.extend({'fields': [field] + _sort_keys(DEFAULT_SORT_FIELD)} for field in LIST_FILTER_FIELDS)
+    # Token search sorted by the default order; also serves plain $all lookups
+    specs.append({'fields': ['search_tokens'] + _sort_keys(DEFAULT_SORT_FIELD)})
+    return specs
+
+
+FILTER_VALUES = {'city': 'mumbai', 'property_type': 'apartment', 'status': 'new', 'timeline': '3months'}
+
+FILTER_SETS = [[]] + [[field] for field in LIST_FILTER_FIELDS] + [
+    ['city', 'status'],
+    ['city', 'property_type', 'status'],
+    LIST_FILTER_FIELDS,
+]
+
+
+def _filter_shapes():
+    for fields in FILTER_SETS:
+        yield '+'.join(fields) or 'all', {field: FILTER_VALUES[field] for field in fields}
+
+
+def canonical_shapes():
+    """
+    (name, filter, sort) for the query shapes the list view issues. Filters
+    use placeholder values: only the shape matters to the planner.
+    """
+    shapes = []
+    for sort_field in LIST_SORT_FIELDS:
+        sort = [(sort_field, -1), ('_id', -1)]
+        for name, query in _filter_shapes():
+            shapes.append((f'{name} by -{sort_field}', query, sort))
+        # Keyset page 2: a range on the sort keys after the equality filters
+        shapes.append((f'city by -{sort_field}, next page', {
+            'city': FILTER_VALUES['city'],
+            '$or': [{sort_field: {'$lt': '$cursor'}}, {sort_field: '$cursor', '_id': {'$lt': '$cursor'}}],
+        }, sort))
+    sort = [(DEFAULT_SORT_FIELD, -1), ('_id', -1)]
+    shapes.append(('search by -updated_at', {'search_tokens': {'$all': ['pri', 'sharma']}}, sort))
+    shapes.append(('search+status by -updated_at', {'search_tokens': {'$all': ['pri']}, 'status': 'new'}, sort))
+    shapes.append(('phone', {'phone_normalized': '+919876543210'}, sort))
+    return shapes
+
+
+def count_shapes():
+    """
+    (name, filter) for the ``count()`` of each filtered list: page-number
+    pages report a total. Unfiltered totals are a collection count either
+    way (keyset pages use the estimated count).
+    """
+    shapes = [(f'count {name}', query) for name, query in _filter_shapes() if query]
+    shapes.append(('count search', {'search_tokens': {'$all': ['pri', 'sharma']}}))
+    return shapes
+
+
+def plan_stages(explain):
+    """Stage names of the winning plan in an ``explain()`` result, outermost first"""
+    if 'queryPlanner' not in explain and explain.get('stages'):
+        # Aggregations (count_documents) wrap the query plan in a $cursor stage
+        explain = explain['stages'][0].get('$cursor', {})
+    planner = explain.get('queryPlanner', {})
+    plan = planner.get('winningPlan', {})
+    plan = plan.get('queryPlan', plan)  # slot-based engine nests the classic plan
+    stages = []
+    pending = [plan]
+    while pending:
+        stage = pending.pop(0)
+        if not stage:
+            continue
+        stages.append(stage.get('stage'))
+        if 'inputStage' in stage:
+            pending.append(stage['inputStage'])
+        pending.extend(stage.get('inputStages', []))
+    return stages
+
+
+def plan_problems(stages):
+    """What is wrong with a winning plan: collection scans and blocking sorts"""
+    problems = []
+    if 'COLLSCAN' in stages:
+        problems.append('COLLSCAN')
+    if 'SORT' in stages:
+        problems.append('in-memory SORT')
+    return problems
+
+
+def explain_shape(collection, query, sort, limit=10):
+    """Explain a shape as the list runs it; returns a summary dict"""
+    query = _with_cursor_values(query)
+    explain = collection.find(query).sort(sort).limit(limit).explain()
+    stats = explain.get('executionStats', {})
+    stages = plan_stages(explain)
+    return {
+        'stages': stages,
+        'problems': plan_problems(stages),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'docs_examined': stats.get('totalDocsExamined'),
+        'returned': stats.get('nReturned'),
+    }
+
+
+def explain_count(collection, query):
+    """Explain a shape's ``count_documents`` as the page-number list runs it; returns a summary dict"""
+    pipeline = [{'$match': query}, {'$group': {'_id': 1, 'n': {'$sum': 1}}}]
+    explain = collection.database.command(
+        'explain', {'aggregate': collection.name, 'pipeline': pipeline, 'cursor': {}},
+        verbosity='executionStats',
+    )
+    cursor = (explain.get('stages') or [{}])[0].get('$cursor', explain)
+    stats = cursor.get('executionStats', {})
+    stages = plan_stages(explain)
+    return {
+        'stages': stages,
+        'problems': plan_problems(stages),
+        'keys_examined': stats.get('totalKeysExamined'),
+        'docs_examined': stats.get('totalDocsExamined'),
+        'returned': stats.get('nReturned'),
+    }
+
+
+def _with_cursor_values(query):
+    """Swap ``'$cursor'`` placeholders for concrete values of the right type"""
+    def replace(value, field=None):
+        if isinstance(value, dict):
+            return {key: replace(item, field if key.startswith('$') else key) for key, item in value.items()}
+        if isinstance(value, list):
+            return [replace(item, field) for item in value]
+        if value == '$cursor':
+            return 'ffffffff' if field == '_id' else datetime.utcnow()
+        return value
+
+    return replace(query)
@@ -0,0 +1,210 @@
+"""
+Background CSV import jobs.
+
+The import endpoint stores the upload on disk, records an ``ImportJob`` in
+Mongo and hands it to an in-process thread pool, so no broker is needed.
+Workers update the job's counters after every batch; clients poll
+``import/<job_id>/`` for progress and the final row errors.
+
+Each job records the process that enqueued it (``worker_id``), and a
+thread in that process refreshes ``heartbeat_at`` on all of its queued and
+running jobs every ``CSV_IMPORT_HEARTBEAT_SECONDS``, however long they
+wait in the pool or spend on one batch. A job whose process died stays
+``queued`` or ``running`` with a heartbeat that stops moving; after
+``CSV_IMPORT_STALE_MINUTES`` it is marked failed and its upload deleted by
+``fail_stale_jobs``, which runs when a process starts its worker pool and
+when a stale job is polled.
+"""
+import logging
+import os
+import socket
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from django.conf import settings
+from .models import ImportJob
+from .dedup import default_duplicate_policy
+from .tasks import process_csv_import, import_owner_id
+
+logger = logging.getLogger(__name__)
+
+# Longest raw cell kept in a stored row error (job documents are capped at 16MB)
+MAX_STORED_CELL_LENGTH = 200
+
+STALE_JOB_ERROR = 'Import was interrupted before it finished; please upload the file again.'
+
+# Identifies this process on the jobs it enqueues
+WORKER_ID = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def heartbeat():
+    """Mark this process's unfinished jobs as alive; returns how many"""
+    now = datetime.utcnow()
+    return sum(
+        ImportJob.objects(worker_id=WORKER_ID, status=job_status).update(set__heartbeat_at=now)
+        for job_status in ['queued', 'running']
+    )
+
+
+def _heartbeat_loop():
+    interval = getattr(settings, 'CSV_IMPORT_HEARTBEAT_SECONDS', 60)
+    while True:
+        time.sleep(interval)
+        try:
+            heartbeat()
+        except Exception:
+            logger.exception('Failed to heartbeat CSV import jobs')
+
+
+def get_executor():
+    """The shared worker pool and its heartbeat thread, created on first use"""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'CSV_IMPORT_WORKERS', 2),
+                thread_name_prefix='csv-import',
+            )
+            threading.Thread(target=_heartbeat_loop, name='csv-import-heartbeat', daemon=True).start()
+            # Clean up after workers of processes that died
+            try:
+                fail_stale_jobs()
+            except Exception:
+                logger.exception('Failed to sweep stale CSV import jobs')
+        return _executor
+
+
+def upload_dir():
+    path = getattr(settings, 'CSV_IMPORT_UPLOAD_DIR', None) or os.path.join(
+        tempfile.gettempdir(), 'buyer_leads_imports'
+    )
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def enqueue_import(file, user=None, stream=False, duplicates=None):
+    """Persist the upload, create a queued ``ImportJob`` and submit it to the pool"""
+    job = ImportJob(
+        file_name=file.name, stream=stream, owner_id=import_owner_id(user),
+        duplicate_policy=duplicates or default_duplicate_policy(),
+        worker_id=WORKER_ID, heartbeat_at=datetime.utcnow(),
+    )
+    job.file_path = os.path.join(upload_dir(), f'{job.id}.csv')
+    with open(job.file_path, 'wb') as destination:
+        for chunk in file.chunks():
+            destination.write(chunk)
+    job.save()
+
+    get_executor().submit(run_import_job, job.id)
+    return job
+
+
+def remove_upload(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def stale_cutoff():
+    return datetime.utcnow() - timedelta(minutes=getattr(settings, 'CSV_IMPORT_STALE_MINUTES', 30))
+
+
+def is_stale(job, cutoff=None):
+    """Whether the process holding an unfinished job has not heartbeated it since ``cutoff``"""
+    cutoff = cutoff or stale_cutoff()
+    return job.status in ['queued', 'running'] and job.heartbeat_at is not None and job.heartbeat_at < cutoff
+
+
+def fail_stale_jobs():
+    """Mark jobs abandoned by a dead process as failed and delete their uploads; returns how many"""
+    cutoff = stale_cutoff()
+    candidates = list(ImportJob.objects(status='queued', heartbeat_at__lt=cutoff))
+    candidates += list(ImportJob.objects(status='running', heartbeat_at__lt=cutoff))
+    failed = 0
+    for job in candidates:
+        # Conditional on the state we saw, so a job that moved on or was
+        # heartbeated in the meantime is left alone
+        if ImportJob.objects(id=job.id, status=job.status, heartbeat_at__lt=cutoff).update(
+            set__status='failed', set__error=STALE_JOB_ERROR, set__finished_at=datetime.utcnow(),
+        ):
+            remove_upload(job.file_path)
+            failed += 1
+    if failed:
+        logger.warning('Marked %d stale CSV import job(s) as failed', failed)
+    return failed
+
+
+def _cut(value):
+    if isinstance(value, str) and len(value) > MAX_STORED_CELL_LENGTH:
+        return value[:MAX_STORED_CELL_LENGTH] + '…'
+    return value
+
+
+def storable_error(error):
+    """
+    Row error with the raw CSV row keyed by strings (DictReader uses None
+    for extra cells) and each cell cut to ``MAX_STORED_CELL_LENGTH``
+    """
+    return dict(error, data={
+        str(key): [_cut(item) for item in value] if isinstance(value, list) else _cut(value)
+        for key, value in error['data'].items()
+    })
+
+
+def run_import_job(job_id):
+    """Process one queued job; safe to call for a job another worker already claimed"""
+    now = datetime.utcnow()
+    claimed = ImportJob.objects(id=job_id, status='queued').update(
+        set__status='running', set__started_at=now, set__heartbeat_at=now
+    )
+    if not claimed:
+        return
+    job = ImportJob.objects.get(id=job_id)
+
+    def progress(results):
+        ImportJob.objects(id=job_id, status='running').update(
+            set__heartbeat_at=datetime.utcnow(),
+            set__total_rows=results['total_rows'],
+            set__valid_rows=results['valid_rows'],
+            set__invalid_rows=results['invalid_rows'],
+            set__duplicate_rows=results['duplicate_rows'],
+        )
+
+    try:
+        with open(job.file_path, 'rb') as file:
+            results = process_csv_import(
+                file, stream=job.stream, progress=progress, owner_id=job.owner_id,
+                duplicates=job.duplicate_policy,
+            )
+    except Exception as e:
+        logger.exception('CSV import job %s crashed', job_id)
+        results = {'error': f'Failed to process CSV file: {str(e)}'}
+    finally:
+        remove_upload(job.file_path)
+
+    # A job swept as stale keeps its failed status
+    if 'error' in results:
+        ImportJob.objects(id=job_id, status='running').update(
+            set__status='failed',
+            set__error=results['error'],
+            set__finished_at=datetime.utcnow(),
+        )
+        return
+
+    ImportJob.objects(id=job_id, status='running').update(
+        set__status='completed',
+        set__total_rows=results['total_rows'],
+        set__valid_rows=results['valid_rows'],
+        set__invalid_rows=results['invalid_rows'],
+        set__errors=[storable_error(error) for error in results['errors']],
+        set__created_buyers=results['created_buyers'],
+        set__duplicate_rows=results['duplicate_rows'],
+        set__duplicates=results['duplicates'],
+        set__truncated=results.get('truncated', False),
+        set__finished_at=datetime.utcnow(),
+    )
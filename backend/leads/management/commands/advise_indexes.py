@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from leads.indexes import canonical_shapes, count_shapes, explain_count, explain_shape
+from leads.models import Buyer
+
+
+class Command(BaseCommand):
+    help = ('Create the buyer list indexes and explain() every list query and count shape, '
+            'flagging collection scans and in-memory sorts')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--no-create', action='store_true', help='Only report, do not create indexes')
+        parser.add_argument('--drop-redundant', action='store_true',
+                            help='Drop indexes on buyers that the model no longer declares')
+
+    def handle(self, *args, **options):
+        collection = Buyer._get_collection()
+        if not options['no_create']:
+            Buyer.ensure_indexes()
+
+        declared = {tuple(spec['fields']) for spec in Buyer._meta['index_specs']}
+        for name, info in collection.index_information().items():
+            if name == '_id_' or tuple(tuple(key) for key in info['key']) in declared:
+                continue
+            if options['drop_redundant']:
+                collection.drop_index(name)
+                self.stdout.write(f'dropped redundant index {name}')
+            else:
+                self.stdout.write(self.style.WARNING(f'redundant index {name} (use --drop-redundant)'))
+
+        summaries = [(name, explain_shape(collection, query, sort)) for name, query, sort in canonical_shapes()]
+        summaries += [(name, explain_count(collection, query)) for name, query in count_shapes()]
+        problems = 0
+        for name, summary in summaries:
+            line = (f"{name:<42} {' <- '.join(summary['stages']):<40} "
+                    f"keys={summary['keys_examined']} docs={summary['docs_examined']} "
+                    f"returned={summary['returned']}")
+            if summary['problems']:
+                problems += 1
+                self.stdout.write(self.style.WARNING(f"{line}  [{', '.join(summary['problems'])}]"))
+            else:
+                self.stdout.write(line)
+
+        if problems:
+            self.stdout.write(self.style.WARNING(f'{problems} query shapes need attention'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No collection scans or in-memory sorts'))
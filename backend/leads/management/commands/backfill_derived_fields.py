@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from leads.models import Buyer
+
+
+def backfill_derived_fields(batch_size=1000, only_missing=False):
+    """Recompute Buyer's derived fields from stored documents; returns the number updated"""
+    collection = Buyer._get_collection()
+    derived = list(Buyer.derived_values({}))
+    query = {'$or': [{field: {'$exists': False}} for field in derived]} if only_missing else {}
+    projection = {field: 1 for field in Buyer.DERIVED_SOURCE_FIELDS}
+
+    updated = 0
+    operations = []
+    for document in collection.find(query, projection).batch_size(batch_size):
+        operations.append(UpdateOne({'_id': document['_id']}, {'$set': Buyer.derived_values(document)}))
+        if len(operations) >= batch_size:
+            updated += collection.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        updated += collection.bulk_write(operations, ordered=False).modified_count
+    return updated
+
+
+class Command(BaseCommand):
+    help = 'Recompute derived buyer fields (search tokens, normalized phone and email) for existing leads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--only-missing', action='store_true',
+                            help='Only fill leads that have never had the fields computed')
+
+    def handle(self, *args, **options):
+        Buyer.ensure_indexes()
+        count = backfill_derived_fields(options['batch_size'], options['only_missing'])
+        self.stdout.write(self.style.SUCCESS(f'Updated {count} buyers'))
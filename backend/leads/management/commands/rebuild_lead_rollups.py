@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from leads.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the lead_rollups collection from the buyers collection'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        count = rebuild_rollups(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} rollup buckets'))
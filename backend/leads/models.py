@@ -1,6 +1,9 @@
-from mongoengine import Document, StringField, IntField, DateTimeField, ListField, ReferenceField, DictField, ValidationError
+from mongoengine import Document, StringField, IntField, DateTimeField, ListField, ReferenceField, DictField, BooleanField, ValidationError
 from datetime import datetime
 import uuid
+from .search import search_tokens
+from .indexes import list_indexes
+from utils.validators import normalize_email, normalize_phone_number
 
 class Buyer(Document):
     CITY_CHOICES = [
@@ -74,17 +77,24 @@ class Buyer(Document):
     owner_id = StringField(required=True)
     created_at = DateTimeField(default=datetime.utcnow)
     updated_at = DateTimeField(default=datetime.utcnow)
+    # Bumped by every update; PATCH may require it to match (optimistic concurrency)
+    version = IntField(default=0)
+    
+    # Derived from full_name/email/phone; kept current by refresh_derived_fields()
+    search_tokens = ListField(StringField())
+    phone_normalized = StringField()  # E.164, None when phone is not a valid mobile number
+    email_normalized = StringField()
+    
+    # Input fields the derived fields are computed from
+    DERIVED_SOURCE_FIELDS = ['full_name', 'email', 'phone']
     
     meta = {
         'collection': 'buyers',
         'indexes': [
             'owner_id',
-            'status',
-            'city',
-            'property_type',
-            'created_at',
-            ('full_name', 'email', 'phone'),  # Compound index for search
-        ]
+            ['phone_normalized', '-updated_at', '-id'],  # Exact phone lookups, already sorted
+            {'fields': ['email_normalized'], 'sparse': True},  # Import duplicate checks
+        ] + list_indexes()  # List sorts (and filters), analytics date ranges and token search, see leads/indexes.py
     }
     
     def clean(self):
@@ -96,9 +106,37 @@ class Buyer(Document):
         if self.budget_max < self.budget_min:
             raise ValidationError('Budget max must be greater than or equal to budget min')
     
+    @classmethod
+    def derived_values(cls, data):
+        """Derived field values for a dict holding DERIVED_SOURCE_FIELDS"""
+        return {
+            'search_tokens': search_tokens(data.get('full_name'), data.get('email'), data.get('phone')),
+            'phone_normalized': normalize_phone_number(data.get('phone')),
+            'email_normalized': normalize_email(data.get('email')),
+        }
+    
+    def refresh_derived_fields(self):
+        values = self.derived_values({field: getattr(self, field) for field in self.DERIVED_SOURCE_FIELDS})
+        for field, value in values.items():
+            setattr(self, field, value)
+    
     def save(self, *args, **kwargs):
         self.updated_at = datetime.utcnow()
+        if not self._created:
+            # Only written if the lead is still at the version read (raises
+            # SaveConditionError otherwise); _get_update_doc turns it into a $inc
+            version = self.version or 0
+            kwargs.setdefault('save_condition', {'version': version} if version else {'version__in': [0, None]})
+            self.version = version + 1
+        self.refresh_derived_fields()
         super().save(*args, **kwargs)
+    
+    def _get_update_doc(self):
+        update_doc = super()._get_update_doc()
+        if 'version' in update_doc.get('$set', {}):
+            del update_doc['$set']['version']
+            update_doc['$inc'] = {'version': 1}
+        return update_doc
 
 
 class BuyerHistory(Document):
@@ -111,7 +149,74 @@ class BuyerHistory(Document):
     meta = {
         'collection': 'buyer_history',
         'indexes': [
-            'buyer_id',
-            'changed_at',
+            # A lead's history newest first, with _id as the keyset tie-break
+            {'fields': ['buyer_id', '-changed_at', '-id']},
+        ]
+    }
+
+
+class LeadRollup(Document):
+    """Pre-aggregated lead counters for one day x city x source x status x property_type"""
+    id = StringField(primary_key=True)  # "<YYYY-MM-DD>|<city>|<source>|<status>|<property_type>"
+    day = DateTimeField(required=True)
+    city = StringField()
+    source = StringField()
+    status = StringField()
+    property_type = StringField()
+    count = IntField(default=0)
+    budget_min_sum = IntField(default=0)
+    budget_max_sum = IntField(default=0)
+    budgeted_count = IntField(default=0)
+    budgeted_min_sum = IntField(default=0)
+    budgeted_max_sum = IntField(default=0)
+    timeline = DictField()  # {timeline: count}
+    bhk = DictField()  # {bhk: count}
+    budget_ranges = DictField()  # {budget range key: count}
+    touched_at = DateTimeField()  # Server time of the last counted write
+    rebuilt_at = DateTimeField()  # Start of the rebuild that last recomputed it
+    
+    meta = {
+        'collection': 'lead_rollups',
+        'indexes': [
+            'day',
+        ]
+    }
+
+
+class ImportJob(Document):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+    
+    id = StringField(primary_key=True, default=lambda: str(uuid.uuid4()))
+    status = StringField(required=True, choices=STATUS_CHOICES, default='queued')
+    file_name = StringField()
+    file_path = StringField()
+    stream = BooleanField(default=False)
+    owner_id = StringField(required=True)
+    total_rows = IntField(default=0)
+    valid_rows = IntField(default=0)
+    invalid_rows = IntField(default=0)
+    errors = ListField(DictField())
+    created_buyers = ListField(StringField())
+    duplicate_policy = StringField(default='skip')
+    duplicate_rows = IntField(default=0)
+    duplicates = ListField(DictField())
+    truncated = BooleanField(default=False)
+    error = StringField()
+    created_at = DateTimeField(default=datetime.utcnow)
+    started_at = DateTimeField()
+    worker_id = StringField()  # Process that enqueued the job and heartbeats it
+    heartbeat_at = DateTimeField()
+    finished_at = DateTimeField()
+    
+    meta = {
+        'collection': 'import_jobs',
+        'indexes': [
+            'owner_id',
+            'status',
         ]
     }
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Keyset (cursor) pagination for the buyer list and buyer history.
+
+Pages are fetched with a range condition on ``(ordering field, _id)``
+instead of ``skip(n)``, so a page costs the same at any depth. Cursors are
+opaque base64 tokens holding the boundary document's sort value and id.
+The total is optional (``with_count=1``): unfiltered lists use the
+collection's estimated count, filtered ones a short-lived cached count.
+"""
+import base64
+import binascii
+import hashlib
+import json
+from datetime import datetime
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+from .models import Buyer, BuyerHistory
+
+DEFAULT_ORDERING = '-updated_at'
+
+
+def encode_cursor(position):
+    """Opaque token for a ``{'o': ordering, 'v': value, 'id': id, 'r': reverse}`` position"""
+    value = position['v']
+    if isinstance(value, datetime):
+        position = dict(position, v=value.isoformat(), t='dt')
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_cursor(token):
+    try:
+        position = json.loads(base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8'))
+        if position.pop('t', None) == 'dt':
+            position['v'] = datetime.fromisoformat(position['v'])
+        return {key: position[key] for key in ('o', 'v', 'id', 'r')}
+    except (binascii.Error, UnicodeError, ValueError, TypeError, KeyError, AttributeError):
+        raise NotFound('Invalid cursor')
+
+
+def parse_ordering(ordering, document=Buyer, default=DEFAULT_ORDERING):
+    """(field name, db field, direction) for an ``ordering`` param; unknown fields use the default"""
+    name = ordering.lstrip('-') if ordering else ''
+    if name not in document._fields:
+        return parse_ordering(default, document, default)
+    direction = -1 if ordering.startswith('-') else 1
+    return name, document._fields[name].db_field, direction
+
+
+def keyset_condition(db_field, value, last_id, direction):
+    """Raw filter for documents after ``(value, last_id)`` when sorted by ``direction``"""
+    op = '$gt' if direction == 1 else '$lt'
+    if db_field == '_id':
+        return {'_id': {op: last_id}}
+    # Nulls sort before every value ascending and after every value descending
+    if value is None:
+        conditions = [{db_field: None, '_id': {op: last_id}}]
+        if direction == 1:
+            conditions.append({db_field: {'$ne': None}})
+    else:
+        conditions = [{db_field: {op: value}}, {db_field: value, '_id': {op: last_id}}]
+        if direction == -1:
+            conditions.append({db_field: None})
+    return {'$or': conditions}
+
+
+def cached_total(queryset, request, ignored_params, document=Buyer, estimate_unfiltered=True):
+    """
+    Total for the list: estimated when unfiltered, otherwise counted and
+    cached briefly (per path and query params)
+    """
+    params = sorted(
+        (key, value) for key, value in request.query_params.lists()
+        if key not in ignored_params and key != 'ordering'
+    )
+    if not params and estimate_unfiltered:
+        return document._get_collection().estimated_document_count()
+
+    digest = hashlib.sha256(json.dumps([request.path, params]).encode('utf-8')).hexdigest()
+    key = f'{document._get_collection_name()}_list_count_{digest}'
+    total = cache.get(key)
+    if total is None:
+        total = queryset.count()
+        cache.set(key, total, getattr(settings, 'BUYER_LIST_COUNT_CACHE_SECONDS', 60))
+    return total
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over raw (``as_pymongo``) ``document`` querysets.
+
+    The ``ordering`` query param picks the sort field; ``id`` breaks ties
+    so every position is unique. Selected by passing ``cursor`` (empty for
+    the first page).
+    """
+    document = Buyer
+    default_ordering = DEFAULT_ORDERING
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'with_count'
+    # An unfiltered query is the whole collection (no filters from the URL path)
+    estimate_unfiltered = True
+
+    def get_ordering(self, request):
+        return request.query_params.get('ordering', self.default_ordering) or self.default_ordering
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'REST_FRAMEWORK', {}).get('PAGE_SIZE') or 10
+        try:
+            requested = int(request.query_params.get(self.page_size_query_param, page_size))
+        except ValueError:
+            return page_size
+        return max(1, min(requested, self.max_page_size))
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(request)
+        name, db_field, direction = parse_ordering(self.ordering, self.document, self.default_ordering)
+        page_size = self.get_page_size(request)
+
+        token = request.query_params.get(self.cursor_query_param)
+        position = decode_cursor(token) if token else None
+        if position and position['o'] != self.ordering:
+            raise NotFound('Invalid cursor')
+        reverse = bool(position and position['r'])
+        fetch_direction = -direction if reverse else direction
+
+        self.total = None
+        if request.query_params.get(self.count_query_param) in ('1', 'true'):
+            self.total = cached_total(queryset, request, {
+                self.cursor_query_param, self.page_size_query_param, self.count_query_param,
+            }, self.document, self.estimate_unfiltered)
+
+        if position:
+            queryset = queryset.filter(__raw__=keyset_condition(db_field, position['v'], position['id'], fetch_direction))
+        prefix = '' if fetch_direction == 1 else '-'
+        order = [f'{prefix}{name}', f'{prefix}id'] if name != 'id' else [f'{prefix}id']
+        documents = list(queryset.order_by(*order).limit(page_size + 1))
+
+        has_more = len(documents) > page_size
+        documents = documents[:page_size]
+        if reverse:
+            documents.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.db_field = db_field
+        self.documents = documents
+        return documents
+
+    def _link(self, document, reverse):
+        token = encode_cursor({
+            'o': self.ordering, 'v': document.get(self.db_field), 'id': document['_id'], 'r': reverse,
+        })
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, token)
+
+    def get_next_link(self):
+        if not self.has_next or not self.documents:
+            return None
+        return self._link(self.documents[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.documents:
+            return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, '')
+        return self._link(self.documents[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.total is not None:
+            response['count'] = self.total
+        return Response(response)
+
+
+class HistoryPagination(KeysetPagination):
+    """
+    Keyset pagination of one lead's history, newest first by default, served
+    by the ``(buyer_id, -changed_at, -_id)`` index.
+    """
+    document = BuyerHistory
+    default_ordering = '-changed_at'
+    estimate_unfiltered = False
+
+    def get_ordering(self, request):
+        ordering = request.query_params.get('ordering')
+        return ordering if ordering in ('changed_at', '-changed_at') else self.default_ordering
@@ -0,0 +1,136 @@
+"""
+Fast serialization of raw Mongo documents for read-only endpoints.
+
+``compile_representation`` turns a DRF serializer class into a plain
+function mapping ``as_pymongo()`` dicts to exactly what
+``serializer.data`` would contain for the hydrated documents, so list
+pages skip both mongoengine hydration and DRF's per-field dispatch.
+"""
+from datetime import timezone as dt_timezone
+from functools import lru_cache
+from django.conf import settings
+from django.utils import timezone
+from mongoengine.fields import ListField
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from .models import Buyer, BuyerHistory
+from .serializers import BuyerSerializer, BuyerHistorySerializer
+
+
+def _char(field):
+    return str
+
+
+def _integer(field):
+    return int
+
+
+def _choice(field):
+    choices = dict(field.choice_strings_to_values)
+
+    def convert(value):
+        if value in ('', None):
+            return value
+        return choices.get(str(value), value)
+    return convert
+
+
+def _list(field):
+    child = _converter(field.child)
+    return lambda value: [child(item) if item is not None else None for item in value]
+
+
+def _datetime(field):
+    output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+    if output_format is None or output_format.lower() != ISO_8601 or hasattr(field, 'timezone'):
+        return field.to_representation
+
+    def convert(value, field_timezone):
+        # DateTimeField.to_representation, with the current time zone
+        # looked up once per batch instead of per value
+        if not value or isinstance(value, str):
+            return value or None
+        if field_timezone is not None:
+            if timezone.is_aware(value):
+                value = value.astimezone(field_timezone)
+            else:
+                value = timezone.make_aware(value, field_timezone)
+        elif timezone.is_aware(value):
+            value = timezone.make_naive(value, dt_timezone.utc)
+        value = value.isoformat()
+        if value.endswith('+00:00'):
+            value = value[:-6] + 'Z'
+        return value
+    convert.zoned = True
+    return convert
+
+
+# Exact field class -> converter factory; other fields fall back to
+# their own to_representation
+_CONVERTERS = {
+    serializers.CharField: _char,
+    serializers.EmailField: _char,
+    serializers.IntegerField: _integer,
+    serializers.ChoiceField: _choice,
+    serializers.ListField: _list,
+    serializers.DateTimeField: _datetime,
+}
+
+
+def _converter(field):
+    factory = _CONVERTERS.get(type(field))
+    return factory(field) if factory else field.to_representation
+
+
+def _document_default(field):
+    """Value mongoengine gives a field missing from the stored document"""
+    if isinstance(field, ListField):
+        return []
+    if field.default is None or callable(field.default):
+        return None
+    return field.default
+
+
+def compile_representation(serializer_class, document):
+    """
+    Build ``represent(raws) -> list`` for ``serializer_class`` over raw
+    ``document`` dicts, plus the field names to project.
+    """
+    plan = []
+    for name, field in serializer_class().fields.items():
+        if field.write_only:
+            continue
+        model_field = document._fields[name]
+        convert = _converter(field)
+        plan.append((name, model_field.db_field, _document_default(model_field), convert,
+                     getattr(convert, 'zoned', False)))
+
+    def represent(raws):
+        field_timezone = timezone.get_current_timezone() if settings.USE_TZ else None
+        results = []
+        for raw in raws:
+            data = {}
+            for name, key, default, convert, zoned in plan:
+                value = raw.get(key, default)
+                if value is None:
+                    data[name] = None
+                elif zoned:
+                    data[name] = convert(value, field_timezone)
+                else:
+                    data[name] = convert(value)
+            results.append(data)
+        return results
+
+    return represent, [entry[0] for entry in plan]
+
+
+@lru_cache(maxsize=None)
+def buyer_representation():
+    """(represent, projected fields) for ``BuyerSerializer`` over raw ``buyers`` documents"""
+    return compile_representation(BuyerSerializer, Buyer)
+
+
+@lru_cache(maxsize=None)
+def history_representation():
+    """(represent, projected fields) for ``BuyerHistorySerializer`` over raw ``buyer_history`` documents"""
+    return compile_representation(BuyerHistorySerializer, BuyerHistory)
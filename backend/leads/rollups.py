@@ -0,0 +1,283 @@
+"""
+Incremental maintenance of the ``lead_rollups`` collection.
+
+Every write path reports the leads it created, changed or deleted here; the
+resulting counter deltas are merged per rollup bucket and applied with a
+single unordered ``bulk_write`` of ``$inc`` upserts, which also stamp the
+bucket's ``touched_at`` with the server's clock. Each report also bumps
+the analytics cache generation and the buyer list's ETag marker, whether
+or not rollups are enabled. A write made while rollups are disabled clears
+the rebuilt marker, so reports do not read the counters it was missed by.
+"""
+import logging
+import time
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from pymongo import ReplaceOne, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError
+from .models import Buyer, LeadRollup
+from .aggregations import (
+    ANALYTICS_BUDGET_RANGES,
+    DASHBOARD_BUDGET_RANGES,
+    ROLLUP_STATE_TTL,
+    clear_rollups_rebuilt,
+    in_budget_range,
+    is_budgeted,
+    mark_rollups_rebuilt,
+    rollup_state,
+    rollups_rebuilt,
+)
+from .timeseries import start_of_day
+from .analytics_cache import bump_generation
+from .etags import bump_list_marker
+
+ROLLUP_DIMENSIONS = ['city', 'source', 'status', 'property_type']
+
+# Buyer fields that affect rollup counters
+ROLLUP_FIELDS = ROLLUP_DIMENSIONS + ['created_at', 'budget_min', 'budget_max', 'timeline', 'bhk']
+
+# Passes over the buckets written to during a rebuild before it gives up waiting for a quiet one
+MAX_CATCH_UP_ROUNDS = 10
+
+logger = logging.getLogger(__name__)
+
+
+def rollups_enabled():
+    return getattr(settings, 'LEAD_ROLLUPS_ENABLED', False)
+
+
+def _skip_uncounted(buyers):
+    """Rollups are off: the counters miss these writes and need a rebuild before they are read"""
+    if buyers and rollups_rebuilt():
+        clear_rollups_rebuilt()
+
+
+def rollup_snapshot(buyer):
+    """The rollup-relevant fields of a ``Buyer`` document or raw dict"""
+    if isinstance(buyer, dict):
+        return {field: buyer.get(field) for field in ROLLUP_FIELDS}
+    return {field: getattr(buyer, field, None) for field in ROLLUP_FIELDS}
+
+
+def rollup_key(snapshot):
+    """(rollup id, dimension values) of the bucket a lead belongs to"""
+    day = start_of_day(snapshot['created_at'])
+    dimensions = {field: snapshot[field] for field in ROLLUP_DIMENSIONS}
+    rollup_id = '|'.join([day.strftime('%Y-%m-%d')] + [str(dimensions[field]) for field in ROLLUP_DIMENSIONS])
+    dimensions['day'] = day
+    return rollup_id, dimensions
+
+
+def budget_range_keys(budget_min, budget_max):
+    """Budget range keys a lead is counted in, across dashboard and analytics tables"""
+    keys = set()
+    if is_budgeted(budget_min, budget_max):
+        keys.update(
+            key for key, lower, upper in DASHBOARD_BUDGET_RANGES
+            if in_budget_range(budget_min, budget_max, lower, upper)
+        )
+    keys.update(
+        key for key, lower, upper in ANALYTICS_BUDGET_RANGES
+        if in_budget_range(budget_min, budget_max, lower, upper)
+    )
+    return keys
+
+
+def rollup_increments(snapshot, sign=1):
+    """Counter increments contributed by one lead (``sign=-1`` to remove it)"""
+    budget_min = snapshot['budget_min'] or 0
+    budget_max = snapshot['budget_max'] or 0
+    inc = {
+        'count': sign,
+        'budget_min_sum': sign * budget_min,
+        'budget_max_sum': sign * budget_max,
+    }
+    if is_budgeted(budget_min, budget_max):
+        inc['budgeted_count'] = sign
+        inc['budgeted_min_sum'] = sign * budget_min
+        inc['budgeted_max_sum'] = sign * budget_max
+    if snapshot['timeline']:
+        inc[f"timeline.{snapshot['timeline']}"] = sign
+    if snapshot['bhk']:
+        inc[f"bhk.{snapshot['bhk']}"] = sign
+    for key in budget_range_keys(budget_min, budget_max):
+        inc[f'budget_ranges.{key}'] = sign
+    return inc
+
+
+class RollupDelta:
+    """Accumulates counter changes per rollup bucket"""
+
+    def __init__(self):
+        self.increments = defaultdict(lambda: defaultdict(int))
+        self.dimensions = {}
+
+    def add(self, snapshot, sign=1):
+        rollup_id, dimensions = rollup_key(snapshot)
+        self.dimensions[rollup_id] = dimensions
+        for field, value in rollup_increments(snapshot, sign).items():
+            self.increments[rollup_id][field] += value
+
+    def operations(self):
+        operations = []
+        for rollup_id, increments in self.increments.items():
+            inc = {field: value for field, value in increments.items() if value}
+            if not inc:
+                continue
+            operations.append(UpdateOne(
+                {'_id': rollup_id},
+                {'$inc': inc, '$setOnInsert': self.dimensions[rollup_id], '$currentDate': {'touched_at': True}},
+                upsert=True,
+            ))
+        return operations
+
+    def documents(self, rebuilt_at=None):
+        """Complete rollup documents for the accumulated counters"""
+        documents = []
+        for rollup_id, increments in self.increments.items():
+            document = {'_id': rollup_id, 'rebuilt_at': rebuilt_at}
+            document.update(self.dimensions[rollup_id])
+            for field, value in increments.items():
+                if '.' in field:
+                    counter, key = field.split('.', 1)
+                    document.setdefault(counter, {})[key] = value
+                else:
+                    document[field] = value
+            documents.append(document)
+        return documents
+
+    def apply(self):
+        operations = self.operations()
+        if operations:
+            LeadRollup._get_collection().bulk_write(operations, ordered=False)
+
+
+def record_created(buyers):
+    """Count newly created leads (``Buyer`` documents or raw dicts)"""
+    bump_generation()
+    bump_list_marker()
+    if not rollups_enabled():
+        _skip_uncounted(buyers)
+        return
+    delta = RollupDelta()
+    for buyer in buyers:
+        delta.add(rollup_snapshot(buyer))
+    delta.apply()
+
+
+def record_deleted(buyers):
+    """Remove deleted leads from the counters"""
+    bump_generation()
+    bump_list_marker()
+    if not rollups_enabled():
+        _skip_uncounted(buyers)
+        return
+    delta = RollupDelta()
+    for buyer in buyers:
+        delta.add(rollup_snapshot(buyer), sign=-1)
+    delta.apply()
+
+
+def record_updated(changes):
+    """Move updated leads between buckets; ``changes`` is a list of (before, after) snapshots"""
+    bump_generation()
+    bump_list_marker()
+    if not rollups_enabled():
+        _skip_uncounted(changes)
+        return
+    delta = RollupDelta()
+    for before, after in changes:
+        if before == after:
+            continue
+        delta.add(before, sign=-1)
+        delta.add(after)
+    delta.apply()
+
+
+def server_time():
+    """The database server's clock, which also stamps ``touched_at``"""
+    state = rollup_state().find_one_and_update(
+        {'_id': 'clock'}, {'$currentDate': {'now': True}}, upsert=True, return_document=ReturnDocument.AFTER,
+    )
+    return state['now']
+
+
+def bucket_filter(dimensions):
+    """``buyers`` filter selecting the leads counted in one rollup bucket"""
+    query = {field: dimensions.get(field) for field in ROLLUP_DIMENSIONS}
+    query['created_at'] = {'$gte': dimensions['day'], '$lt': dimensions['day'] + timedelta(days=1)}
+    return query
+
+
+def _aggregate(query, batch_size):
+    delta = RollupDelta()
+    cursor = Buyer._get_collection().find(query, {field: 1 for field in ROLLUP_FIELDS}).batch_size(batch_size)
+    for document in cursor:
+        delta.add(rollup_snapshot(document))
+    return delta
+
+
+def _replace_untouched(collection, documents, since, batch_size):
+    """
+    Replace (or insert) rollup documents whose bucket no write has touched
+    since ``since``; touched buckets are left for the next catch-up round
+    """
+    untouched = {'touched_at': {'$not': {'$gte': since}}}
+    for start in range(0, len(documents), batch_size):
+        operations = [
+            ReplaceOne({'_id': document['_id'], **untouched}, document, upsert=True)
+            for document in documents[start:start + batch_size]
+        ]
+        try:
+            collection.bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # A touched bucket fails its filter, and its upsert hits the _id
+            if any(error['code'] != 11000 for error in e.details.get('writeErrors', [])):
+                raise
+
+
+def rebuild_rollups(batch_size=1000):
+    """
+    Recompute every rollup from the ``buyers`` collection, in place.
+
+    Writes keep being counted while the buyers are scanned, so a bucket is
+    only replaced if no write has touched it since the scan started. Each
+    catch-up round then re-aggregates the buckets touched since the last
+    pass from their own leads, until a round finds none, and no increment
+    is lost to the rebuild. Reports use the live aggregation from the start
+    until the rebuild completes. Returns the number of rollup documents.
+    """
+    if not rollups_enabled():
+        raise ImproperlyConfigured('Enable LEAD_ROLLUPS_ENABLED before rebuilding: writes are not counted while it is off')
+    if clear_rollups_rebuilt():
+        # Let other processes see the marker is gone before the counters change under them
+        time.sleep(ROLLUP_STATE_TTL)
+    collection = LeadRollup._get_collection()
+
+    started = server_time()
+    _replace_untouched(collection, _aggregate({}, batch_size).documents(rebuilt_at=started), started, batch_size)
+    # Buckets no lead is counted in any more
+    collection.delete_many({'rebuilt_at': {'$ne': started}, 'touched_at': {'$not': {'$gte': started}}})
+
+    since = started
+    for _ in range(MAX_CATCH_UP_ROUNDS):
+        round_started = server_time()
+        touched = list(collection.find({'touched_at': {'$gte': since}}, ['day'] + ROLLUP_DIMENSIONS))
+        if not touched:
+            break
+        delta = _aggregate({'$or': [bucket_filter(bucket) for bucket in touched]}, batch_size)
+        _replace_untouched(collection, delta.documents(rebuilt_at=started), round_started, batch_size)
+        emptied = [bucket['_id'] for bucket in touched if bucket['_id'] not in delta.increments]
+        if emptied:
+            collection.delete_many({'_id': {'$in': emptied}, 'touched_at': {'$lt': round_started}})
+        since = round_started
+    else:
+        logger.warning('Rollup buckets were still being written after %d catch-up rounds', MAX_CATCH_UP_ROUNDS)
+
+    LeadRollup.ensure_indexes()
+    buckets = collection.count_documents({})
+    mark_rollups_rebuilt(buckets)
+    bump_generation()
+    return buckets
@@ -0,0 +1,95 @@
+"""
+Token-based lead search.
+
+Every buyer stores ``search_tokens``: lowercased prefixes of the words in
+its name and email, plus prefixes of its phone digits. A multikey index on
+that field turns a search into an index lookup of the query's terms
+(``$all``) instead of three unanchored regexes over the whole collection.
+Matching is by word prefix: "pri sha" finds "Priya Sharma".
+"""
+import re
+from collections import namedtuple
+from mongoengine.queryset.visitor import Q
+from utils.validators import normalize_phone_number, phone_digits
+
+MIN_PREFIX_LENGTH = 2
+MAX_TOKEN_LENGTH = 32
+
+_WORD_RE = re.compile(r'[a-z0-9]+')
+_PHONE_PUNCTUATION_RE = re.compile(r'[\s\-+().]')
+
+SearchPlan = namedtuple('SearchPlan', ['kind', 'terms', 'query'])
+
+
+def _prefixes(token):
+    token = token[:MAX_TOKEN_LENGTH]
+    if len(token) <= MIN_PREFIX_LENGTH:
+        return [token]
+    return [token[:length] for length in range(MIN_PREFIX_LENGTH, len(token) + 1)]
+
+
+def search_tokens(full_name, email, phone):
+    """Sorted search tokens for a lead's name, email and phone"""
+    tokens = set()
+    for word in _WORD_RE.findall((full_name or '').lower()):
+        tokens.update(_prefixes(word))
+
+    email = (email or '').lower()
+    if email:
+        local, _, domain = email.partition('@')
+        tokens.update(_prefixes(email))
+        tokens.update(_prefixes(local))
+        for word in _WORD_RE.findall(local) + _WORD_RE.findall(domain):
+            tokens.update(_prefixes(word))
+        if domain:
+            tokens.add(domain[:MAX_TOKEN_LENGTH])
+
+    digits = phone_digits(phone)
+    if digits:
+        tokens.update(_prefixes(digits))
+    return sorted(tokens)
+
+
+def search_terms(search):
+    """
+    Index terms for a search string, or None when it cannot be served from
+    the tokens (e.g. a single-character word).
+    """
+    search = search.strip().lower()
+    if not search:
+        return None
+
+    compact = _PHONE_PUNCTUATION_RE.sub('', search)
+    if compact.isdigit():
+        # A partial number typed with its country code: "+91 98765"
+        if search.startswith('+91'):
+            compact = compact[2:]
+        terms = [phone_digits(compact)[:MAX_TOKEN_LENGTH]]
+    else:
+        terms = []
+        for part in search.split():
+            if '@' in part:
+                terms.append(part[:MAX_TOKEN_LENGTH])
+            else:
+                terms.extend(word[:MAX_TOKEN_LENGTH] for word in _WORD_RE.findall(part))
+
+    if not terms or any(len(term) < MIN_PREFIX_LENGTH for term in terms):
+        return None
+    return sorted(set(terms))
+
+
+def plan_search(search):
+    """
+    Pick how to run a list search: an equality lookup on ``phone_normalized``
+    for a complete phone number, an indexed ``$all`` over ``search_tokens``,
+    or a substring scan of name, email and phone when the terms are too
+    short to be indexed.
+    """
+    phone = normalize_phone_number(search) if _PHONE_PUNCTUATION_RE.sub('', search).isdigit() else None
+    if phone:
+        return SearchPlan('phone', [phone], Q(phone_normalized=phone))
+    terms = search_terms(search)
+    if terms:
+        return SearchPlan('tokens', terms, Q(search_tokens__all=terms))
+    search = search.strip()
+    return SearchPlan('scan', [], Q(full_name__icontains=search) | Q(email__icontains=search) | Q(phone__icontains=search))
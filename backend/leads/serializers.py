@@ -1,5 +1,9 @@
 from rest_framework import serializers
-from .models import Buyer, BuyerHistory
+from .models import Buyer
+from .rollups import record_created
+from .history import record_history
+from .dedup import DUPLICATE_POLICIES
+from .updates import update_buyer
 from utils.validators import validate_budget_range, validate_bhk_requirement
 
 class BuyerSerializer(serializers.Serializer):
@@ -21,14 +25,19 @@ class BuyerSerializer(serializers.Serializer):
     owner_id = serializers.CharField(read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
     updated_at = serializers.DateTimeField(read_only=True)
+    version = serializers.IntegerField(read_only=True)
     
     def validate(self, data):
         try:
-            # Validate BHK requirement
-            validate_bhk_requirement(data.get('property_type'), data.get('bhk'))
+            # A PATCH leaves the other field of a pair as stored; patch_buyer
+            # checks those pairs atomically (see leads/updates.py)
+            if not self.partial or {'property_type', 'bhk'} <= data.keys():
+                # Validate BHK requirement
+                validate_bhk_requirement(data.get('property_type'), data.get('bhk'))
             
-            # Validate budget range
-            validate_budget_range(data.get('budget_min'), data.get('budget_max'))
+            if not self.partial or {'budget_min', 'budget_max'} <= data.keys():
+                # Validate budget range
+                validate_budget_range(data.get('budget_min'), data.get('budget_max'))
         except ValueError as e:
             raise serializers.ValidationError(str(e))
         
@@ -44,40 +53,19 @@ class BuyerSerializer(serializers.Serializer):
         
         buyer = Buyer(**validated_data)
         buyer.save()
+        record_created([buyer])
         
-        # Create history entry
-        BuyerHistory(
-            buyer_id=buyer.id,
-            changed_by=validated_data['owner_id'],
-            diff={'action': 'created'}
-        ).save()
+        # Create history entry (written behind the request)
+        record_history(buyer.id, validated_data['owner_id'], {'action': 'created'})
         
         return buyer
     
     def update(self, instance, validated_data):
-        # Track changes for history
-        changes = {}
-        for field, new_value in validated_data.items():
-            old_value = getattr(instance, field)
-            if old_value != new_value:
-                changes[field] = f"{old_value} → {new_value}"
-        
-        # Update instance
-        for field, value in validated_data.items():
-            setattr(instance, field, value)
-        instance.save()
-        
-        # Create history entry if there are changes
-        if changes:
-            user_id = getattr(self.context.get('request'), 'user', None)
-            changed_by = str(user_id.id) if user_id and hasattr(user_id, 'id') else 'anonymous'
-            BuyerHistory(
-                buyer_id=instance.id,
-                changed_by=changed_by,
-                diff=changes
-            ).save()
-        
-        return instance
+        # Writes only the changed fields, guarded by the version that was read
+        # (raises VersionConflict, see leads/updates.py)
+        user_id = getattr(self.context.get('request'), 'user', None)
+        changed_by = str(user_id.id) if user_id and hasattr(user_id, 'id') else 'anonymous'
+        return update_buyer(instance, validated_data, changed_by, self.context.get('expected_version'))
 
 
 class BuyerHistorySerializer(serializers.Serializer):
@@ -88,15 +76,41 @@ class BuyerHistorySerializer(serializers.Serializer):
     diff = serializers.DictField(read_only=True)
 
 
+class ImportJobSerializer(serializers.Serializer):
+    id = serializers.CharField(read_only=True)
+    status = serializers.CharField(read_only=True)
+    file_name = serializers.CharField(read_only=True)
+    stream = serializers.BooleanField(read_only=True)
+    owner_id = serializers.CharField(read_only=True)
+    total_rows = serializers.IntegerField(read_only=True)
+    valid_rows = serializers.IntegerField(read_only=True)
+    invalid_rows = serializers.IntegerField(read_only=True)
+    errors = serializers.ListField(child=serializers.DictField(), read_only=True)
+    created_buyers = serializers.ListField(child=serializers.CharField(), read_only=True)
+    duplicate_policy = serializers.CharField(read_only=True)
+    duplicate_rows = serializers.IntegerField(read_only=True)
+    duplicates = serializers.ListField(child=serializers.DictField(), read_only=True)
+    truncated = serializers.BooleanField(read_only=True)
+    error = serializers.CharField(read_only=True)
+    created_at = serializers.DateTimeField(read_only=True)
+    started_at = serializers.DateTimeField(read_only=True)
+    finished_at = serializers.DateTimeField(read_only=True)
+
+
 class CSVImportSerializer(serializers.Serializer):
     file = serializers.FileField()
+    stream = serializers.BooleanField(required=False, default=False)
+    duplicates = serializers.ChoiceField(choices=DUPLICATE_POLICIES, required=False)
     
     def validate_file(self, value):
         if not value.name.endswith('.csv'):
             raise serializers.ValidationError("File must be a CSV file")
         
-        # Check file size (limit to ~5MB for 200 rows)
-        if value.size > 5 * 1024 * 1024:
-            raise serializers.ValidationError("File size too large")
+        return value
+    
+    def validate(self, data):
+        # Check file size (limit to ~5MB for 200 rows); streaming imports have no cap
+        if not data.get('stream') and data['file'].size > 5 * 1024 * 1024:
+            raise serializers.ValidationError({'file': "File size too large"})
         
-        return value
\ No newline at end of file
+        return data
\ No newline at end of file
@@ -1,70 +1,120 @@
+import codecs
 import csv
-import io
+import itertools
+from datetime import datetime
+from django.conf import settings
+from mongoengine import ValidationError
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
 from .models import Buyer, BuyerHistory
 from .serializers import BuyerSerializer
-from utils.validators import validate_csv_row
+from .rollups import record_created, record_updated, rollup_snapshot
+from .dedup import default_duplicate_policy, resolve_duplicates
+from .updates import version_filter
+from utils.validators import CSVRowValidator, validate_csv_rows
 
-def process_csv_import(file, user=None):
-    """Process CSV import with validation and error reporting"""
+# Row cap for regular (non-streaming) imports
+MAX_IMPORT_ROWS = 200
+
+def process_csv_import(file, user=None, stream=False, progress=None, owner_id=None, duplicates=None):
+    """
+    Process CSV import with validation and error reporting
+    
+    Rows are read, validated and written in batches of CSV_IMPORT_BATCH_SIZE.
+    Regular imports are capped at MAX_IMPORT_ROWS rows. With ``stream=True``
+    there is no row cap and memory stays flat: the file is decoded
+    incrementally, and only the first CSV_IMPORT_MAX_REPORTED_ROWS errors and
+    created ids are kept (``truncated`` is set when more were dropped).
+    ``progress`` is called with the running results after every batch.
+    ``owner_id`` overrides the owner derived from ``user``.
+    
+    Rows matching an existing lead (or an earlier row) by normalized email
+    or phone are handled by the ``duplicates`` policy (skip, update or
+    create; CSV_IMPORT_DUPLICATE_POLICY by default) and listed in
+    ``duplicates``.
+    """
     
     try:
-        # Read CSV content
-        content = file.read().decode('utf-8')
-        csv_reader = csv.DictReader(io.StringIO(content))
+        rows = iter_csv_rows(file)
         
         results = {
             'total_rows': 0,
             'valid_rows': 0,
             'invalid_rows': 0,
             'errors': [],
-            'created_buyers': []
+            'created_buyers': [],
+            'duplicate_rows': 0,
+            'duplicates': [],
         }
         
         # Check row limit
-        rows = list(csv_reader)
-        if len(rows) > 200:
-            return {
-                'error': 'CSV file contains more than 200 rows. Please split into smaller files.'
-            }
+        if not stream:
+            rows = list(itertools.islice(rows, MAX_IMPORT_ROWS + 1))
+            if len(rows) > MAX_IMPORT_ROWS:
+                return {
+                    'error': 'CSV file contains more than 200 rows. Please split into smaller files.'
+                }
         
-        results['total_rows'] = len(rows)
+        batch_size = getattr(settings, 'CSV_IMPORT_BATCH_SIZE', 1000)
+        report_limit = getattr(settings, 'CSV_IMPORT_MAX_REPORTED_ROWS', 1000) if stream else None
+        owner_id = owner_id or import_owner_id(user)
+        duplicates = duplicates or default_duplicate_policy()
+        validator = CSVRowValidator.from_document(Buyer)
+        numbered_rows = enumerate(rows, start=2)  # Start from 2 (header is row 1)
         
-        valid_buyers = []
-        
-        for row_num, row in enumerate(rows, start=2):  # Start from 2 (header is row 1)
-            # Validate row using the validator
-            validation_result = validate_csv_row(row)
+        while True:
+            batch = list(itertools.islice(numbered_rows, batch_size))
+            if not batch:
+                break
+            results['total_rows'] += len(batch)
             
-            if 'errors' in validation_result:
-                results['errors'].append({
-                    'row': row_num,
-                    'error': '; '.join(validation_result['errors']),
-                    'data': row
-                })
-                results['invalid_rows'] += 1
-            else:
-                valid_buyers.append(validation_result['data'])
-                results['valid_rows'] += 1
-        
-        # Bulk create valid buyers
-        if valid_buyers:
+            errors = []
+            valid_buyers = []
+            validation_results = validate_csv_rows(
+                [row for _, row in batch],
+                workers=getattr(settings, 'CSV_VALIDATION_WORKERS', 1),
+                min_parallel_rows=getattr(settings, 'CSV_VALIDATION_MIN_PARALLEL_ROWS', 5000),
+                validator=validator,
+            )
+            for (row_num, row), validation_result in zip(batch, validation_results):
+                if 'errors' in validation_result:
+                    errors.append({
+                        'row': row_num,
+                        'error': '; '.join(validation_result['errors']),
+                        'data': row
+                    })
+                else:
+                    valid_buyers.append((row_num, validation_result['data'], row))
+            
+            # Bulk create new buyers, update or skip duplicates
             created_buyers = []
-            owner_id = str(user.id) if user and hasattr(user, 'id') else 'anonymous'
+            updated_buyers = []
+            duplicate_rows = []
+            if valid_buyers:
+                to_create, to_update, duplicate_rows = resolve_duplicates(valid_buyers, duplicates)
+                if to_create:
+                    created_buyers, write_errors = bulk_create_buyers(to_create, owner_id, batch_size)
+                    errors.extend(write_errors)
+                if to_update:
+                    updated_buyers, write_errors, conflicts = bulk_update_buyers(to_update, owner_id)
+                    errors.extend(write_errors)
+                    for report in duplicate_rows:
+                        if report['row'] in conflicts:
+                            report['action'] = 'conflict'
+                errors.sort(key=lambda error: error['row'])
             
-            for buyer_data in valid_buyers:
-                buyer_data['owner_id'] = owner_id
-                buyer = Buyer(**buyer_data)
-                buyer.save()
-                created_buyers.append(buyer.id)
-                
-                # Create history entry
-                BuyerHistory(
-                    buyer_id=buyer.id,
-                    changed_by=owner_id,
-                    diff={'action': 'imported_from_csv'}
-                ).save()
+            results['valid_rows'] += len(created_buyers) + len(updated_buyers)
+            results['invalid_rows'] += len(errors)
+            results['duplicate_rows'] += len(duplicate_rows)
+            _report(results, 'errors', errors, report_limit)
+            _report(results, 'created_buyers', created_buyers, report_limit)
+            _report(results, 'duplicates', duplicate_rows, report_limit)
             
-            results['created_buyers'] = created_buyers
+            if progress:
+                progress(results)
+        
+        if stream:
+            results['created_count'] = results['valid_rows']
         
         return results
         
@@ -73,6 +123,201 @@ def process_csv_import(file, user=None):
             'error': f'Failed to process CSV file: {str(e)}'
         }
 
+def import_owner_id(user):
+    """The owner_id given to leads imported by ``user``"""
+    return str(user.id) if user and hasattr(user, 'id') else 'anonymous'
+
+def _report(results, key, items, limit):
+    """Append ``items`` to ``results[key]``, keeping at most ``limit`` entries"""
+    if limit is not None and len(results[key]) + len(items) > limit:
+        items = items[:max(limit - len(results[key]), 0)]
+        results['truncated'] = True
+    results[key].extend(items)
+
+def iter_csv_rows(file, chunk_size=64 * 1024):
+    """Yield CSV rows as dicts, reading and decoding the upload chunk by chunk"""
+    return csv.DictReader(_iter_lines(file, chunk_size))
+
+def _iter_lines(file, chunk_size):
+    if hasattr(file, 'chunks'):
+        chunks = file.chunks(chunk_size)
+    else:
+        chunks = iter(lambda: file.read(chunk_size), b'')
+    
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    pending = ''
+    for chunk in chunks:
+        pending += decoder.decode(chunk)
+        lines = pending.split('\n')
+        pending = lines.pop()
+        for line in lines:
+            yield line + '\n'
+    pending += decoder.decode(b'', final=True)
+    if pending:
+        yield pending
+
+def bulk_create_buyers(entries, owner_id, batch_size=None):
+    """
+    Insert validated CSV rows with batched, unordered ``insert_many`` calls.
+    
+    ``entries`` is a list of (row number, cleaned data, raw row). Each buyer is
+    validated once in Python (field checks and ``Buyer.clean``) instead of
+    going through ``save()``; its ``imported_from_csv`` history entry is
+    written in a second batch. Returns (created buyer ids, row errors).
+    """
+    batch_size = batch_size or getattr(settings, 'CSV_IMPORT_BATCH_SIZE', 1000)
+    created_buyers = []
+    errors = []
+    
+    for start in range(0, len(entries), batch_size):
+        batch = entries[start:start + batch_size]
+        documents = []
+        rows = []
+        now = datetime.utcnow()
+        
+        for row_num, buyer_data, row in batch:
+            buyer = Buyer(owner_id=owner_id, created_at=now, updated_at=now, **buyer_data)
+            buyer.refresh_derived_fields()
+            try:
+                buyer.validate()
+            except ValidationError as e:
+                errors.append({'row': row_num, 'error': str(e), 'data': row})
+                continue
+            documents.append(buyer.to_mongo().to_dict())
+            rows.append((row_num, row))
+        
+        if not documents:
+            continue
+        
+        failed = set()
+        try:
+            Buyer._get_collection().insert_many(documents, ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get('writeErrors', []):
+                row_num, row = rows[write_error['index']]
+                failed.add(write_error['index'])
+                errors.append({'row': row_num, 'error': write_error.get('errmsg', 'Write failed'), 'data': row})
+        
+        inserted = [document for index, document in enumerate(documents) if index not in failed]
+        if not inserted:
+            continue
+        
+        BuyerHistory._get_collection().insert_many([
+            BuyerHistory(
+                buyer_id=document['_id'],
+                changed_by=owner_id,
+                changed_at=now,
+                diff={'action': 'imported_from_csv'}
+            ).to_mongo().to_dict()
+            for document in inserted
+        ], ordered=False)
+        record_created(inserted)
+        created_buyers.extend(document['_id'] for document in inserted)
+    
+    return created_buyers, errors
+
+def bulk_update_buyers(updates, changed_by):
+    """
+    Apply the import rows that duplicate existing leads to those leads.
+    
+    ``updates`` is a list of ((row number, cleaned data, raw row), existing
+    raw document). Only the changed fields are written, with one unordered
+    ``bulk_write`` whose updates are guarded by the version that was read
+    (like ``bulk_patch_buyers``), so a lead edited since the duplicate check
+    is left alone and its row reported as a conflict. Applied leads get an
+    ``updated_from_csv`` history entry listing the changed fields; rows that
+    change nothing are not written. Returns (updated buyer ids, row errors,
+    conflicting row numbers).
+    """
+    now = datetime.utcnow()
+    # MongoDB keeps milliseconds; the stored updated_at identifies our writes
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000)
+    errors = []
+    operations = []
+    entries = []
+    unchanged = []
+    
+    for (row_num, buyer_data, row), existing in updates:
+        buyer = Buyer._from_son(existing)
+        version = buyer.version or 0
+        before = rollup_snapshot(buyer)
+        changes = {}
+        for field, new_value in buyer_data.items():
+            old_value = getattr(buyer, field)
+            if old_value != new_value:
+                changes[field] = f"{old_value} → {new_value}"
+                setattr(buyer, field, new_value)
+        if not changes:
+            unchanged.append(buyer.id)
+            continue
+        
+        buyer.updated_at = now
+        buyer.refresh_derived_fields()
+        try:
+            buyer.validate()
+        except ValidationError as e:
+            errors.append({'row': row_num, 'error': str(e), 'data': row})
+            continue
+        fields = list(changes) + ['updated_at']
+        if any(field in changes for field in Buyer.DERIVED_SOURCE_FIELDS):
+            fields += ['search_tokens', 'phone_normalized', 'email_normalized']
+        document = buyer.to_mongo()
+        values = {Buyer._fields[field].db_field: document.get(Buyer._fields[field].db_field) for field in fields}
+        operations.append(UpdateOne(
+            {'_id': buyer.id, 'version': version_filter(version)},
+            {'$set': values, '$inc': {'version': 1}},
+        ))
+        buyer.version = version + 1
+        entries.append((row_num, row, buyer, before, changes))
+    
+    if not operations:
+        return unchanged, errors, []
+    
+    failed = set()
+    collection = Buyer._get_collection()
+    try:
+        matched = collection.bulk_write(operations, ordered=False).matched_count
+    except BulkWriteError as e:
+        matched = e.details.get('nMatched', 0)
+        for write_error in e.details.get('writeErrors', []):
+            row_num, row = entries[write_error['index']][:2]
+            failed.add(write_error['index'])
+            errors.append({'row': row_num, 'error': write_error.get('errmsg', 'Write failed'), 'data': row})
+    
+    applied = [entry for index, entry in enumerate(entries) if index not in failed]
+    conflicts = []
+    if matched < len(applied):
+        # Some leads changed after the duplicate check; only ours carry this
+        # write's updated_at at the version it set
+        current = {
+            document['_id']: document
+            for document in collection.find(
+                {'_id': {'$in': [buyer.id for _, _, buyer, _, _ in applied]}}, {'version': 1, 'updated_at': 1},
+            )
+        }
+        written = []
+        for entry in applied:
+            buyer = entry[2]
+            document = current.get(buyer.id) or {}
+            if document.get('version') == buyer.version and document.get('updated_at') == now:
+                written.append(entry)
+            else:
+                conflicts.append(entry[0])
+        applied = written
+    
+    if applied:
+        BuyerHistory._get_collection().insert_many([
+            BuyerHistory(
+                buyer_id=buyer.id,
+                changed_by=changed_by,
+                changed_at=now,
+                diff=dict(changes, action='updated_from_csv')
+            ).to_mongo().to_dict()
+            for _, _, buyer, _, changes in applied
+        ], ordered=False)
+        record_updated([(before, rollup_snapshot(buyer)) for _, _, buyer, before, _ in applied])
+    return unchanged + [buyer.id for _, _, buyer, _, _ in applied], errors, conflicts
+
 def generate_csv_template():
     """Generate a CSV template with sample data"""
     template_data = [
@@ -110,4 +355,49 @@ def generate_csv_template():
         }
     ]
     
-    return template_data
\ No newline at end of file
+    return template_data
+
+# (header, Buyer field) pairs of the CSV export, in column order
+CSV_EXPORT_COLUMNS = [
+    ('Full Name', 'full_name'), ('Email', 'email'), ('Phone', 'phone'), ('City', 'city'),
+    ('Property Type', 'property_type'), ('BHK', 'bhk'), ('Purpose', 'purpose'),
+    ('Budget Min', 'budget_min'), ('Budget Max', 'budget_max'), ('Timeline', 'timeline'),
+    ('Source', 'source'), ('Status', 'status'), ('Notes', 'notes'), ('Tags', 'tags'),
+    ('Created At', 'created_at'), ('Updated At', 'updated_at'),
+]
+
+class _Echo:
+    """File-like object whose write() hands the formatted line back"""
+    
+    def write(self, value):
+        return value
+
+def iter_csv_export(queryset, batch_size=None, rows_per_chunk=500):
+    """
+    Yield the CSV export of ``queryset`` in text chunks.
+    
+    The header is yielded before the query runs. Documents are read from a
+    server-side cursor as raw dicts projected to the exported fields, so
+    memory does not grow with the number of leads.
+    """
+    writer = csv.writer(_Echo())
+    yield writer.writerow([header for header, _ in CSV_EXPORT_COLUMNS])
+    
+    batch_size = batch_size or getattr(settings, 'CSV_EXPORT_BATCH_SIZE', 1000)
+    fields = [field for _, field in CSV_EXPORT_COLUMNS]
+    cursor = queryset.only(*fields).as_pymongo().batch_size(batch_size)
+    
+    lines = []
+    for doc in cursor:
+        lines.append(writer.writerow([
+            doc.get('full_name'), doc.get('email'), doc.get('phone'), doc.get('city'),
+            doc.get('property_type'), doc.get('bhk') or '', doc.get('purpose'),
+            doc.get('budget_min'), doc.get('budget_max'), doc.get('timeline'),
+            doc.get('source'), doc.get('status'), doc.get('notes') or '',
+            ', '.join(doc.get('tags') or []), doc.get('created_at'), doc.get('updated_at')
+        ]))
+        if len(lines) >= rows_per_chunk:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
\ No newline at end of file
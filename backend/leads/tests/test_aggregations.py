@@ -0,0 +1,75 @@
+"""
+Tests for the dashboard aggregation pipeline
+"""
+from django.test import SimpleTestCase
+from leads.aggregations import (
+    BuyerSource,
+    budget_range_condition,
+    compute_dashboard_stats,
+    dashboard_stats_pipeline,
+)
+
+
+class FakeQuerySet:
+    def __init__(self, result):
+        self.result = result
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+        return iter(self.result)
+
+
+class DashboardAggregationTests(SimpleTestCase):
+    def test_budget_range_condition(self):
+        self.assertEqual(
+            budget_range_condition(None, 5000000),
+            {'$and': [{'$lt': ['$budget_max', 5000000]}]}
+        )
+        self.assertEqual(
+            budget_range_condition(5000000, 10000000),
+            {'$and': [{'$gte': ['$budget_min', 5000000]}, {'$lt': ['$budget_max', 10000000]}]}
+        )
+
+    def test_pipeline_has_all_facets(self):
+        facets = dashboard_stats_pipeline(BuyerSource())
+        self.assertEqual(
+            set(facets),
+            {'total', 'recent', 'status', 'city', 'property_type', 'timeline', 'budget'}
+        )
+
+    def test_single_round_trip_response_shape(self):
+        queryset = FakeQuerySet([{
+            'total': [{'count': 10}],
+            'recent': [{'count': 4}],
+            'status': [{'_id': 'new', 'count': 6}, {'_id': 'qualified', 'count': 3},
+                       {'_id': 'converted', 'count': 1}],
+            'city': [{'_id': 'pune', 'count': 10}],
+            'property_type': [{'_id': 'plot', 'count': 10}],
+            'timeline': [{'_id': 'immediate', 'count': 10}],
+            'budget': [{
+                '_id': None, 'count': 8, 'budget_min_sum': 8000000, 'budget_max_sum': 16000000,
+                'under_50L': 8, '50L_1Cr': 0, '1Cr_2Cr': 0, 'above_2Cr': 0,
+            }],
+        }])
+
+        stats = compute_dashboard_stats(source=BuyerSource(queryset))
+
+        self.assertEqual(len(queryset.pipelines), 1)
+        self.assertEqual(stats['total_leads'], 10)
+        self.assertEqual(stats['recent_leads'], 4)
+        self.assertEqual(stats['conversion_rate'], 40.0)
+        self.assertEqual(stats['avg_budget_min'], 1000000)
+        self.assertEqual(stats['avg_budget_max'], 2000000)
+        self.assertEqual(stats['status_counts']['contacted'], {'name': 'Contacted', 'count': 0})
+        self.assertEqual(stats['city_counts']['pune'], {'name': 'Pune', 'count': 10})
+        self.assertEqual(stats['budget_ranges']['under_50L'], 8)
+        self.assertEqual(stats['timeline_counts']['immediate']['count'], 10)
+
+    def test_empty_collection(self):
+        stats = compute_dashboard_stats(source=BuyerSource(FakeQuerySet([])))
+        self.assertEqual(stats['total_leads'], 0)
+        self.assertEqual(stats['conversion_rate'], 0)
+        self.assertEqual(stats['budget_ranges'], {
+            'under_50L': 0, '50L_1Cr': 0, '1Cr_2Cr': 0, 'above_2Cr': 0,
+        })
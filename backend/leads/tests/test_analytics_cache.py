@@ -0,0 +1,80 @@
+"""
+Tests for the analytics response cache
+"""
+from unittest.mock import patch
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from leads import analytics_cache
+from leads.analytics_cache import bump_generation, cached_result
+from leads.rollups import record_created
+
+
+class SynchronousExecutor:
+    def __init__(self):
+        self.submitted = 0
+
+    def submit(self, func, *args):
+        self.submitted += 1
+        func(*args)
+
+
+class Counter:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return {'total': self.calls}
+
+
+@override_settings(ANALYTICS_CACHE_SECONDS=60, ANALYTICS_CACHE_STALE_SECONDS=3600, LEAD_ROLLUPS_ENABLED=False)
+class AnalyticsCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.executor = SynchronousExecutor()
+        patcher = patch.object(analytics_cache, 'get_refresh_executor', return_value=self.executor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_second_request_is_a_hit(self):
+        compute = Counter()
+        self.assertEqual(cached_result('analytics_data', {'days': 30}, compute), ({'total': 1}, 'miss'))
+        self.assertEqual(cached_result('analytics_data', {'days': 30}, compute), ({'total': 1}, 'hit'))
+        self.assertEqual(compute.calls, 1)
+
+    def test_params_are_cached_separately(self):
+        compute = Counter()
+        cached_result('analytics_data', {'days': 30}, compute)
+        self.assertEqual(cached_result('analytics_data', {'days': 7}, compute)[1], 'miss')
+
+    @patch('leads.rollups.bump_list_marker')
+    def test_write_serves_stale_and_refreshes_in_background(self, bump_list_marker):
+        compute = Counter()
+        cached_result('dashboard_stats', {}, compute)
+        record_created([])
+
+        self.assertEqual(cached_result('dashboard_stats', {}, compute), ({'total': 1}, 'stale'))
+        self.assertEqual(self.executor.submitted, 1)
+        self.assertEqual(cached_result('dashboard_stats', {}, compute), ({'total': 2}, 'hit'))
+
+    def test_expired_entry_is_served_stale(self):
+        compute = Counter()
+        with patch('leads.analytics_cache.time.time', return_value=1000.0):
+            cached_result('analytics_trends', {}, compute)
+        with patch('leads.analytics_cache.time.time', return_value=1061.0):
+            self.assertEqual(cached_result('analytics_trends', {}, compute)[1], 'stale')
+
+    def test_only_one_refresh_is_started(self):
+        compute = Counter()
+        cached_result('dashboard_stats', {}, compute)
+        bump_generation()
+        self.executor.submit = lambda func, *args: setattr(self.executor, 'submitted', self.executor.submitted + 1)
+        for _ in range(3):
+            self.assertEqual(cached_result('dashboard_stats', {}, compute)[1], 'stale')
+        self.assertEqual(self.executor.submitted, 1)
+
+    @override_settings(ANALYTICS_CACHE_SECONDS=0)
+    def test_disabled_cache_always_computes(self):
+        compute = Counter()
+        cached_result('dashboard_stats', {}, compute)
+        self.assertEqual(cached_result('dashboard_stats', {}, compute), ({'total': 2}, 'miss'))
@@ -0,0 +1,162 @@
+"""
+Tests for bulk updates and deletes of leads
+"""
+import copy
+from unittest import mock
+from django.test import SimpleTestCase
+from pymongo.results import BulkWriteResult, DeleteResult
+from rest_framework.test import APIRequestFactory
+from leads.bulk import bulk_delete_buyers, bulk_patch_buyers
+from leads.models import Buyer
+from leads.views import bulk_buyers
+from leads.tests.test_updates import FakeBuyerCollection, matches, stored_buyer
+
+
+class FakeBulkCollection(FakeBuyerCollection):
+    def __init__(self, *documents):
+        super().__init__(*documents)
+        self.before_write = None
+
+    def find(self, query, projection=None):
+        ids = query['_id']['$in']
+        return [copy.deepcopy(self.documents[buyer_id]) for buyer_id in ids if buyer_id in self.documents]
+
+    def bulk_write(self, operations, ordered=True):
+        self.writes.append(('bulk_write', operations))
+        if self.before_write:
+            self.before_write()
+        matched = 0
+        for operation in operations:
+            document = self.documents.get(operation._filter['_id'])
+            if document is not None and matches(document, operation._filter):
+                self._apply(document, operation._doc)
+                matched += 1
+        return BulkWriteResult({'nMatched': matched, 'nModified': matched}, True)
+
+    def delete_many(self, query):
+        ids = [buyer_id for buyer_id in query['_id']['$in'] if buyer_id in self.documents]
+        for buyer_id in ids:
+            del self.documents[buyer_id]
+        return DeleteResult({'n': len(ids)}, True)
+
+
+def leads(*statuses):
+    return FakeBulkCollection(*[
+        stored_buyer(_id=f'b{index}', status=lead_status, version=1) for index, lead_status in enumerate(statuses)
+    ])
+
+
+@mock.patch('leads.bulk.history_writer')
+@mock.patch('leads.bulk.record_updated')
+class BulkPatchTests(SimpleTestCase):
+    def patch(self, collection, buyer_ids, data, **kwargs):
+        with mock.patch.object(Buyer, '_get_collection', return_value=collection):
+            return bulk_patch_buyers(buyer_ids, data, 'u2', **kwargs)
+
+    def test_one_read_and_one_write_for_all_leads(self, record_updated, history_writer):
+        collection = leads('new', 'new', 'qualified')
+        results = self.patch(collection, ['b0', 'b1', 'b2', 'missing'], {'status': 'qualified'})
+
+        self.assertEqual([result['status'] for result in results], ['updated', 'updated', 'unchanged', 'not_found'])
+        self.assertEqual([name for name, *_ in collection.writes], ['bulk_write'])
+        self.assertEqual(len(collection.writes[0][1]), 2)
+        self.assertEqual(collection.documents['b0']['status'], 'qualified')
+        self.assertEqual(collection.documents['b0']['version'], 2)
+        self.assertEqual(collection.documents['b2']['version'], 1)
+
+        entries, = history_writer.return_value.add_many.call_args[0]
+        self.assertEqual([entry['buyer_id'] for entry in entries], ['b0', 'b1'])
+        self.assertEqual(entries[0]['diff'], {'status': 'new → qualified', 'action': 'bulk_updated'})
+        self.assertEqual(len(record_updated.call_args[0][0]), 2)
+
+    def test_rule_violations_are_reported_per_lead(self, record_updated, history_writer):
+        collection = leads('new', 'new')
+        collection.documents['b1']['budget_max'] = 6000000
+        results = self.patch(collection, ['b0', 'b1'], {'budget_min': 7000000})
+
+        self.assertEqual(results[0]['status'], 'updated')
+        self.assertEqual(results[1]['status'], 'invalid')
+        self.assertIn('budget', results[1]['error'].lower())
+        self.assertEqual(collection.documents['b1']['budget_min'], 5000000)
+
+    def test_expected_versions(self, record_updated, history_writer):
+        collection = leads('new', 'new')
+        results = self.patch(collection, ['b0', 'b1'], {'status': 'lost'}, expected_versions={'b0': 1, 'b1': 0})
+        self.assertEqual(results[0], {'id': 'b0', 'status': 'updated', 'version': 2})
+        self.assertEqual(results[1], {'id': 'b1', 'status': 'conflict', 'version': 1})
+
+    def test_lead_changed_during_the_write_is_a_conflict(self, record_updated, history_writer):
+        collection = leads('new', 'new')
+
+        def concurrent_update():
+            collection.documents['b1'].update(status='contacted', version=2)
+        collection.before_write = concurrent_update
+
+        results = self.patch(collection, ['b0', 'b1'], {'status': 'lost'})
+        self.assertEqual([result['status'] for result in results], ['updated', 'conflict'])
+        self.assertEqual(collection.documents['b1']['status'], 'contacted')
+        entries, = history_writer.return_value.add_many.call_args[0]
+        self.assertEqual([entry['buyer_id'] for entry in entries], ['b0'])
+
+    def test_contact_changes_refresh_derived_fields(self, record_updated, history_writer):
+        collection = leads('new')
+        self.patch(collection, ['b0'], {'phone': '9123456789'})
+        self.assertEqual(collection.documents['b0']['phone_normalized'], '+919123456789')
+
+
+@mock.patch('leads.bulk.record_deleted')
+class BulkDeleteTests(SimpleTestCase):
+    def test_deletes_found_leads_in_one_write(self, record_deleted):
+        collection = leads('new', 'won')
+        with mock.patch.object(Buyer, '_get_collection', return_value=collection):
+            results = bulk_delete_buyers(['b0', 'missing', 'b1'])
+
+        self.assertEqual([result['status'] for result in results], ['deleted', 'not_found', 'deleted'])
+        self.assertEqual(collection.documents, {})
+        self.assertEqual(len(record_deleted.call_args[0][0]), 2)
+
+
+@mock.patch('leads.views.bulk_patch_buyers')
+class BulkEndpointTests(SimpleTestCase):
+    def request(self, method, data, url='/api/leads/buyers/bulk/'):
+        request = getattr(APIRequestFactory(), method)(url, data, format='json')
+        return bulk_buyers(request)
+
+    def test_patch_returns_results_and_counts(self, bulk_patch):
+        bulk_patch.return_value = [
+            {'id': 'b0', 'status': 'updated', 'version': 2}, {'id': 'b1', 'status': 'not_found'},
+        ]
+        response = self.request('patch', {'ids': ['b0', 'b1', 'b0'], 'patch': {'status': 'qualified'}, 'versions': {'b0': '1'}})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['counts'], {'updated': 1, 'not_found': 1})
+        buyer_ids, data, changed_by, versions = bulk_patch.call_args[0]
+        self.assertEqual((buyer_ids, dict(data), versions), (['b0', 'b1'], {'status': 'qualified'}, {'b0': 1}))
+
+    def test_invalid_patch_is_400(self, bulk_patch):
+        self.assertEqual(self.request('patch', {'ids': ['b0'], 'patch': {'status': 'bogus'}}).status_code, 400)
+        self.assertEqual(self.request('patch', {'ids': ['b0']}).status_code, 400)
+        bulk_patch.assert_not_called()
+
+    def test_requires_ids_or_a_filter(self, bulk_patch):
+        self.assertEqual(self.request('patch', {'patch': {'status': 'lost'}}).status_code, 400)
+        self.assertEqual(self.request('delete', {'ids': []}).status_code, 400)
+
+    def test_too_many_ids_is_400(self, bulk_patch):
+        ids = [f'b{index}' for index in range(501)]
+        self.assertEqual(self.request('patch', {'ids': ids, 'patch': {'status': 'lost'}}).status_code, 400)
+
+    @mock.patch('leads.views.bulk_delete_buyers')
+    def test_filter_selects_leads(self, bulk_delete, bulk_patch):
+        bulk_delete.return_value = [{'id': 'b0', 'status': 'deleted'}]
+        queryset = mock.MagicMock()
+        queryset.all.return_value = queryset
+        queryset.filter.return_value = queryset
+        queryset.order_by.return_value = queryset
+        queryset.limit.return_value.scalar.return_value = ['b0']
+        with mock.patch.object(Buyer, 'objects', queryset):
+            response = self.request('delete', {}, url='/api/leads/buyers/bulk/?status=lost')
+
+        self.assertEqual(response.status_code, 200)
+        queryset.filter.assert_called_once_with(status='lost')
+        bulk_delete.assert_called_once_with(['b0'])
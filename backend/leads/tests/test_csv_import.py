@@ -0,0 +1,333 @@
+"""
+Tests for the batched CSV import write path
+"""
+import csv
+import io
+from datetime import datetime
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from pymongo.errors import BulkWriteError
+from pymongo.results import BulkWriteResult
+from leads.models import Buyer, BuyerHistory
+from utils import validators
+from leads.dedup import resolve_duplicates
+from leads.tasks import (
+    bulk_create_buyers, bulk_update_buyers, iter_csv_rows, iter_csv_export, process_csv_import,
+    generate_csv_template
+)
+
+
+def buyer_data(**overrides):
+    data = {
+        'full_name': 'John Doe',
+        'email': 'john.doe@example.com',
+        'phone': '9876543210',
+        'city': 'mumbai',
+        'property_type': 'plot',
+        'purpose': 'buy',
+        'budget_min': 5000000,
+        'budget_max': 8000000,
+        'timeline': '3months',
+        'source': 'website',
+        'status': 'new',
+        'notes': '',
+        'tags': [],
+    }
+    data.update(overrides)
+    return data
+
+
+class FakeCollection:
+    def __init__(self, fail_indexes=(), stored=()):
+        self.fail_indexes = fail_indexes
+        self.stored = {document['_id']: document for document in stored}
+        self.batches = []
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append(list(documents))
+        self.raise_failures()
+
+    def bulk_write(self, operations, ordered=True):
+        self.batches.append([{'filter': operation._filter, 'update': operation._doc} for operation in operations])
+        self.raise_failures()
+        matched = 0
+        for operation in operations:
+            document = self.stored.get(operation._filter['_id'])
+            expected = operation._filter['version']
+            versions = expected['$in'] if isinstance(expected, dict) else [expected]
+            if document is not None and document.get('version') in versions:
+                document.update(operation._doc['$set'], version=(document.get('version') or 0) + 1)
+                matched += 1
+        return BulkWriteResult({'nMatched': matched, 'nModified': matched}, True)
+
+    def find(self, query, projection=None):
+        return [document for buyer_id, document in self.stored.items() if buyer_id in query['_id']['$in']]
+
+    def raise_failures(self):
+        if self.fail_indexes:
+            raise BulkWriteError({'writeErrors': [
+                {'index': index, 'errmsg': 'E11000 duplicate key error'} for index in self.fail_indexes
+            ]})
+
+
+@mock.patch('leads.tasks.record_created')
+class BulkCreateBuyersTests(SimpleTestCase):
+    def test_batches_buyers_and_history(self, record_created):
+        buyers, history = FakeCollection(), FakeCollection()
+        entries = [(row, buyer_data(), {}) for row in range(2, 7)]
+        with mock.patch.object(Buyer, '_get_collection', return_value=buyers), \
+                mock.patch.object(BuyerHistory, '_get_collection', return_value=history):
+            created, errors = bulk_create_buyers(entries, 'owner', batch_size=2)
+
+        self.assertEqual(errors, [])
+        self.assertEqual([len(batch) for batch in buyers.batches], [2, 2, 1])
+        self.assertEqual([len(batch) for batch in history.batches], [2, 2, 1])
+        self.assertEqual(created, [doc['_id'] for batch in buyers.batches for doc in batch])
+        self.assertEqual(history.batches[0][0]['diff'], {'action': 'imported_from_csv'})
+        self.assertEqual(buyers.batches[0][0]['owner_id'], 'owner')
+        self.assertEqual(record_created.call_count, 3)
+
+    def test_model_validation_and_write_errors_map_to_rows(self, record_created):
+        buyers, history = FakeCollection(fail_indexes=[1]), FakeCollection()
+        entries = [
+            (2, buyer_data(), {'n': 2}),
+            (3, buyer_data(property_type='villa'), {'n': 3}),  # missing BHK
+            (4, buyer_data(), {'n': 4}),
+            (5, buyer_data(), {'n': 5}),
+        ]
+        with mock.patch.object(Buyer, '_get_collection', return_value=buyers), \
+                mock.patch.object(BuyerHistory, '_get_collection', return_value=history):
+            created, errors = bulk_create_buyers(entries, 'owner')
+
+        self.assertEqual([error['row'] for error in errors], [3, 4])
+        self.assertIn('BHK is required', errors[0]['error'])
+        self.assertEqual(errors[1]['data'], {'n': 4})
+        self.assertEqual(len(created), 2)
+        self.assertEqual(len(history.batches[0]), 2)
+
+
+def csv_file(rows, extra_invalid=0):
+    """An uploaded CSV with ``rows`` valid template rows and some invalid ones"""
+    template = generate_csv_template()[0]
+    header = ','.join(template)
+    lines = [
+        ','.join(f'"{value}"' for value in dict(template, email=f'lead{index}@example.com', phone=f'9{index:09d}').values())
+        for index in range(rows)
+    ]
+    body = [header] + lines + ['Bad Row,,,,,,,,,,,,,'] * extra_invalid
+    return SimpleUploadedFile('leads.csv', ('\n'.join(body) + '\n').encode('utf-8'))
+
+
+def fake_bulk_create(entries, owner_id, batch_size=None):
+    return [f'id-{row_num}' for row_num, _, _ in entries], []
+
+
+class StreamingImportTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch('leads.dedup.fetch_existing', return_value=[])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_decodes_across_chunk_boundaries(self):
+        content = 'full_name,notes\r\n"Zoë Ålander","line one\nline two"\r\nRaj,é\r\n'.encode('utf-8')
+        rows = list(iter_csv_rows(io.BytesIO(content), chunk_size=3))
+        self.assertEqual(rows, [
+            {'full_name': 'Zoë Ålander', 'notes': 'line one\nline two'},
+            {'full_name': 'Raj', 'notes': 'é'},
+        ])
+
+    @mock.patch('leads.tasks.bulk_create_buyers', side_effect=fake_bulk_create)
+    def test_regular_import_keeps_row_cap(self, bulk_create):
+        result = process_csv_import(csv_file(201))
+        self.assertIn('more than 200 rows', result['error'])
+        bulk_create.assert_not_called()
+
+    @override_settings(CSV_IMPORT_BATCH_SIZE=100, CSV_IMPORT_MAX_REPORTED_ROWS=50)
+    @mock.patch('leads.tasks.bulk_create_buyers', side_effect=fake_bulk_create)
+    def test_stream_import_batches_and_truncates(self, bulk_create):
+        progress = []
+        result = process_csv_import(
+            csv_file(450, extra_invalid=3), stream=True,
+            progress=lambda results: progress.append(results['total_rows'])
+        )
+
+        self.assertEqual(progress, [100, 200, 300, 400, 453])
+        self.assertEqual(bulk_create.call_count, 5)
+        self.assertEqual(result['total_rows'], 453)
+        self.assertEqual(result['valid_rows'], 450)
+        self.assertEqual(result['created_count'], 450)
+        self.assertEqual(result['invalid_rows'], 3)
+        self.assertEqual(len(result['created_buyers']), 50)
+        self.assertEqual([error['row'] for error in result['errors']], [452, 453, 454])
+        self.assertTrue(result['truncated'])
+
+    @override_settings(CSV_IMPORT_BATCH_SIZE=100, CSV_VALIDATION_WORKERS=2, CSV_VALIDATION_MIN_PARALLEL_ROWS=50)
+    @mock.patch('leads.tasks.bulk_create_buyers', side_effect=fake_bulk_create)
+    def test_stream_import_validates_batches_in_the_pool(self, bulk_create):
+        with mock.patch('utils.validators._get_validation_pool', wraps=validators._get_validation_pool) as get_pool:
+            result = process_csv_import(csv_file(120, extra_invalid=2), stream=True)
+
+        # The full batch is sharded across two workers; the 22-row tail is below the minimum
+        get_pool.assert_called_once_with(2)
+        self.assertEqual(result['total_rows'], 122)
+        self.assertEqual(result['created_count'], 120)
+        self.assertEqual([error['row'] for error in result['errors']], [122, 123])
+
+
+class FakeExportQuerySet:
+    def __init__(self, documents):
+        self.documents = documents
+        self.calls = []
+
+    def only(self, *fields):
+        self.calls.append(('only', fields))
+        return self
+
+    def as_pymongo(self):
+        self.calls.append(('as_pymongo',))
+        return self
+
+    def batch_size(self, size):
+        self.calls.append(('batch_size', size))
+        return iter(self.documents)
+
+
+class CSVExportTests(SimpleTestCase):
+    def test_streams_header_then_row_chunks(self):
+        created = datetime(2024, 5, 1, 10, 30, 0, 123000)
+        documents = [
+            dict(buyer_data(bhk='2bhk', tags=['hot', 'nri'], notes='a, "b"'), created_at=created, updated_at=created),
+            dict(buyer_data(notes=None), created_at=created, updated_at=created),
+            dict(buyer_data(), created_at=created, updated_at=created),
+        ]
+        queryset = FakeExportQuerySet(documents)
+        export = iter_csv_export(queryset, batch_size=50, rows_per_chunk=2)
+
+        header = next(export)
+        self.assertEqual(queryset.calls, [])  # header is sent before the query runs
+        self.assertTrue(header.startswith('Full Name,Email,Phone'))
+
+        chunks = list(export)
+        self.assertEqual(len(chunks), 2)
+        self.assertEqual(queryset.calls[1:], [('as_pymongo',), ('batch_size', 50)])
+        self.assertNotIn('owner_id', queryset.calls[0][1])
+
+        rows = list(csv.reader(io.StringIO(header + ''.join(chunks))))
+        self.assertEqual(rows[1], [
+            'John Doe', 'john.doe@example.com', '9876543210', 'mumbai', 'plot', '2bhk', 'buy',
+            '5000000', '8000000', '3months', 'website', 'new', 'a, "b"', 'hot, nri',
+            '2024-05-01 10:30:00.123000', '2024-05-01 10:30:00.123000',
+        ])
+        self.assertEqual(rows[2][5], '')
+        self.assertEqual(rows[2][12], '')
+        self.assertEqual(len(rows), 4)
+
+
+def existing_buyer(**overrides):
+    document = dict(buyer_data(**overrides), _id='existing-1', owner_id='someone',
+                    created_at=datetime(2024, 1, 1), updated_at=datetime(2024, 1, 1))
+    document.update(Buyer.derived_values(document))
+    return document
+
+
+def entry(row_num, **overrides):
+    return (row_num, buyer_data(**overrides), {'n': row_num})
+
+
+class DuplicateImportTests(SimpleTestCase):
+    def resolve(self, entries, policy, existing=()):
+        with mock.patch('leads.dedup.fetch_existing', return_value=list(existing)) as fetch:
+            result = resolve_duplicates(entries, policy)
+        self.assertEqual(fetch.call_count, 1)  # one lookup per batch
+        return result
+
+    def test_skip_reports_matches_against_leads_and_earlier_rows(self):
+        entries = [
+            entry(2, email=' JOHN.DOE@example.com '),           # existing lead, by email
+            entry(3, email='new@example.com', phone='9111111111'),
+            entry(4, email='other@example.com', phone='+91 91111-11111'),  # row 3, by phone
+        ]
+        to_create, to_update, duplicates = self.resolve(entries, 'skip', [existing_buyer()])
+
+        self.assertEqual([row for row, _, _ in to_create], [3])
+        self.assertEqual(to_update, [])
+        self.assertEqual(duplicates, [
+            {'row': 2, 'matched_on': 'email', 'duplicate_of': 'existing-1', 'duplicate_of_row': None, 'action': 'skipped'},
+            {'row': 4, 'matched_on': 'phone', 'duplicate_of': None, 'duplicate_of_row': 3, 'action': 'skipped'},
+        ])
+
+    def test_update_applies_first_row_per_lead(self):
+        entries = [entry(2, status='qualified'), entry(3, notes='again')]
+        to_create, to_update, duplicates = self.resolve(entries, 'update', [existing_buyer()])
+
+        self.assertEqual(to_create, [])
+        self.assertEqual([(row[0], doc['_id']) for row, doc in to_update], [(2, 'existing-1')])
+        self.assertEqual([(d['row'], d['action']) for d in duplicates], [(2, 'updated'), (3, 'skipped')])
+
+    def test_create_imports_duplicates_but_reports_them(self):
+        to_create, _, duplicates = self.resolve([entry(2), entry(3)], 'create', [existing_buyer()])
+        self.assertEqual(len(to_create), 2)
+        self.assertEqual([d['action'] for d in duplicates], ['created', 'created'])
+
+    def bulk_update(self, updates, stored):
+        buyers, history = FakeCollection(stored=stored), FakeCollection()
+        with mock.patch.object(Buyer, '_get_collection', return_value=buyers), \
+                mock.patch.object(BuyerHistory, '_get_collection', return_value=history):
+            return bulk_update_buyers(updates, 'importer'), buyers, history
+
+    @mock.patch('leads.tasks.record_updated')
+    def test_bulk_update_sets_changed_fields_and_history(self, record_updated):
+        updates = [
+            (entry(2, status='qualified', phone='9000000001'), existing_buyer(version=2)),
+            (entry(3), existing_buyer(version=2)),  # no changes: nothing written
+        ]
+        (updated, errors, conflicts), buyers, history = self.bulk_update(updates, [existing_buyer(version=2)])
+
+        self.assertEqual((updated, errors, conflicts), (['existing-1', 'existing-1'], [], []))
+        [operation] = buyers.batches[0]
+        self.assertEqual(operation['filter'], {'_id': 'existing-1', 'version': 2})
+        self.assertEqual(operation['update']['$inc'], {'version': 1})
+        update = operation['update']['$set']
+        self.assertEqual(set(update), {
+            'status', 'phone', 'updated_at', 'search_tokens', 'phone_normalized', 'email_normalized',
+        })
+        self.assertEqual((update['status'], update['phone_normalized']), ('qualified', '+919000000001'))
+        self.assertEqual(history.batches[0][0]['diff'], {
+            'action': 'updated_from_csv', 'status': 'new → qualified', 'phone': '9876543210 → 9000000001',
+        })
+        [(before, after)] = record_updated.call_args[0][0]
+        self.assertEqual((before['status'], after['status']), ('new', 'qualified'))
+
+    @mock.patch('leads.tasks.record_updated')
+    def test_lead_edited_since_the_duplicate_check_is_a_conflict(self, record_updated):
+        # A PATCH committed after the duplicate check read version 0
+        edited = existing_buyer(status='lost', version=1)
+        (updated, errors, conflicts), buyers, history = self.bulk_update(
+            [(entry(2, status='qualified'), existing_buyer())], [edited],
+        )
+        self.assertEqual((updated, errors, conflicts), ([], [], [2]))
+        self.assertEqual(edited['status'], 'lost')
+        self.assertEqual(history.batches, [])
+        record_updated.assert_not_called()
+
+    @mock.patch('leads.tasks.bulk_update_buyers', return_value=(['existing-1'], [], []))
+    @mock.patch('leads.tasks.bulk_create_buyers', side_effect=fake_bulk_create)
+    def test_import_reports_duplicates(self, bulk_create, bulk_update):
+        with mock.patch('leads.dedup.fetch_existing', return_value=[existing_buyer(email='lead0@example.com')]):
+            result = process_csv_import(csv_file(3), duplicates='update')
+
+        self.assertEqual(result['valid_rows'], 3)
+        self.assertEqual(result['duplicate_rows'], 1)
+        self.assertEqual(result['duplicates'][0]['row'], 2)
+        self.assertEqual(result['duplicates'][0]['action'], 'updated')
+        self.assertEqual(len(bulk_create.call_args[0][0]), 2)
+
+    @mock.patch('leads.tasks.bulk_update_buyers', return_value=([], [], [2]))
+    @mock.patch('leads.tasks.bulk_create_buyers', side_effect=fake_bulk_create)
+    def test_import_reports_conflicting_updates(self, bulk_create, bulk_update):
+        with mock.patch('leads.dedup.fetch_existing', return_value=[existing_buyer(email='lead0@example.com')]):
+            result = process_csv_import(csv_file(3), duplicates='update')
+
+        self.assertEqual(result['valid_rows'], 2)
+        self.assertEqual(result['duplicates'][0]['action'], 'conflict')
@@ -0,0 +1,89 @@
+"""
+Tests for conditional GETs of the buyer list and detail
+"""
+from datetime import datetime
+from unittest import mock
+from django.test import SimpleTestCase
+from rest_framework.response import Response
+from rest_framework.test import APIRequestFactory
+from leads.models import Buyer
+from leads.rollups import record_deleted, record_updated
+from leads.views import BuyerDetailView, BuyerListCreateView
+
+
+class FakeCollection:
+    def __init__(self, documents=None):
+        self.documents = documents if documents is not None else []
+        self.database = {}
+
+    def find_one(self, query, projection=None):
+        return next((document for document in self.documents if document['_id'] == query['_id']), None)
+
+    def update_one(self, query, update, upsert=False):
+        document = self.find_one(query)
+        if document is None and upsert:
+            document = dict(query)
+            self.documents.append(document)
+        for field, amount in update['$inc'].items():
+            document[field] = document.get(field, 0) + amount
+
+
+class ConditionalGetTests(SimpleTestCase):
+    def setUp(self):
+        self.documents = [
+            {'_id': 'b1', 'version': 1, 'updated_at': datetime(2024, 1, 1)},
+            {'_id': 'b2', 'version': 4, 'updated_at': datetime(2024, 1, 2)},
+        ]
+        buyers = FakeCollection(self.documents)
+        buyers.database['change_counters'] = FakeCollection()
+        collection = mock.patch.object(Buyer, '_get_collection', return_value=buyers)
+        collection.start()
+        self.addCleanup(collection.stop)
+        self.factory = APIRequestFactory()
+
+    def get_list(self, url='/api/leads/buyers/?city=pune', **headers):
+        with mock.patch.object(BuyerListCreateView, 'list', return_value=Response([])) as list_view:
+            response = BuyerListCreateView.as_view()(self.factory.get(url, **headers))
+        return response, list_view
+
+    def get_detail(self, pk='b1', **headers):
+        with mock.patch.object(BuyerDetailView, 'retrieve', return_value=Response({})) as retrieve:
+            response = BuyerDetailView.as_view()(self.factory.get(f'/api/leads/buyers/{pk}/', **headers), pk=pk)
+        return response, retrieve
+
+    def test_list_returns_304_without_running_the_query(self):
+        response, _ = self.get_list()
+        etag = response['ETag']
+
+        response, list_view = self.get_list(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        list_view.assert_not_called()
+
+    def test_list_etag_depends_on_params_and_writes(self):
+        etag = self.get_list()[0]['ETag']
+        self.assertNotEqual(self.get_list('/api/leads/buyers/?city=delhi')[0]['ETag'], etag)
+
+        # Write hooks bump the counter after the write, whatever its timestamps
+        record_updated([])
+        response, list_view = self.get_list(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        list_view.assert_called_once()
+
+        etag = response['ETag']
+        record_deleted([])
+        self.assertNotEqual(self.get_list()[0]['ETag'], etag)
+
+    def test_detail_returns_304_until_the_lead_changes(self):
+        etag = self.get_detail()[0]['ETag']
+
+        response, retrieve = self.get_detail(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        retrieve.assert_not_called()
+
+        self.documents[0]['version'] = 2
+        self.assertEqual(self.get_detail(HTTP_IF_NONE_MATCH=etag)[0].status_code, 200)
+
+    def test_missing_lead_has_no_etag(self):
+        response, retrieve = self.get_detail('missing')
+        self.assertFalse(response.has_header('ETag'))
+        retrieve.assert_called_once()
@@ -0,0 +1,169 @@
+"""
+Tests for the write-behind buyer history writer
+"""
+import threading
+from datetime import datetime, timedelta
+from unittest import mock
+from django.test import SimpleTestCase
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory
+from leads.history import HistoryWriter, history_document, history_query, recent_history
+from leads.models import BuyerHistory
+from leads.pagination import HistoryPagination
+from leads.tests.test_pagination import FakeRawQuerySet, get
+from leads.views import bulk_history
+
+
+class RecordingCollection:
+    def __init__(self):
+        self.batches = []
+        self.inserted = threading.Event()
+
+    def insert_many(self, documents, ordered=True):
+        self.batches.append(list(documents))
+        self.inserted.set()
+
+
+def entries(count, start=0):
+    return [history_document(f'buyer-{index}', 'anonymous', {'action': 'created'}) for index in range(start, start + count)]
+
+
+class HistoryWriterTests(SimpleTestCase):
+    def setUp(self):
+        self.collection = RecordingCollection()
+
+    def writer(self, **kwargs):
+        writer = HistoryWriter(collection=self.collection, **kwargs)
+        self.addCleanup(writer.close)
+        return writer
+
+    def test_synchronous_mode_writes_immediately(self):
+        writer = self.writer(synchronous=True)
+        writer.add(entries(1)[0])
+        self.assertEqual(len(self.collection.batches), 1)
+        self.assertEqual(self.collection.batches[0][0]['buyer_id'], 'buyer-0')
+
+    def test_entries_are_buffered_until_flush(self):
+        writer = self.writer(flush_interval=60)
+        writer.add_many(entries(3))
+        self.assertEqual(writer.pending(), 3)
+        self.assertEqual(self.collection.batches, [])
+
+        writer.flush()
+        self.assertEqual([len(batch) for batch in self.collection.batches], [3])
+        self.assertEqual(writer.pending(), 0)
+
+    def test_full_batch_is_written_by_the_thread(self):
+        writer = self.writer(batch_size=5, flush_interval=60)
+        writer.add_many(entries(5))
+        self.assertTrue(self.collection.inserted.wait(5))
+        self.assertEqual([len(batch) for batch in self.collection.batches], [5])
+
+    def test_interval_flushes_partial_batches(self):
+        writer = self.writer(batch_size=100, flush_interval=0.01)
+        writer.add(entries(1)[0])
+        self.assertTrue(self.collection.inserted.wait(5))
+
+    def test_request_flush_wakes_the_thread(self):
+        writer = self.writer(flush_interval=60)
+        writer.add(entries(1)[0])
+        writer.request_flush()
+        self.assertTrue(self.collection.inserted.wait(5))
+
+    def test_close_writes_everything_and_later_entries_go_straight_through(self):
+        writer = self.writer(flush_interval=60)
+        writer.add_many(entries(2))
+        writer.close()
+        self.assertEqual(sum(len(batch) for batch in self.collection.batches), 2)
+
+        writer.add(entries(1, start=2)[0])
+        self.assertEqual(self.collection.batches[-1][0]['buyer_id'], 'buyer-2')
+
+    def test_flush_preserves_order(self):
+        writer = self.writer(batch_size=2, flush_interval=0.001)
+        for index in range(20):
+            writer.add(entries(1, start=index)[0])
+        writer.flush()
+        written = [document['buyer_id'] for batch in self.collection.batches for document in batch]
+        self.assertEqual(written, [f'buyer-{index}' for index in range(20)])
+
+
+class HistoryQueryTests(SimpleTestCase):
+    def test_filters_by_changed_field_and_author(self):
+        self.assertEqual(history_query(['b1'], field='status', changed_by='u1'), {
+            'buyer_id': 'b1', 'diff.status': {'$exists': True}, 'changed_by': 'u1',
+        })
+        self.assertEqual(history_query(['b1', 'b2']), {'buyer_id': {'$in': ['b1', 'b2']}})
+
+    def test_unknown_field_is_rejected(self):
+        with self.assertRaises(ValidationError):
+            history_query(['b1'], field='$where')
+
+    def test_history_index_serves_buyer_newest_first(self):
+        self.assertIn(
+            [('buyer_id', 1), ('changed_at', -1), ('_id', -1)],
+            [spec['fields'] for spec in BuyerHistory._meta['index_specs']],
+        )
+
+
+class HistoryPaginationTests(SimpleTestCase):
+    def setUp(self):
+        start = datetime(2024, 1, 1)
+        self.documents = [
+            {'_id': f'h-{index:02d}', 'buyer_id': 'b1', 'changed_at': start + timedelta(minutes=index // 2)}
+            for index in range(12)
+        ]
+
+    def test_walks_all_history_newest_first(self):
+        url, seen = '/history/?page_size=5&ordering=changed_by', []
+        while url:
+            paginator = HistoryPagination()
+            page = paginator.paginate_queryset(FakeRawQuerySet(self.documents), get(url))
+            seen.extend(document['_id'] for document in page)
+            url = paginator.get_paginated_response(page).data['next']
+        self.assertEqual(seen, [f'h-{index:02d}' for index in reversed(range(12))])
+
+
+class BulkHistoryTests(SimpleTestCase):
+    def test_one_aggregation_with_a_limited_branch_per_lead(self):
+        collection = mock.Mock()
+        collection.name = 'buyer_history'
+        collection.aggregate.return_value = [
+            {'_id': 'h1', 'buyer_id': 'b1', 'changed_by': 'u1', 'changed_at': datetime(2024, 1, 1), 'diff': {}},
+            {'_id': 'h2', 'buyer_id': 'b1', 'changed_by': 'u1', 'changed_at': datetime(2024, 1, 2), 'diff': {}},
+        ]
+        with mock.patch.object(BuyerHistory, '_get_collection', return_value=collection):
+            history = recent_history(['b1', 'b2'], limit=3)
+
+        self.assertEqual(list(history), ['b1', 'b2'])
+        self.assertEqual([entry['_id'] for entry in history['b1']], ['h2', 'h1'])
+        self.assertEqual(history['b2'], [])
+        collection.aggregate.assert_called_once()
+        pipeline = collection.aggregate.call_args[0][0]
+        branch = [
+            {'$match': {'buyer_id': 'b2'}},
+            {'$sort': {'changed_at': -1, '_id': -1}},
+            {'$limit': 3},
+        ]
+        self.assertEqual(pipeline[:3], [{'$match': {'buyer_id': 'b1'}}] + branch[1:])
+        self.assertEqual(pipeline[3], {'$unionWith': {'coll': 'buyer_history', 'pipeline': branch}})
+        # No stage gathers a lead's whole history
+        self.assertNotIn('$group', str(pipeline))
+
+    @mock.patch('leads.views.recent_history')
+    def test_endpoint_serializes_entries_per_lead(self, recent):
+        recent.return_value = {'b1': [
+            {'_id': 'h1', 'buyer_id': 'b1', 'changed_by': 'u1', 'changed_at': datetime(2024, 1, 2), 'diff': {'status': 'New → Won'}},
+        ], 'b2': []}
+        request = APIRequestFactory().get('/api/leads/history/?buyer_ids=b1,b2&buyer_ids=b1&limit=50')
+        response = bulk_history(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(recent.call_args[0], (['b1', 'b2'], 20))
+        self.assertEqual(response.data['b1'][0]['id'], 'h1')
+        self.assertEqual(response.data['b1'][0]['diff'], {'status': 'New → Won'})
+        self.assertEqual(response.data['b2'], [])
+
+    def test_endpoint_requires_ids(self):
+        response = bulk_history(APIRequestFactory().get('/api/leads/history/'))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,62 @@
+"""
+Tests for the buyer list index plan
+"""
+from django.test import SimpleTestCase
+from leads.indexes import LIST_FILTER_FIELDS, canonical_shapes, count_shapes, plan_problems, plan_stages
+from leads.models import Buyer
+
+
+def serving_index(query, sort):
+    """A declared index whose leading keys are equality fields of ``query`` followed by ``sort``"""
+    equality = {field for field, value in query.items() if not field.startswith('$')}
+    for spec in Buyer._meta['index_specs']:
+        fields = spec['fields']
+        for split in range(len(fields) + 1):
+            prefix, rest = fields[:split], fields[split:]
+            if all(field in equality for field, _ in prefix) and rest[:len(sort)] == sort:
+                return fields
+    return None
+
+
+class IndexPlanTests(SimpleTestCase):
+    def test_every_list_shape_has_an_ordered_index(self):
+        for name, query, sort in canonical_shapes():
+            with self.subTest(shape=name):
+                self.assertIsNotNone(serving_index(query, sort))
+
+    def test_indexes_put_equality_before_sort(self):
+        for spec in Buyer._meta['index_specs']:
+            fields = [field for field, _ in spec['fields']]
+            if '_id' in fields:
+                self.assertEqual(fields[-1], '_id')
+                self.assertIn(fields[-2], ['updated_at', 'created_at'])
+
+    def test_filters_lead_an_index_on_the_default_sort(self):
+        declared = [spec['fields'] for spec in Buyer._meta['index_specs']]
+        for field in LIST_FILTER_FIELDS:
+            self.assertIn([(field, 1), ('updated_at', -1), ('_id', -1)], declared)
+        # Every index is written on each insert; other sorts get no per-filter copies
+        self.assertLessEqual(len(declared), 10)
+
+    def test_every_count_shape_has_an_index(self):
+        leading = {spec['fields'][0][0] for spec in Buyer._meta['index_specs']}
+        for name, query in count_shapes():
+            with self.subTest(shape=name):
+                self.assertTrue(set(query) & leading)
+
+    def test_plan_stages_flag_scans_and_blocking_sorts(self):
+        explain = {'queryPlanner': {'winningPlan': {
+            'stage': 'LIMIT', 'inputStage': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}},
+        }}}
+        self.assertEqual(plan_stages(explain), ['LIMIT', 'SORT', 'COLLSCAN'])
+        self.assertEqual(plan_problems(plan_stages(explain)), ['COLLSCAN', 'in-memory SORT'])
+
+        sbe = {'queryPlanner': {'winningPlan': {'queryPlan': {
+            'stage': 'LIMIT', 'inputStage': {'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}},
+        }}}}
+        self.assertEqual(plan_problems(plan_stages(sbe)), [])
+
+        count = {'stages': [{'$cursor': {'queryPlanner': {'winningPlan': {
+            'stage': 'PROJECTION_COVERED', 'inputStage': {'stage': 'IXSCAN'},
+        }}}}, {'$group': {}}]}
+        self.assertEqual(plan_stages(count), ['PROJECTION_COVERED', 'IXSCAN'])
@@ -0,0 +1,211 @@
+"""
+Tests for background CSV import jobs
+"""
+import os
+import tempfile
+from datetime import datetime, timedelta
+from unittest import mock
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APIRequestFactory
+from leads import jobs
+from leads.models import ImportJob
+from leads.views import csv_import_status
+
+
+class FakeJobs:
+    """Stands in for ``ImportJob.objects``: equality and ``__lt`` filters plus ``set__`` updates"""
+
+    def __init__(self, *jobs):
+        self.jobs = {job.id: job for job in jobs}
+
+    def __call__(self, **conditions):
+        return FakeJobQuerySet(self, conditions)
+
+    def get(self, **conditions):
+        return next(iter(self(**conditions)))
+
+
+class FakeJobQuerySet:
+    def __init__(self, manager, conditions):
+        self.manager = manager
+        self.conditions = conditions
+
+    def __iter__(self):
+        return (job for job in list(self.manager.jobs.values()) if self._matches(job))
+
+    def _matches(self, job):
+        for key, expected in self.conditions.items():
+            field, _, operator = key.partition('__')
+            value = getattr(job, field)
+            if operator == 'lt':
+                if value is None or not value < expected:
+                    return False
+            elif value != expected:
+                return False
+        return True
+
+    def first(self):
+        return next(iter(self), None)
+
+    def update(self, **updates):
+        matched = list(self)
+        for job in matched:
+            for key, value in updates.items():
+                setattr(job, key[len('set__'):], value)
+        return len(matched)
+
+
+class ImportJobTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        upload_dir = override_settings(CSV_IMPORT_UPLOAD_DIR=self.directory.name)
+        upload_dir.enable()
+        self.addCleanup(upload_dir.disable)
+
+        self.jobs = FakeJobs()
+        for patcher in [
+            mock.patch.object(ImportJob, 'objects', self.jobs),
+            mock.patch.object(ImportJob, 'save', autospec=True, side_effect=self.save),
+            mock.patch('leads.jobs.get_executor'),
+        ]:
+            patched = patcher.start()
+            self.addCleanup(patcher.stop)
+        self.executor = patched.return_value
+
+    def save(self, job):
+        self.jobs.jobs[job.id] = job
+
+    def enqueue(self):
+        upload = SimpleUploadedFile('leads.csv', b'full_name\nPriya\n', content_type='text/csv')
+        return jobs.enqueue_import(upload)
+
+    def upload_path(self, job_id):
+        path = os.path.join(self.directory.name, f'{job_id}.csv')
+        with open(path, 'w') as upload:
+            upload.write('full_name\n')
+        return path
+
+    def test_enqueue_stores_the_upload_and_submits_the_job(self):
+        job = self.enqueue()
+        self.assertEqual(job.status, 'queued')
+        self.assertEqual(job.owner_id, 'anonymous')
+        with open(job.file_path, 'rb') as upload:
+            self.assertEqual(upload.read(), b'full_name\nPriya\n')
+        self.executor.submit.assert_called_once_with(jobs.run_import_job, job.id)
+
+    @mock.patch('leads.jobs.process_csv_import')
+    def test_run_completes_the_job_and_removes_the_upload(self, process):
+        def import_rows(file, progress=None, **kwargs):
+            progress({'total_rows': 1, 'valid_rows': 1, 'invalid_rows': 0, 'duplicate_rows': 0})
+            return {
+                'total_rows': 2, 'valid_rows': 1, 'invalid_rows': 1, 'created_buyers': ['b1'],
+                'errors': [{'row': 3, 'error': 'Invalid email', 'data': {'email': 'x', None: ['extra']}}],
+                'duplicate_rows': 0, 'duplicates': [],
+            }
+        process.side_effect = import_rows
+        job = self.enqueue()
+
+        jobs.run_import_job(job.id)
+        self.assertEqual(job.status, 'completed')
+        self.assertEqual((job.total_rows, job.valid_rows, job.invalid_rows), (2, 1, 1))
+        self.assertEqual(job.errors[0]['data'], {'email': 'x', 'None': ['extra']})
+        self.assertIsNotNone(job.heartbeat_at)
+        self.assertFalse(os.path.exists(job.file_path))
+
+    @mock.patch('leads.jobs.process_csv_import')
+    def test_a_claimed_job_is_not_run_twice(self, process):
+        process.return_value = {'error': 'CSV file contains more than 200 rows. Please split into smaller files.'}
+        job = self.enqueue()
+        jobs.run_import_job(job.id)
+        jobs.run_import_job(job.id)
+        process.assert_called_once()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('200 rows', job.error)
+
+    @mock.patch('leads.jobs.process_csv_import', side_effect=RuntimeError('disk on fire'))
+    def test_crashing_import_fails_the_job(self, process):
+        job = self.enqueue()
+        with self.assertLogs('leads.jobs', level='ERROR'):
+            jobs.run_import_job(job.id)
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('disk on fire', job.error)
+        self.assertFalse(os.path.exists(job.file_path))
+
+    def test_stale_jobs_are_failed_and_their_uploads_deleted(self):
+        old = datetime.utcnow() - timedelta(hours=2)
+        stale_running = ImportJob(owner_id='u1', status='running', started_at=old, heartbeat_at=old)
+        stale_queued = ImportJob(owner_id='u1', status='queued', created_at=old, heartbeat_at=old)
+        live = ImportJob(owner_id='u1', status='running', started_at=old, heartbeat_at=datetime.utcnow())
+        # Waiting behind long imports in a live process, which keeps heartbeating it
+        waiting = ImportJob(owner_id='u1', status='queued', created_at=old, heartbeat_at=datetime.utcnow())
+        finished = ImportJob(owner_id='u1', status='completed', created_at=old, heartbeat_at=old)
+        for job in [stale_running, stale_queued, live, waiting, finished]:
+            job.file_path = self.upload_path(job.id)
+            self.save(job)
+
+        with self.assertLogs('leads.jobs', level='WARNING'):
+            self.assertEqual(jobs.fail_stale_jobs(), 2)
+        self.assertEqual([job.status for job in [stale_running, stale_queued, live, waiting, finished]],
+                         ['failed', 'failed', 'running', 'queued', 'completed'])
+        self.assertEqual(stale_running.error, jobs.STALE_JOB_ERROR)
+        self.assertFalse(os.path.exists(stale_running.file_path))
+        self.assertFalse(os.path.exists(stale_queued.file_path))
+        self.assertTrue(os.path.exists(live.file_path))
+        self.assertTrue(os.path.exists(waiting.file_path))
+
+    def test_heartbeat_keeps_this_process_jobs_alive(self):
+        old = datetime.utcnow() - timedelta(hours=2)
+        queued = self.enqueue()
+        queued.heartbeat_at = old
+        other_process = ImportJob(owner_id='u1', status='queued', worker_id='elsewhere:1:x', heartbeat_at=old)
+        self.save(other_process)
+
+        self.assertEqual(queued.worker_id, jobs.WORKER_ID)
+        self.assertEqual(jobs.heartbeat(), 1)
+        self.assertFalse(jobs.is_stale(queued))
+        self.assertTrue(jobs.is_stale(other_process))
+
+    @mock.patch('leads.jobs.process_csv_import')
+    def test_swept_job_stays_failed_when_its_worker_finishes(self, process):
+        job = self.enqueue()
+
+        def slow_import(file, **kwargs):
+            job.status = 'failed'
+            return {'total_rows': 0, 'valid_rows': 0, 'invalid_rows': 0, 'created_buyers': [],
+                    'errors': [], 'duplicate_rows': 0, 'duplicates': []}
+        process.side_effect = slow_import
+        jobs.run_import_job(job.id)
+        self.assertEqual(job.status, 'failed')
+
+    def test_status_endpoint(self):
+        job = self.enqueue()
+        response = csv_import_status(APIRequestFactory().get(f'/api/leads/import/{job.id}/'), job_id=job.id)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'queued')
+
+        response = csv_import_status(APIRequestFactory().get('/api/leads/import/missing/'), job_id='missing')
+        self.assertEqual(response.status_code, 404)
+
+    def test_status_of_an_abandoned_job_reports_failure(self):
+        old = datetime.utcnow() - timedelta(hours=2)
+        job = ImportJob(owner_id='u1', status='running', started_at=old, heartbeat_at=old)
+        self.save(job)
+        with self.assertLogs('leads.jobs', level='WARNING'):
+            response = csv_import_status(APIRequestFactory().get(f'/api/leads/import/{job.id}/'), job_id=job.id)
+        self.assertEqual(response.data['status'], 'failed')
+
+
+class StorableErrorTests(SimpleTestCase):
+    def test_keys_are_strings_and_long_cells_are_cut(self):
+        error = {'row': 2, 'error': 'Invalid phone', 'data': {
+            'notes': 'x' * 1000, None: ['y' * 1000, 'z'], 'phone': '12',
+        }}
+        stored = jobs.storable_error(error)
+        self.assertEqual(stored['row'], 2)
+        self.assertEqual(stored['data']['phone'], '12')
+        self.assertEqual(len(stored['data']['notes']), jobs.MAX_STORED_CELL_LENGTH + 1)
+        self.assertEqual(stored['data']['None'][1], 'z')
+        self.assertEqual(len(stored['data']['None'][0]), jobs.MAX_STORED_CELL_LENGTH + 1)
+        self.assertEqual(len(error['data']['notes']), 1000)
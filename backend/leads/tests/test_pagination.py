@@ -0,0 +1,143 @@
+"""
+Tests for keyset pagination of the buyer list
+"""
+from datetime import datetime, timedelta
+from unittest import mock
+from django.test import SimpleTestCase
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from leads.pagination import KeysetPagination, decode_cursor, encode_cursor
+
+
+def matches(document, condition):
+    for key, expected in condition.items():
+        if key == '$or':
+            if not any(matches(document, branch) for branch in expected):
+                return False
+            continue
+        value = document.get(key)
+        if isinstance(expected, dict):
+            for op, operand in expected.items():
+                if op == '$ne' and value == operand:
+                    return False
+                if op in ('$gt', '$lt') and (value is None or operand is None):
+                    return False
+                if op == '$gt' and not value > operand:
+                    return False
+                if op == '$lt' and not value < operand:
+                    return False
+        elif value != expected:
+            return False
+    return True
+
+
+def sort_key(value):
+    # Mongo sorts missing/null before any value
+    return (value is not None, value if value is not None else 0)
+
+
+class FakeRawQuerySet:
+    def __init__(self, documents):
+        self.documents = documents
+        self.conditions = []
+        self.ordering = []
+        self.limit_to = None
+
+    def _clone(self, **changes):
+        clone = FakeRawQuerySet(self.documents)
+        clone.conditions, clone.ordering, clone.limit_to = list(self.conditions), self.ordering, self.limit_to
+        for key, value in changes.items():
+            setattr(clone, key, value)
+        return clone
+
+    def filter(self, __raw__):
+        return self._clone(conditions=self.conditions + [__raw__])
+
+    def order_by(self, *keys):
+        return self._clone(ordering=keys)
+
+    def limit(self, count):
+        return self._clone(limit_to=count)
+
+    def count(self):
+        return len(self.documents)
+
+    def __iter__(self):
+        documents = [doc for doc in self.documents if all(matches(doc, c) for c in self.conditions)]
+        for key in reversed(self.ordering):
+            field = key.lstrip('-')
+            field = '_id' if field == 'id' else field
+            documents.sort(key=lambda doc: sort_key(doc.get(field)), reverse=key.startswith('-'))
+        return iter(documents[:self.limit_to])
+
+
+def get(url):
+    return Request(APIRequestFactory().get(url))
+
+
+class KeysetPaginationTests(SimpleTestCase):
+    def setUp(self):
+        start = datetime(2024, 1, 1)
+        self.documents = [
+            {'_id': f'id-{index:02d}',
+             # Repeated timestamps and missing values exercise the id tie-break and null ordering
+             'updated_at': start + timedelta(hours=index // 3),
+             'budget_min': None if index % 4 == 0 else (index % 5) * 100000}
+            for index in range(23)
+        ]
+        for document in self.documents[::7]:
+            del document['budget_min']
+
+    def walk(self, ordering):
+        url = f'/api/buyers/?cursor=&page_size=5&ordering={ordering}'
+        pages = []
+        while url:
+            paginator = KeysetPagination()
+            page = paginator.paginate_queryset(FakeRawQuerySet(self.documents), get(url))
+            response = paginator.get_paginated_response(page).data
+            pages.append((url, [doc['_id'] for doc in page], response['previous']))
+            url = response['next']
+        return pages
+
+    def expected_ids(self, field, descending):
+        ordered = sorted(self.documents, key=lambda doc: doc['_id'], reverse=descending)
+        ordered.sort(key=lambda doc: sort_key(doc.get(field)), reverse=descending)
+        return [doc['_id'] for doc in ordered]
+
+    def test_forward_and_backward_walks_cover_every_lead_once(self):
+        for ordering, field, descending in [
+            ('-updated_at', 'updated_at', True),
+            ('budget_min', 'budget_min', False),
+            ('-budget_min', 'budget_min', True),
+        ]:
+            pages = self.walk(ordering)
+            self.assertEqual(
+                [doc_id for _, ids, _ in pages for doc_id in ids], self.expected_ids(field, descending)
+            )
+            self.assertIsNone(pages[0][2])
+            for (_, previous_ids, _), (_, _, previous_link) in zip(pages, pages[1:]):
+                paginator = KeysetPagination()
+                page = paginator.paginate_queryset(FakeRawQuerySet(self.documents), get(previous_link))
+                self.assertEqual([doc['_id'] for doc in page], previous_ids)
+
+    def test_cursor_is_opaque_and_bound_to_ordering(self):
+        token = encode_cursor({'o': '-updated_at', 'v': datetime(2024, 1, 1, 5), 'id': 'x', 'r': False})
+        self.assertEqual(decode_cursor(token)['v'], datetime(2024, 1, 1, 5))
+        with self.assertRaises(NotFound):
+            KeysetPagination().paginate_queryset(FakeRawQuerySet(self.documents), get(f'/?cursor={token}&ordering=city'))
+        with self.assertRaises(NotFound):
+            decode_cursor('not-a-cursor')
+
+    @mock.patch('leads.pagination.cache')
+    def test_count_is_cached_for_filtered_lists(self, cache):
+        cache.get.return_value = 42
+        paginator = KeysetPagination()
+        paginator.paginate_queryset(FakeRawQuerySet(self.documents), get('/?cursor=&with_count=1&city=pune'))
+        self.assertEqual(paginator.total, 42)
+        cache.set.assert_not_called()
+
+        cache.get.return_value = None
+        paginator.paginate_queryset(FakeRawQuerySet(self.documents), get('/?cursor=&with_count=1&city=pune'))
+        self.assertEqual(paginator.total, 23)
+        cache.set.assert_called_once()
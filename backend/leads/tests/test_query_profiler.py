@@ -0,0 +1,106 @@
+"""
+Tests for the per-request query profiler
+"""
+from types import SimpleNamespace
+from unittest.mock import patch
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from utils import query_profiler
+from utils.query_profiler import QueryProfilerMiddleware, query_shape
+
+
+def run_command(name, command, duration_ms=1.0, request_id=1):
+    started = SimpleNamespace(
+        command_name=name, command=command, database_name='buyer_leads', connection_id=('db', 27017), request_id=request_id,
+    )
+    query_profiler.query_profiler.started(started)
+    finished = SimpleNamespace(connection_id=('db', 27017), request_id=request_id, duration_micros=int(duration_ms * 1000))
+    query_profiler.query_profiler.succeeded(finished)
+
+
+class QueryShapeTests(SimpleTestCase):
+    def test_values_are_replaced_but_structure_kept(self):
+        shape = query_shape('find', {
+            'find': 'buyers',
+            'filter': {'city': 'Mohali', 'status': {'$in': ['New', 'Qualified']}},
+            'sort': {'updated_at': -1},
+        })
+        self.assertEqual(
+            shape,
+            'find buyers {"filter": {"city": "?", "status": {"$in": ["?"]}}, "sort": {"updated_at": -1}}',
+        )
+
+    def test_same_query_with_other_values_shares_a_shape(self):
+        first = query_shape('count', {'count': 'buyers', 'query': {'status': {'$in': ['New']}}})
+        second = query_shape('count', {'count': 'buyers', 'query': {'status': {'$in': ['Won', 'Lost', 'New']}}})
+        self.assertEqual(first, second)
+
+    def test_aggregate_pipeline_stages_are_shaped(self):
+        shape = query_shape('aggregate', {'aggregate': 'buyers', 'pipeline': [
+            {'$match': {'owner_id': 'abc'}}, {'$group': {'_id': '$city', 'n': {'$sum': 1}}},
+        ]})
+        self.assertIn('"$match": {"owner_id": "?"}', shape)
+        self.assertIn('"$group": {"_id": "$city", "n": {"$sum": 1}}', shape)
+
+
+@override_settings(DEBUG=True, QUERY_PROFILER_ENABLED=True, QUERY_PROFILER_EXPLAIN=False)
+class QueryProfilerMiddlewareTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        query_profiler._history.clear()
+
+    def view_running(self, commands):
+        def view(request):
+            for request_id, (name, command, duration_ms) in enumerate(commands):
+                run_command(name, command, duration_ms, request_id)
+            return HttpResponse('ok')
+        return QueryProfilerMiddleware(view)
+
+    def test_headers_report_count_and_time(self):
+        middleware = self.view_running([
+            ('find', {'find': 'buyers', 'filter': {'_id': 1}}, 2.0),
+            ('count', {'count': 'buyers', 'query': {}}, 0.5),
+            ('hello', {'hello': 1}, 9.0),
+        ])
+        response = middleware(self.factory.get('/api/leads/stats/'))
+        self.assertEqual(response['X-DB-Query-Count'], '2')
+        self.assertEqual(response['X-DB-Query-Time-Ms'], '2.5')
+
+    def test_repeated_shapes_are_grouped_slowest_first(self):
+        commands = [('find', {'find': 'buyers', 'filter': {'city': city}}, 1.0) for city in ('A', 'B', 'C')]
+        commands.append(('aggregate', {'aggregate': 'buyers', 'pipeline': []}, 2.0))
+        self.view_running(commands)(self.factory.get('/api/leads/analytics/'))
+
+        summary = query_profiler.recent_requests()[0]
+        self.assertEqual(summary['path'], '/api/leads/analytics/')
+        self.assertEqual(summary['query_count'], 4)
+        self.assertEqual([stats['count'] for stats in summary['slowest']], [3, 1])
+        self.assertTrue(summary['slowest'][0]['shape'].startswith('find buyers'))
+
+    def test_commands_outside_a_request_are_not_recorded(self):
+        run_command('find', {'find': 'buyers', 'filter': {}})
+        self.assertEqual(query_profiler.recent_requests(), [])
+
+    @override_settings(QUERY_PROFILER_EXPLAIN=True)
+    def test_explain_is_attached_to_slowest_shapes(self):
+        middleware = self.view_running([('find', {'find': 'buyers', 'filter': {'city': 'A'}, 'lsid': {}}, 1.0)])
+        with patch('utils.query_profiler.explain_command', return_value={'stage': 'IXSCAN'}) as explain:
+            middleware(self.factory.get('/api/leads/buyers/'))
+
+        self.assertEqual(explain.call_args[0][0], 'buyer_leads')
+        self.assertEqual(query_profiler.recent_requests()[0]['slowest'][0]['explain'], {'stage': 'IXSCAN'})
+
+    @override_settings(QUERY_PROFILER_ENABLED=False)
+    def test_disabled_profiler_adds_no_headers(self):
+        response = self.view_running([])(self.factory.get('/api/leads/buyers/'))
+        self.assertFalse(response.has_header('X-DB-Query-Count'))
+
+    def test_debug_endpoint_lists_recent_requests(self):
+        self.view_running([])(self.factory.get('/api/leads/buyers/'))
+        response = self.client.get('/api/debug/queries/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['requests'][0]['path'], '/api/leads/buyers/')
+
+    @override_settings(DEBUG=False)
+    def test_debug_endpoint_hidden_outside_debug(self):
+        self.assertEqual(self.client.get('/api/debug/queries/').status_code, 404)
@@ -0,0 +1,232 @@
+"""
+Tests for the rate limiting engine
+"""
+import itertools
+import threading
+import time
+from unittest import mock
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from utils.rate_limit import (
+    MAX_UPDATE_RETRIES, CacheBackend, LocalMemoryBackend, RateLimiter, RedisBackend, WatchError, rate_limit,
+)
+
+_cache_names = itertools.count()
+
+
+class FakeRedis:
+    """The slice of the redis-py client the rate limiter uses, with WATCH semantics"""
+
+    def __init__(self):
+        self.data = {}
+        self.versions = {}
+        self.lock = threading.RLock()
+
+    def _live(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _write(self, key, value, expires_at):
+        self.data[key] = (value, expires_at)
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def get(self, key):
+        with self.lock:
+            value = self._live(key)
+            return None if value is None else str(value).encode()
+
+    def set(self, key, value, px=None):
+        with self.lock:
+            self._write(key, value, time.monotonic() + px / 1000 if px else None)
+            return True
+
+    def incr(self, key):
+        with self.lock:
+            value = int(self._live(key) or 0) + 1
+            self._write(key, value, self.data.get(key, (None, None))[1])
+            return value
+
+    def expire(self, key, seconds):
+        with self.lock:
+            if key in self.data:
+                self.data[key] = (self.data[key][0], time.monotonic() + seconds)
+            return True
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, redis):
+        self.redis = redis
+        self.reset()
+
+    def reset(self):
+        self.watched = None
+        self.queued = []
+        self.buffering = True
+
+    def watch(self, key):
+        with self.redis.lock:
+            self.watched = (key, self.redis.versions.get(key, 0))
+        self.buffering = False
+
+    def multi(self):
+        self.buffering = True
+
+    def __getattr__(self, name):
+        command = getattr(self.redis, name)
+
+        def call(*args, **kwargs):
+            if not self.buffering:
+                # Give other threads a chance to race between read and write
+                time.sleep(0)
+                return command(*args, **kwargs)
+            self.queued.append((command, args, kwargs))
+        return call
+
+    def execute(self):
+        with self.redis.lock:
+            if self.watched and self.redis.versions.get(self.watched[0], 0) != self.watched[1]:
+                self.reset()
+                raise WatchError()
+            results = [command(*args, **kwargs) for command, args, kwargs in self.queued]
+        self.reset()
+        return results
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.reset()
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class RateLimiterTests(SimpleTestCase):
+    def backends(self, clock):
+        return {
+            'local': LocalMemoryBackend(timer=clock),
+            'cache': CacheBackend(LocMemCache(f'rate-limit-{next(_cache_names)}', {})),
+            'redis': RedisBackend(FakeRedis()),
+        }
+
+    def test_fixed_window_allows_limit_then_blocks(self):
+        for name, backend in self.backends(Clock()).items():
+            with self.subTest(backend=name):
+                clock = Clock(1000.0)
+                limiter = RateLimiter(3, 60, backend=backend, timer=clock)
+                results = [limiter.hit('client') for _ in range(4)]
+                self.assertEqual([result.allowed for result in results], [True, True, True, False])
+                self.assertEqual([result.remaining for result in results], [2, 1, 0, 0])
+                self.assertEqual(results[-1].retry_after, 20.0)
+
+    def test_busy_client_does_not_extend_the_window(self):
+        clock = Clock(960.0)
+        limiter = RateLimiter(2, 60, backend=LocalMemoryBackend(timer=clock), timer=clock)
+        for _ in range(2):
+            limiter.hit('client')
+        clock.now = 1019.0
+        self.assertFalse(limiter.hit('client').allowed)
+        clock.now = 1020.0
+        self.assertTrue(limiter.hit('client').allowed)
+
+    def test_gcra_spaces_requests_after_a_burst(self):
+        for name in ('local', 'redis'):
+            with self.subTest(backend=name):
+                clock = Clock(1000.0)
+                limiter = RateLimiter(4, 60, algorithm='gcra', backend=self.backends(clock)[name], timer=clock)
+                self.assertEqual([limiter.hit('client').allowed for _ in range(5)], [True] * 4 + [False])
+                self.assertAlmostEqual(limiter.hit('client').retry_after, 15.0)
+                clock.now += 15
+                self.assertTrue(limiter.hit('client').allowed)
+                self.assertFalse(limiter.hit('client').allowed)
+
+    def test_gcra_refuses_after_losing_every_retry(self):
+        redis = FakeRedis()
+        limiter = RateLimiter(4, 60, algorithm='gcra', backend=RedisBackend(redis), timer=Clock())
+        with mock.patch.object(FakePipeline, 'execute', side_effect=WatchError) as execute:
+            result = limiter.hit('client')
+        self.assertEqual(execute.call_count, MAX_UPDATE_RETRIES)
+        self.assertFalse(result.allowed)
+        self.assertEqual(result.retry_after, 15.0)
+        self.assertEqual(redis.data, {})
+
+    def test_cache_counts_a_request_that_lost_the_expiry_race(self):
+        cache = LocMemCache(f'rate-limit-{next(_cache_names)}', {})
+        backend = CacheBackend(cache)
+        self.assertEqual(backend.incr('client', 60), 1)
+        incr = cache.incr
+
+        def expire_then_race(key):
+            # The key expires and another request re-adds it before our incr
+            cache.delete(key)
+            cache.add(key, 1, 60)
+            cache.incr = incr
+            raise ValueError(key)
+
+        cache.incr = expire_then_race
+        self.assertEqual(backend.incr('client', 60), 2)
+        self.assertEqual(cache.get('client'), 2)
+
+    def test_gcra_needs_an_atomic_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            RateLimiter(1, 60, algorithm='gcra', backend=CacheBackend(LocMemCache('rate-limit-gcra', {})))
+
+    def test_gcra_on_the_default_backend_is_rejected_when_decorating(self):
+        with override_settings(RATE_LIMIT_BACKEND='cache'):
+            with self.assertRaises(ImproperlyConfigured):
+                rate_limit(max_requests=1, window=60, algorithm='gcra')
+        with override_settings(RATE_LIMIT_BACKEND='local'):
+            rate_limit(max_requests=1, window=60, algorithm='gcra')
+
+    def test_concurrent_hits_never_exceed_the_limit(self):
+        cases = [(name, 'fixed') for name in ('local', 'cache', 'redis')] + [('local', 'gcra'), ('redis', 'gcra')]
+        for name, algorithm in cases:
+            with self.subTest(backend=name, algorithm=algorithm):
+                clock = Clock()
+                limiter = RateLimiter(50, 60, algorithm=algorithm, backend=self.backends(clock)[name], timer=clock)
+                allowed = []
+
+                def worker():
+                    for _ in range(25):
+                        if limiter.hit('client').allowed:
+                            allowed.append(1)
+
+                threads = [threading.Thread(target=worker) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(len(allowed), 50)
+
+
+class RateLimitDecoratorTests(SimpleTestCase):
+    def test_headers_and_429(self):
+        view = rate_limit(max_requests=2, window=60, backend=LocalMemoryBackend())(lambda request: HttpResponse('ok'))
+        request = RequestFactory().get('/', REMOTE_ADDR='10.0.0.1')
+
+        first, second, third = view(request), view(request), view(request)
+        self.assertEqual(first['X-RateLimit-Remaining'], '1')
+        self.assertEqual(second['X-RateLimit-Remaining'], '0')
+        self.assertEqual(third.status_code, 429)
+        self.assertGreaterEqual(int(third['Retry-After']), 1)
+        self.assertFalse(first.has_header('Retry-After'))
+
+    def test_clients_are_limited_separately(self):
+        view = rate_limit(max_requests=1, window=60, backend=LocalMemoryBackend())(lambda request: HttpResponse('ok'))
+        factory = RequestFactory()
+        self.assertEqual(view(factory.get('/', REMOTE_ADDR='10.0.0.1')).status_code, 200)
+        self.assertEqual(view(factory.get('/', REMOTE_ADDR='10.0.0.2')).status_code, 200)
+        self.assertEqual(view(factory.get('/', REMOTE_ADDR='10.0.0.1')).status_code, 429)
@@ -0,0 +1,62 @@
+"""
+Tests for the raw-document list serializer
+"""
+import json
+from datetime import datetime, timezone
+from django.test import SimpleTestCase
+from rest_framework.renderers import JSONRenderer
+from leads.models import Buyer
+from leads.representation import buyer_representation
+from leads.serializers import BuyerSerializer
+
+
+def raw_buyer(**overrides):
+    doc = {
+        '_id': 'b1',
+        'full_name': 'Priya Sharma',
+        'email': 'priya@example.com',
+        'phone': '9876543210',
+        'city': 'pune',
+        'property_type': 'apartment',
+        'bhk': '2bhk',
+        'purpose': 'buy',
+        'budget_min': 5000000,
+        'budget_max': 8000000,
+        'timeline': '3months',
+        'source': 'website',
+        'status': 'qualified',
+        'notes': 'Call after 6pm',
+        'tags': ['hot', 'nri'],
+        'owner_id': 'u1',
+        'created_at': datetime(2024, 5, 1, 10, 30, 0, 123000),
+        'updated_at': datetime(2024, 5, 2, 8, 0),
+    }
+    doc.update(overrides)
+    return {key: value for key, value in doc.items() if value is not None}
+
+
+class RawRepresentationTests(SimpleTestCase):
+    documents = [
+        raw_buyer(),
+        raw_buyer(bhk=None, notes=None, tags=None, status=None, property_type='plot'),
+        raw_buyer(notes='', tags=[]),
+        raw_buyer(created_at=datetime(2024, 5, 1, 10, 30, tzinfo=timezone.utc)),
+    ]
+
+    def test_matches_buyer_serializer(self):
+        represent, fields = buyer_representation()
+        expected = BuyerSerializer([Buyer._from_son(doc) for doc in self.documents], many=True).data
+        actual = represent(self.documents)
+
+        self.assertEqual(JSONRenderer().render(actual), JSONRenderer().render(expected))
+        self.assertEqual(list(actual[0]), list(BuyerSerializer().fields))
+        self.assertEqual(actual[1]['status'], 'new')
+        self.assertEqual(actual[1]['tags'], [])
+        self.assertIsNone(actual[1]['bhk'])
+
+    def test_projects_serialized_fields(self):
+        _, fields = buyer_representation()
+        self.assertEqual(fields, list(BuyerSerializer().fields))
+        self.assertEqual(json.loads(JSONRenderer().render(
+            buyer_representation()[0]([raw_buyer()])[0]
+        ))['created_at'], '2024-05-01T10:30:00.123000Z')
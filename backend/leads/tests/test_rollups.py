@@ -0,0 +1,258 @@
+"""
+Tests for incremental lead rollups
+"""
+import copy
+from datetime import datetime, timedelta
+from unittest import mock
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase, override_settings
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError
+from leads import aggregations
+from leads.aggregations import BuyerSource, RollupSource, compute_dashboard_stats, default_source
+from leads.models import Buyer, LeadRollup
+from leads.rollups import RollupDelta, budget_range_keys, rebuild_rollups, record_created, rollup_increments
+from leads.tests.test_aggregations import FakeQuerySet
+
+
+def snapshot(**overrides):
+    values = {
+        'created_at': datetime(2024, 5, 4, 13, 45),
+        'city': 'pune',
+        'source': 'website',
+        'status': 'new',
+        'property_type': 'apartment',
+        'budget_min': 6000000,
+        'budget_max': 8000000,
+        'timeline': '3months',
+        'bhk': '2bhk',
+    }
+    values.update(overrides)
+    return values
+
+
+class RollupTests(SimpleTestCase):
+    def test_budget_range_keys_cover_both_tables(self):
+        self.assertEqual(budget_range_keys(6000000, 8000000), {'50L_1Cr'})
+        self.assertEqual(budget_range_keys(6000000, 7000000), {'50L_1Cr', '50L_75L'})
+        self.assertEqual(budget_range_keys(0, 2000000), {'under_25L'})
+        self.assertEqual(budget_range_keys(1000000, 2000000), {'under_25L', 'under_50L'})
+
+    def test_increments(self):
+        inc = rollup_increments(snapshot(), sign=-1)
+        self.assertEqual(inc['count'], -1)
+        self.assertEqual(inc['budget_min_sum'], -6000000)
+        self.assertEqual(inc['budgeted_count'], -1)
+        self.assertEqual(inc['timeline.3months'], -1)
+        self.assertEqual(inc['bhk.2bhk'], -1)
+
+    def test_delta_merges_buckets(self):
+        delta = RollupDelta()
+        delta.add(snapshot())
+        delta.add(snapshot(created_at=datetime(2024, 5, 4, 20, 0)))
+        delta.add(snapshot(status='contacted'))
+        operations = delta.operations()
+
+        self.assertEqual(len(operations), 2)
+        update = operations[0]._doc
+        self.assertEqual(operations[0]._filter, {'_id': '2024-05-04|pune|website|new|apartment'})
+        self.assertEqual(update['$inc']['count'], 2)
+        self.assertEqual(update['$setOnInsert']['day'], datetime(2024, 5, 4))
+
+    def test_status_change_moves_lead(self):
+        delta = RollupDelta()
+        delta.add(snapshot(), sign=-1)
+        delta.add(snapshot(status='qualified'))
+        incs = {op._filter['_id'].split('|')[3]: op._doc['$inc']['count'] for op in delta.operations()}
+        self.assertEqual(incs, {'new': -1, 'qualified': 1})
+
+    def test_noop_change_writes_nothing(self):
+        delta = RollupDelta()
+        delta.add(snapshot(), sign=-1)
+        delta.add(snapshot())
+        self.assertEqual(delta.operations(), [])
+
+    def test_dashboard_reads_rollup_counters(self):
+        queryset = FakeQuerySet([])
+        compute_dashboard_stats(source=RollupSource(queryset))
+        facets = queryset.pipelines[0][-1]['$facet']
+        self.assertEqual(facets['total'][-1]['$group']['count'], {'$sum': '$count'})
+        self.assertEqual(facets['recent'][0]['$match'].keys(), {'day'})
+        self.assertEqual(facets['timeline'][0], {'$project': {'pairs': {'$objectToArray': '$timeline'}}})
+
+
+class DefaultSourceTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(aggregations, '_rollups_rebuilt', (False, None))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.state = mock.Mock()
+        state = mock.patch('leads.aggregations.rollup_state', return_value=self.state)
+        state.start()
+        self.addCleanup(state.stop)
+
+    @override_settings(LEAD_ROLLUPS_ENABLED=True)
+    def test_live_aggregation_until_a_rebuild_completes(self):
+        self.state.find_one.return_value = None
+        self.assertIsInstance(default_source(), BuyerSource)
+        self.assertNotIsInstance(default_source(), RollupSource)
+
+        aggregations.mark_rollups_rebuilt(12)
+        self.assertIsInstance(default_source(), RollupSource)
+        self.state.replace_one.assert_called_once()
+
+    @override_settings(LEAD_ROLLUPS_ENABLED=True)
+    def test_rebuild_marker_is_read_again_after_the_ttl(self):
+        self.state.find_one.return_value = {'_id': 'rebuilt'}
+        for _ in range(3):
+            self.assertIsInstance(default_source(), RollupSource)
+        self.state.find_one.assert_called_once()
+
+        self.state.find_one.return_value = None
+        with mock.patch('leads.aggregations.time.monotonic', return_value=10 ** 9):
+            self.assertIsInstance(default_source(), BuyerSource)
+
+    @override_settings(LEAD_ROLLUPS_ENABLED=False)
+    def test_disabled_rollups_are_not_read(self):
+        self.assertNotIsInstance(default_source(), RollupSource)
+        self.state.find_one.assert_not_called()
+
+    @override_settings(LEAD_ROLLUPS_ENABLED=False)
+    @mock.patch('leads.rollups.bump_list_marker')
+    def test_uncounted_write_clears_the_marker(self, bump_list_marker):
+        self.state.find_one.return_value = {'_id': 'rebuilt'}
+        self.state.delete_one.return_value.deleted_count = 1
+        record_created([snapshot()])
+        self.state.delete_one.assert_called_once_with({'_id': 'rebuilt'})
+
+        # Enabled again: the counters are not read until the next rebuild
+        self.state.find_one.return_value = None
+        with override_settings(LEAD_ROLLUPS_ENABLED=True):
+            self.assertIsInstance(default_source(), BuyerSource)
+
+
+def matches(document, query):
+    for key, condition in query.items():
+        if key == '$or':
+            if not any(matches(document, branch) for branch in condition):
+                return False
+            continue
+        value = document.get(key)
+        if not isinstance(condition, dict):
+            if value != condition:
+                return False
+            continue
+        for op, operand in condition.items():
+            if op == '$not' and matches(document, {key: operand}):
+                return False
+            if op == '$in' and value not in operand:
+                return False
+            if op == '$ne' and value == operand:
+                return False
+            if op == '$gte' and not (value is not None and value >= operand):
+                return False
+            if op == '$lt' and not (value is not None and value < operand):
+                return False
+    return True
+
+
+class FakeCursor(list):
+    def batch_size(self, size):
+        return self
+
+
+class FakeCollection:
+    """Just enough of a pymongo collection for rebuild_rollups; ``clock`` stands in for $currentDate"""
+
+    def __init__(self, clock, documents=()):
+        self.clock = clock
+        self.documents = {document['_id']: document for document in documents}
+        self.on_find = None
+
+    def find(self, query, projection=None):
+        found = FakeCursor(copy.deepcopy(document) for document in self.documents.values() if matches(document, query))
+        if self.on_find:
+            self.on_find()
+        return found
+
+    def bulk_write(self, operations, ordered=True):
+        errors = []
+        for index, operation in enumerate(operations):
+            document = self.documents.get(operation._filter['_id'])
+            if isinstance(operation, ReplaceOne):
+                if document is None or matches(document, operation._filter):
+                    self.documents[operation._doc['_id']] = copy.deepcopy(operation._doc)
+                else:
+                    errors.append({'index': index, 'code': 11000})
+                continue
+            if document is None:
+                document = self.documents[operation._filter['_id']] = dict(operation._filter, **operation._doc['$setOnInsert'])
+            for field, amount in operation._doc['$inc'].items():
+                target, _, key = field.rpartition('.')
+                counters = document.setdefault(target, {}) if target else document
+                counters[key] = counters.get(key, 0) + amount
+            document['touched_at'] = self.clock()
+        if errors:
+            raise BulkWriteError({'writeErrors': errors})
+
+    def delete_many(self, query):
+        for rollup_id in [key for key, document in self.documents.items() if matches(document, query)]:
+            del self.documents[rollup_id]
+
+    def count_documents(self, query):
+        return len(self.documents)
+
+
+@override_settings(LEAD_ROLLUPS_ENABLED=True)
+@mock.patch('leads.rollups.bump_list_marker')
+@mock.patch('leads.rollups.mark_rollups_rebuilt')
+@mock.patch('leads.rollups.clear_rollups_rebuilt', return_value=False)
+class RebuildTests(SimpleTestCase):
+    def setUp(self):
+        self.now = datetime(2024, 6, 1)
+        self.buyers = FakeCollection(self.clock, [
+            dict(snapshot(), _id='b1'), dict(snapshot(), _id='b2'), dict(snapshot(city='delhi'), _id='b3'),
+        ])
+        stale = RollupDelta()
+        for _ in range(5):
+            stale.add(snapshot())
+        stale.add(snapshot(city='mumbai'))
+        self.rollups = FakeCollection(self.clock, stale.documents())
+        state = mock.Mock()
+        state.find_one_and_update.side_effect = lambda *args, **kwargs: {'now': self.clock()}
+        for patcher in [
+            mock.patch.object(Buyer, '_get_collection', return_value=self.buyers),
+            mock.patch.object(LeadRollup, '_get_collection', return_value=self.rollups),
+            mock.patch.object(LeadRollup, 'ensure_indexes'),
+            mock.patch('leads.rollups.rollup_state', return_value=state),
+        ]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def clock(self):
+        self.now += timedelta(seconds=1)
+        return self.now
+
+    def counts(self):
+        return {rollup_id.split('|')[1]: document['count'] for rollup_id, document in self.rollups.documents.items()}
+
+    def test_counters_are_recomputed_and_empty_buckets_dropped(self, clear, mark, bump_list_marker):
+        self.assertEqual(rebuild_rollups(), 2)
+        self.assertEqual(self.counts(), {'pune': 2, 'delhi': 1})
+        mark.assert_called_once_with(2)
+
+    def test_writes_during_the_scan_are_kept(self, clear, mark, bump_list_marker):
+        def concurrent_create():
+            self.buyers.on_find = None
+            self.buyers.documents['b4'] = dict(snapshot(), _id='b4')
+            record_created([self.buyers.documents['b4']])
+        self.buyers.on_find = concurrent_create
+
+        rebuild_rollups()
+        self.assertEqual(self.counts(), {'pune': 3, 'delhi': 1})
+
+    @override_settings(LEAD_ROLLUPS_ENABLED=False)
+    def test_refuses_while_writes_are_not_counted(self, clear, mark, bump_list_marker):
+        with self.assertRaises(ImproperlyConfigured):
+            rebuild_rollups()
+        clear.assert_not_called()
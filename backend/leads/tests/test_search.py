@@ -0,0 +1,65 @@
+"""
+Tests for token-based lead search
+"""
+from django.test import SimpleTestCase
+from leads.models import Buyer
+from leads.search import phone_digits, plan_search, search_terms, search_tokens
+from utils.validators import normalize_phone_number
+
+
+def matches(search, full_name='Priya Sharma', email='priya.s@example.com', phone='+91 98765-43210'):
+    terms = search_terms(search)
+    return set(terms) <= set(search_tokens(full_name, email, phone))
+
+
+class SearchTokenTests(SimpleTestCase):
+    def test_tokens_cover_name_email_and_phone_prefixes(self):
+        tokens = search_tokens('Priya Sharma', 'Priya.S@Example.com', '+91 98765-43210')
+        for token in ['pr', 'priya', 'sha', 'sharma', 'priya.s@example.com', 'priya.s',
+                      'example.com', 'exam', 'com', '98', '98765', '9876543210']:
+            self.assertIn(token, tokens)
+        self.assertNotIn('91', tokens)
+        self.assertEqual(tokens, sorted(set(tokens)))
+
+    def test_phone_digits_strip_country_and_trunk_prefix(self):
+        self.assertEqual(phone_digits('+91 98765 43210'), '9876543210')
+        self.assertEqual(phone_digits('098765-43210'), '9876543210')
+        self.assertEqual(phone_digits(None), '')
+
+    def test_normalize_phone_number(self):
+        for phone in ['9876543210', '+91 98765 43210', '+91-9876543210', '09876543210', '919876543210']:
+            self.assertEqual(normalize_phone_number(phone), '+919876543210')
+        self.assertIsNone(normalize_phone_number('1234567890'))
+        self.assertIsNone(normalize_phone_number('98765'))
+        self.assertIsNone(normalize_phone_number(None))
+
+    def test_search_matches_word_prefixes(self):
+        self.assertTrue(matches('pri sha'))
+        self.assertTrue(matches('SHARMA'))
+        self.assertTrue(matches('priya.s@exa'))
+        self.assertTrue(matches('+91 98765'))
+        self.assertTrue(matches('example.com'))
+        self.assertFalse(matches('rahul'))
+
+    def test_planner_uses_phone_index_for_complete_numbers(self):
+        plan = plan_search(' +91 98765-43210 ')
+        self.assertEqual(plan.kind, 'phone')
+        self.assertEqual(plan.query.query, {'phone_normalized': '+919876543210'})
+        self.assertEqual(plan_search('98765').kind, 'tokens')
+
+    def test_planner_falls_back_to_scan_for_short_terms(self):
+        plan = plan_search('Priya S')
+        self.assertEqual(plan.kind, 'scan')
+        plan = plan_search(' priya  sharma ')
+        self.assertEqual((plan.kind, plan.terms), ('tokens', ['priya', 'sharma']))
+        self.assertEqual(plan.query.query, {'search_tokens__all': ['priya', 'sharma']})
+
+    def test_buyer_refreshes_tokens(self):
+        buyer = Buyer(full_name='Rahul Iyer', email='rahul@example.com', phone='9876543210')
+        buyer.refresh_derived_fields()
+        self.assertIn('iyer', buyer.search_tokens)
+        self.assertEqual(buyer.phone_normalized, '+919876543210')
+        self.assertEqual(Buyer.derived_values(buyer.to_mongo()), {
+            'search_tokens': buyer.search_tokens, 'phone_normalized': '+919876543210',
+            'email_normalized': 'rahul@example.com',
+        })
@@ -0,0 +1,67 @@
+"""
+Tests for analytics time bucketing
+"""
+from datetime import datetime
+from django.test import SimpleTestCase
+from leads.aggregations import BuyerSource, compute_trends
+from leads.timeseries import (
+    bucket_rows,
+    bucket_stages,
+    daily_buckets,
+    monthly_buckets,
+    weekly_buckets,
+)
+from leads.tests.test_aggregations import FakeQuerySet
+
+
+class TimeBucketTests(SimpleTestCase):
+    def test_monthly_buckets_follow_calendar(self):
+        buckets = monthly_buckets(datetime(2024, 3, 31, 15, 30), 4)
+        self.assertEqual([b.key for b in buckets], ['2024-03', '2024-02', '2024-01', '2023-12'])
+        self.assertEqual(buckets[1].start, datetime(2024, 2, 1))
+        self.assertEqual(buckets[1].end, datetime(2024, 3, 1))
+        self.assertEqual(buckets[0].end, datetime(2024, 4, 1))
+
+    def test_daily_buckets(self):
+        buckets = daily_buckets(datetime(2024, 2, 28, 18, 0), 3)
+        self.assertEqual([b.key for b in buckets], ['2024-02-28', '2024-02-29', '2024-03-01'])
+        self.assertEqual(buckets[0].start, datetime(2024, 2, 28))
+
+    def test_weekly_buckets_are_contiguous(self):
+        buckets = weekly_buckets(datetime(2024, 3, 31), 3)
+        self.assertEqual(buckets[0].key, 'Week 1')
+        self.assertEqual(buckets[0].start, buckets[1].end)
+        self.assertEqual(buckets[1].start, buckets[2].end)
+
+    def test_bucket_stages_boundaries(self):
+        buckets = monthly_buckets(datetime(2024, 3, 15), 3)
+        match, bucket = bucket_stages(buckets)
+        self.assertEqual(
+            bucket['$bucket']['boundaries'],
+            [datetime(2024, 1, 1), datetime(2024, 2, 1), datetime(2024, 3, 1), datetime(2024, 4, 1)]
+        )
+        self.assertEqual(match['$match']['created_at']['$gte'], datetime(2024, 1, 1))
+
+    def test_bucket_rows_fills_empty_buckets(self):
+        buckets = daily_buckets(datetime(2024, 1, 1), 2)
+        rows = bucket_rows(buckets, [{'_id': datetime(2024, 1, 2), 'count': 3, 'lost': 1}], {'lost': {}})
+        self.assertEqual(rows, {
+            '2024-01-01': {'count': 0, 'lost': 0},
+            '2024-01-02': {'_id': datetime(2024, 1, 2), 'count': 3, 'lost': 1},
+        })
+
+    def test_trends_single_round_trip(self):
+        queryset = FakeQuerySet([{
+            'monthly': [{'_id': datetime(2024, 3, 1), 'count': 2, 'new': 1, 'contacted': 0,
+                         'qualified': 0, 'converted': 1, 'lost': 0}],
+            'weekly': [],
+        }])
+        trends = compute_trends(now=datetime(2024, 3, 20), source=BuyerSource(queryset))
+
+        self.assertEqual(len(queryset.pipelines), 1)
+        self.assertEqual(len(trends['monthly_trends']), 12)
+        self.assertEqual(trends['monthly_trends']['2024-03'], {
+            'total_leads': 2, 'new': 1, 'contacted': 0, 'qualified': 0, 'converted': 1, 'lost': 0,
+        })
+        self.assertEqual(trends['monthly_trends']['2023-04']['total_leads'], 0)
+        self.assertEqual(trends['weekly_trends']['Week 8'], {'leads': 0, 'conversion_rate': 0})
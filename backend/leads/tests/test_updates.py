@@ -0,0 +1,268 @@
+"""
+Tests for atomic partial updates (PATCH) and versioned full updates (PUT)
+"""
+import copy
+from datetime import datetime
+from unittest import mock
+from django.test import SimpleTestCase
+from rest_framework import serializers
+from rest_framework.test import APIRequestFactory
+from leads.models import Buyer
+from leads.updates import VersionConflict, patch_buyer, rule_guards, update_buyer
+from leads.views import BuyerDetailView
+
+
+def matches(document, condition):
+    for key, expected in condition.items():
+        if key == '$or':
+            if not any(matches(document, branch) for branch in expected):
+                return False
+            continue
+        value = document.get(key)
+        if not isinstance(expected, dict):
+            if value != expected:
+                return False
+            continue
+        for op, operand in expected.items():
+            if op == '$ne' and value == operand:
+                return False
+            if op == '$in' and value not in operand:
+                return False
+            if op == '$nin' and value in operand:
+                return False
+            if op == '$gte' and not (value is not None and value >= operand):
+                return False
+            if op == '$lte' and not (value is not None and value <= operand):
+                return False
+    return True
+
+
+class FakeBuyerCollection:
+    def __init__(self, *documents):
+        self.documents = {document['_id']: document for document in documents}
+        self.writes = []
+
+    def find_one(self, query):
+        for document in self.documents.values():
+            if matches(document, query):
+                return copy.deepcopy(document)
+        return None
+
+    def find_one_and_update(self, query, update, return_document=None):
+        self.writes.append(('find_one_and_update', query, update))
+        document = next((document for document in self.documents.values() if matches(document, query)), None)
+        if document is None:
+            return None
+        before = copy.deepcopy(document)
+        self._apply(document, update)
+        return before
+
+    def update_one(self, query, update):
+        self.writes.append(('update_one', query, update))
+        for document in self.documents.values():
+            if matches(document, query):
+                self._apply(document, update)
+                return
+
+    def _apply(self, document, update):
+        document.update(update.get('$set', {}))
+        for field, amount in update.get('$inc', {}).items():
+            document[field] = (document.get(field) or 0) + amount
+
+
+def stored_buyer(**overrides):
+    document = {
+        '_id': 'b1', 'full_name': 'Priya Sharma', 'email': 'priya@example.com', 'phone': '9876543210',
+        'city': 'pune', 'property_type': 'apartment', 'bhk': '2bhk', 'purpose': 'buy',
+        'budget_min': 5000000, 'budget_max': 8000000, 'timeline': '3months', 'source': 'website',
+        'status': 'new', 'owner_id': 'u1', 'created_at': datetime(2024, 1, 1), 'updated_at': datetime(2024, 1, 1),
+        'version': 3,
+    }
+    document.update(Buyer.derived_values(document))
+    document.update(overrides)
+    return document
+
+
+@mock.patch('leads.updates.record_history')
+@mock.patch('leads.updates.record_updated')
+class PatchBuyerTests(SimpleTestCase):
+    def patch(self, collection, data, **kwargs):
+        with mock.patch.object(Buyer, '_get_collection', return_value=collection):
+            return patch_buyer('b1', data, 'u2', **kwargs)
+
+    def test_sets_only_patched_fields_in_one_write(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer())
+        after = self.patch(collection, {'status': 'qualified'})
+
+        self.assertEqual(len(collection.writes), 1)
+        _, query, update = collection.writes[0]
+        self.assertEqual(set(update['$set']), {'status', 'updated_at'})
+        self.assertEqual(update['$inc'], {'version': 1})
+        self.assertEqual(after['status'], 'qualified')
+        self.assertEqual(after['version'], 4)
+        record_history.assert_called_once_with('b1', 'u2', {'status': 'new → qualified'})
+        (before_snapshot, after_snapshot), = record_updated.call_args[0][0]
+        self.assertEqual((before_snapshot['status'], after_snapshot['status']), ('new', 'qualified'))
+
+    def test_no_op_patch_writes_nothing(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer())
+        after = self.patch(collection, {'status': 'new'})
+        self.assertEqual(after['version'], 3)
+        self.assertEqual(collection.documents['b1']['version'], 3)
+        record_history.assert_not_called()
+
+    def test_stale_version_conflicts(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer())
+        with self.assertRaises(VersionConflict) as raised:
+            self.patch(collection, {'status': 'qualified'}, expected_version=2)
+        self.assertEqual(raised.exception.current_version, 3)
+        self.assertEqual(collection.documents['b1']['status'], 'new')
+
+        self.patch(collection, {'status': 'qualified'}, expected_version=3)
+        self.assertEqual(collection.documents['b1']['version'], 4)
+
+    def test_missing_lead(self, record_updated, record_history):
+        with self.assertRaises(Buyer.DoesNotExist):
+            self.patch(FakeBuyerCollection(), {'status': 'qualified'})
+
+    def test_rules_are_checked_against_stored_values(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer())
+        with self.assertRaises(serializers.ValidationError):
+            self.patch(collection, {'budget_min': 9000000})
+        with self.assertRaises(serializers.ValidationError):
+            self.patch(collection, {'bhk': ''})
+        self.assertEqual(collection.documents['b1']['budget_min'], 5000000)
+
+        self.patch(collection, {'budget_min': 7000000})
+        self.assertEqual(collection.documents['b1']['budget_min'], 7000000)
+
+    def test_rule_guards(self, record_updated, record_history):
+        self.assertEqual(rule_guards({'budget_max': 10}), {'budget_min': {'$lte': 10}})
+        self.assertEqual(rule_guards({'property_type': 'villa'}), {'bhk': {'$nin': [None, '']}})
+        self.assertEqual(rule_guards({'budget_min': 1, 'budget_max': 2, 'property_type': 'plot', 'bhk': ''}), {})
+
+    def test_derived_fields_follow_a_partial_contact_change(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer())
+        after = self.patch(collection, {'phone': '9123456789'})
+        self.assertEqual(collection.documents['b1']['phone_normalized'], '+919123456789')
+        self.assertIn('pri', collection.documents['b1']['search_tokens'])
+        self.assertEqual(after['phone_normalized'], '+919123456789')
+        self.assertEqual(collection.writes[1][1], {'_id': 'b1', 'version': 4})
+
+
+@mock.patch('leads.updates.record_history')
+@mock.patch('leads.updates.record_updated')
+class PatchEndpointTests(SimpleTestCase):
+    def patch(self, collection, data):
+        request = APIRequestFactory().patch('/api/leads/buyers/b1/', data, format='json')
+        with mock.patch.object(Buyer, '_get_collection', return_value=collection):
+            return BuyerDetailView.as_view()(request, pk='b1')
+
+    def test_partial_patch_skips_the_read(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer())
+        with mock.patch.object(collection, 'find_one', wraps=collection.find_one) as find_one:
+            response = self.patch(collection, {'status': 'qualified'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'qualified')
+        self.assertEqual(response.data['version'], 4)
+        find_one.assert_not_called()
+
+    def test_version_conflict_is_409(self, record_updated, record_history):
+        response = self.patch(FakeBuyerCollection(stored_buyer()), {'status': 'qualified', 'version': 1})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['version'], 3)
+
+    def test_invalid_pair_is_400(self, record_updated, record_history):
+        response = self.patch(FakeBuyerCollection(stored_buyer()), {'budget_min': 9, 'budget_max': 1})
+        self.assertEqual(response.status_code, 400)
+
+    def test_unknown_lead_is_404(self, record_updated, record_history):
+        self.assertEqual(self.patch(FakeBuyerCollection(), {'status': 'qualified'}).status_code, 404)
+
+
+@mock.patch('leads.updates.record_history')
+@mock.patch('leads.updates.record_updated')
+class UpdateBuyerTests(SimpleTestCase):
+    def update(self, collection, data, **kwargs):
+        buyer = Buyer._from_son(stored_buyer())
+        with mock.patch.object(Buyer, '_get_collection', return_value=collection):
+            return update_buyer(buyer, dict(buyer_data(buyer), **data), 'u2', **kwargs)
+
+    def test_sets_changed_fields_guarded_by_the_version_read(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer())
+        buyer = self.update(collection, {'status': 'qualified', 'phone': '9123456789'})
+
+        _, query, update = collection.writes[0]
+        self.assertEqual(query, {'_id': 'b1', 'version': 3})
+        self.assertEqual(set(update['$set']), {
+            'status', 'phone', 'updated_at', 'search_tokens', 'phone_normalized', 'email_normalized',
+        })
+        self.assertEqual(update['$inc'], {'version': 1})
+        self.assertEqual(buyer.version, 4)
+        self.assertEqual(collection.documents['b1']['version'], 4)
+        self.assertEqual(collection.documents['b1']['phone_normalized'], '+919123456789')
+        record_history.assert_called_once_with('b1', 'u2', {
+            'phone': '9876543210 → 9123456789', 'status': 'new → qualified',
+        })
+
+    def test_update_in_between_is_a_conflict(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer())
+        collection.documents['b1'].update(status='contacted', version=4)
+        with self.assertRaises(VersionConflict) as raised:
+            self.update(collection, {'budget_max': 9000000})
+        self.assertEqual(raised.exception.current_version, 4)
+        self.assertEqual(collection.documents['b1']['budget_max'], 8000000)
+        record_history.assert_not_called()
+
+    def test_expected_version_and_deleted_lead(self, record_updated, record_history):
+        with self.assertRaises(VersionConflict):
+            self.update(FakeBuyerCollection(stored_buyer()), {'status': 'lost'}, expected_version=2)
+        with self.assertRaises(Buyer.DoesNotExist):
+            self.update(FakeBuyerCollection(), {'status': 'lost'})
+
+    def test_unchanged_update_writes_nothing(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer())
+        self.assertEqual(self.update(collection, {}).version, 3)
+        self.assertEqual(collection.writes, [])
+
+    def test_save_bumps_version_with_inc_under_a_condition(self, record_updated, record_history):
+        buyer = Buyer._from_son(stored_buyer())
+        buyer.status = 'lost'
+        self.assertEqual(buyer._get_update_doc()['$set'], {'status': 'lost'})
+        buyer.version = 4
+        self.assertEqual(buyer._get_update_doc()['$inc'], {'version': 1})
+        self.assertNotIn('version', buyer._get_update_doc()['$set'])
+
+
+def buyer_data(buyer):
+    return {field: getattr(buyer, field) for field in [
+        'full_name', 'email', 'phone', 'city', 'property_type', 'bhk', 'purpose',
+        'budget_min', 'budget_max', 'timeline', 'source', 'status',
+    ]}
+
+
+@mock.patch('leads.updates.record_history')
+@mock.patch('leads.updates.record_updated')
+class PutEndpointTests(SimpleTestCase):
+    def put(self, collection, data):
+        request = APIRequestFactory().put('/api/leads/buyers/b1/', data, format='json')
+        buyer = Buyer._from_son(stored_buyer())
+        with mock.patch.object(Buyer, '_get_collection', return_value=collection), \
+                mock.patch.object(BuyerDetailView, 'get_object', return_value=buyer):
+            return BuyerDetailView.as_view()(request, pk='b1')
+
+    def test_put_returns_the_new_version(self, record_updated, record_history):
+        data = dict(buyer_data(Buyer._from_son(stored_buyer())), status='qualified')
+        response = self.put(FakeBuyerCollection(stored_buyer()), data)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['version'], 4)
+
+    def test_concurrent_write_is_409(self, record_updated, record_history):
+        collection = FakeBuyerCollection(stored_buyer(version=4))
+        data = dict(buyer_data(Buyer._from_son(stored_buyer())), status='qualified')
+        response = self.put(collection, data)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['version'], 4)
+
+        self.assertEqual(self.put(collection, dict(data, version=2)).status_code, 409)
+        self.assertEqual(self.put(collection, dict(data, version='x')).status_code, 400)
@@ -1,12 +1,20 @@
 """
 Tests for validation utilities
 """
+import threading
+import time
+from unittest import mock
 from django.test import TestCase
+from utils import validators
 from utils.validators import (
     validate_budget_range, 
     validate_phone_number, 
-    validate_email
+    validate_email,
+    validate_csv_row,
+    validate_csv_rows,
+    CSVRowValidator
 )
+from leads.models import Buyer
 
 class ValidatorTests(TestCase):
     def test_budget_validation(self):
@@ -35,4 +43,79 @@ class ValidatorTests(TestCase):
         
         # Invalid emails
         self.assertFalse(validate_email('invalid-email'))
-        self.assertFalse(validate_email('test@'))
\ No newline at end of file
+        self.assertFalse(validate_email('test@'))
+
+class ParallelValidationTests(TestCase):
+    def test_parallel_matches_serial_order(self):
+        rows = [
+            {'full_name': f'Lead {i}', 'email': f'lead{i}@example.com', 'phone': '9876543210',
+             'city': 'pune' if i % 3 else 'paris', 'property_type': 'plot', 'purpose': 'buy',
+             'budget_min': '5000000', 'budget_max': '6000000', 'timeline': '1month', 'source': 'website'}
+            for i in range(40)
+        ]
+        serial = validate_csv_rows(rows, workers=1)
+        parallel = validate_csv_rows(rows, workers=2, chunk_size=7, min_parallel_rows=10)
+        self.assertEqual(parallel, serial)
+        self.assertEqual(parallel[0], {'errors': ['Invalid city: paris']})
+
+    def test_small_batches_stay_serial_by_default(self):
+        with mock.patch('utils.validators._get_validation_pool') as get_pool:
+            validate_csv_rows([{'full_name': 'Lead'}] * 1000, workers=4)
+        get_pool.assert_not_called()
+
+    def test_concurrent_callers_share_one_pool(self):
+        def slow_pool(**kwargs):
+            time.sleep(0.01)
+            return mock.Mock()
+
+        with mock.patch.dict(validators._validation_pools, clear=True), \
+                mock.patch('utils.validators.ProcessPoolExecutor', side_effect=slow_pool) as executor:
+            pools = []
+            threads = [
+                threading.Thread(target=lambda: pools.append(validators._get_validation_pool(3)))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(executor.call_count, 1)
+        self.assertEqual(len({id(pool) for pool in pools}), 1)
+
+
+def csv_row(**overrides):
+    row = {'full_name': 'Lead', 'email': 'lead@example.com', 'phone': '+91 98765-43210',
+           'city': 'pune', 'property_type': 'apartment', 'bhk': '2', 'purpose': 'buy',
+           'budget_min': '5000000', 'budget_max': '6000000.5', 'timeline': '1month',
+           'source': 'website', 'status': 'qualified', 'notes': ' call back ', 'tags': 'hot, ,nri'}
+    row.update(overrides)
+    return row
+
+class CompiledValidatorTests(TestCase):
+    rows = [
+        csv_row(),
+        csv_row(full_name='  ', email=None),
+        {'full_name': 'Only name'},
+        csv_row(email='bad', phone='12345', city='paris', property_type='castle',
+                purpose='steal', timeline='never', source='tv'),
+        csv_row(budget_min='lots'),
+        csv_row(budget_min='9000000', budget_max='1000000'),
+        csv_row(bhk='9'),
+        csv_row(bhk=''),
+        csv_row(property_type='villa', bhk='  '),
+        csv_row(property_type='plot', bhk=''),
+        csv_row(status='unknown', tags='', notes=''),
+        {key: value for key, value in csv_row().items() if key not in ('bhk', 'status', 'notes', 'tags')},
+    ]
+
+    def test_matches_validate_csv_row(self):
+        validator = CSVRowValidator.from_document(Buyer)
+        expected = [validate_csv_row(row) for row in self.rows]
+        self.assertEqual([validator.validate(row) for row in self.rows], expected)
+        self.assertEqual(validator.validate_batch(self.rows), expected)
+
+    def test_parallel_with_validator(self):
+        validator = CSVRowValidator.from_document(Buyer)
+        rows = self.rows * 5
+        parallel = validate_csv_rows(rows, workers=2, chunk_size=7, min_parallel_rows=10, validator=validator)
+        self.assertEqual(parallel, [validate_csv_row(row) for row in rows])
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Calendar time-bucketing for the analytics endpoints.
+
+Buckets are computed in Python as contiguous ``[start, end)`` ranges and
+then counted server-side with a single ``$bucket`` stage on ``created_at``,
+so a time series costs one query regardless of how many buckets it has.
+"""
+from datetime import timedelta
+
+
+class TimeBucket:
+    """A labelled ``[start, end)`` range of ``created_at`` values"""
+
+    def __init__(self, key, start, end):
+        self.key = key
+        self.start = start
+        self.end = end
+
+    def __repr__(self):
+        return f"TimeBucket({self.key!r}, {self.start}, {self.end})"
+
+
+def start_of_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def add_months(value, months):
+    """Shift a first-of-month datetime by ``months`` calendar months"""
+    month_index = value.year * 12 + (value.month - 1) + months
+    return value.replace(year=month_index // 12, month=month_index % 12 + 1, day=1)
+
+
+def daily_buckets(start, days):
+    """``days`` consecutive calendar days starting on the day of ``start``"""
+    first = start_of_day(start)
+    buckets = []
+    for i in range(days):
+        day_start = first + timedelta(days=i)
+        buckets.append(TimeBucket(day_start.strftime('%Y-%m-%d'), day_start, day_start + timedelta(days=1)))
+    return buckets
+
+
+def weekly_buckets(end, weeks):
+    """Rolling 7-day windows ending at ``end``, most recent first ("Week 1")"""
+    buckets = []
+    for i in range(weeks):
+        buckets.append(TimeBucket(
+            f"Week {i+1}",
+            end - timedelta(days=(i+1)*7),
+            end - timedelta(days=i*7),
+        ))
+    return buckets
+
+
+def monthly_buckets(end, months):
+    """The last ``months`` calendar months including the current one, most recent first"""
+    current = start_of_day(end).replace(day=1)
+    buckets = []
+    for i in range(months):
+        month_start = add_months(current, -i)
+        buckets.append(TimeBucket(month_start.strftime('%Y-%m'), month_start, add_months(month_start, 1)))
+    return buckets
+
+
+def bucket_stages(buckets, output=None, field='created_at', count=None):
+    """
+    Facet stages counting documents per bucket with ``$bucket``.
+
+    ``output`` holds extra accumulators and ``count`` overrides the default
+    one-per-document ``count`` accumulator. Buckets must be contiguous (as
+    produced by the helpers above).
+    """
+    ordered = sorted(buckets, key=lambda bucket: bucket.start)
+    boundaries = [bucket.start for bucket in ordered] + [ordered[-1].end]
+    accumulators = {'count': count or {'$sum': 1}}
+    accumulators.update(output or {})
+    return [
+        {'$match': {field: {'$gte': boundaries[0], '$lt': boundaries[-1]}}},
+        {'$bucket': {
+            'groupBy': f'${field}',
+            'boundaries': boundaries,
+            'output': accumulators,
+        }},
+    ]
+
+
+def bucket_rows(buckets, rows, output=None):
+    """
+    Map ``$bucket`` result rows back onto ``buckets``.
+
+    Returns {bucket key: row} in the order of ``buckets``; empty buckets get
+    zeros for ``count`` and every accumulator in ``output``.
+    """
+    by_start = {row['_id']: row for row in rows}
+    empty = dict.fromkeys(['count', *(output or {})], 0)
+    return {
+        bucket.key: by_start.get(_naive(bucket.start)) or dict(empty)
+        for bucket in buckets
+    }
+
+
+def _naive(value):
+    # Mongo returns naive UTC datetimes with millisecond precision
+    return value.replace(microsecond=value.microsecond // 1000 * 1000, tzinfo=None)
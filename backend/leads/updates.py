@@ -0,0 +1,183 @@
+"""
+Atomic partial updates of a lead (the PATCH fast path).
+
+``patch_buyer`` applies a validated partial update with one
+``find_one_and_update``: a ``$set`` of the patched fields plus
+``updated_at``, a ``$inc`` of ``version``, and a filter that
+
+* only matches when at least one patched value differs (no-op PATCHes
+  write nothing),
+* keeps the cross-field rules true against the stored values of the
+  fields that are not patched (BHK for apartments/villas, budget order),
+* optionally requires the caller's ``version`` (optimistic concurrency).
+
+The returned pre-image gives the history diff and the rollup move, so the
+request needs no separate read. When the filter does not match, one read
+tells apart a missing lead, a stale version, a rule violation and a no-op.
+
+``update_buyer`` applies a full update (PUT) to a lead loaded by the view:
+a ``$set`` of the fields that changed, a ``$inc`` of ``version`` and a
+filter on the version that was read, so an update that lands in between
+is a ``VersionConflict`` instead of being overwritten.
+"""
+from datetime import datetime
+from pymongo import ReturnDocument
+from rest_framework import serializers
+from .models import Buyer
+from .history import record_history
+from .rollups import record_updated, rollup_snapshot
+from utils.validators import validate_budget_range, validate_bhk_requirement
+
+BHK_PROPERTY_TYPES = ['apartment', 'villa']
+
+
+class VersionConflict(Exception):
+    """The lead was updated since the version the client sent"""
+
+    def __init__(self, current_version):
+        super().__init__(f'Lead was modified (current version {current_version})')
+        self.current_version = current_version
+
+
+def rule_guards(data):
+    """Filter conditions keeping cross-field rules true for fields ``data`` leaves as stored"""
+    guards = {}
+    if 'budget_min' in data and 'budget_max' not in data:
+        guards['budget_max'] = {'$gte': data['budget_min']}
+    if 'budget_max' in data and 'budget_min' not in data:
+        guards['budget_min'] = {'$lte': data['budget_max']}
+    if data.get('property_type') in BHK_PROPERTY_TYPES and 'bhk' not in data:
+        guards['bhk'] = {'$nin': [None, '']}
+    if 'bhk' in data and not data['bhk'] and 'property_type' not in data:
+        guards['property_type'] = {'$nin': BHK_PROPERTY_TYPES}
+    return guards
+
+
+def check_rules(document):
+    """Raise a DRF ``ValidationError`` when ``document`` breaks a cross-field rule"""
+    try:
+        validate_bhk_requirement(document.get('property_type'), document.get('bhk'))
+        validate_budget_range(document.get('budget_min'), document.get('budget_max'))
+    except ValueError as e:
+        raise serializers.ValidationError(str(e))
+
+
+def version_filter(version):
+    """Filter condition matching a stored ``version``; documents written before versions existed count as 0"""
+    return version if version else {'$in': [0, None]}
+
+
+def mongo_values(data):
+    """Validated serializer data as raw ``buyers`` field values"""
+    return {
+        Buyer._fields[field].db_field: Buyer._fields[field].to_mongo(value)
+        for field, value in data.items()
+    }
+
+
+def _diagnose(buyer_id, values, expected_version):
+    """Why the update matched nothing; returns the stored document for a no-op"""
+    document = Buyer._get_collection().find_one({'_id': buyer_id})
+    if document is None:
+        raise Buyer.DoesNotExist(buyer_id)
+    if expected_version is not None and document.get('version', 0) != expected_version:
+        raise VersionConflict(document.get('version', 0))
+    check_rules(dict(document, **values))
+    return document
+
+
+def patch_buyer(buyer_id, data, changed_by, expected_version=None):
+    """
+    Apply validated partial ``data`` to a lead; returns the updated raw document.
+
+    Raises ``Buyer.DoesNotExist``, ``VersionConflict`` or a DRF
+    ``ValidationError`` when a cross-field rule would break.
+    """
+    values = mongo_values(data)
+    now = datetime.utcnow()
+
+    query = {'_id': buyer_id, **rule_guards(values)}
+    if values:
+        query['$or'] = [{field: {'$ne': value}} for field, value in values.items()]
+    if expected_version is not None:
+        query['version'] = version_filter(expected_version)
+
+    derived_inputs = [field for field in Buyer.DERIVED_SOURCE_FIELDS if field in values]
+    update_values = dict(values, updated_at=now)
+    if len(derived_inputs) == len(Buyer.DERIVED_SOURCE_FIELDS):
+        update_values.update(Buyer.derived_values(values))
+
+    collection = Buyer._get_collection()
+    before = collection.find_one_and_update(
+        query, {'$set': update_values, '$inc': {'version': 1}}, return_document=ReturnDocument.BEFORE,
+    ) if values else None
+    if before is None:
+        return _diagnose(buyer_id, values, expected_version)
+
+    after = dict(before, **update_values)
+    after['version'] = before.get('version', 0) + 1
+    if derived_inputs and 'search_tokens' not in update_values:
+        # Derived fields need the stored name/email/phone, known only now. A
+        # concurrent update bumps the version and recomputes them itself.
+        derived = Buyer.derived_values(after)
+        collection.update_one({'_id': buyer_id, 'version': after['version']}, {'$set': derived})
+        after.update(derived)
+
+    changes = {
+        field: f"{before.get(field)} → {value}"
+        for field, value in values.items() if before.get(field) != value
+    }
+    record_updated([(rollup_snapshot(before), rollup_snapshot(after))])
+    if changes:
+        record_history(buyer_id, changed_by, changes)
+    return after
+
+
+def update_buyer(buyer, data, changed_by, expected_version=None):
+    """
+    Apply validated full ``data`` to a loaded ``buyer``; returns it updated.
+
+    Raises ``VersionConflict`` when the lead is not at the version that was
+    read (or at ``expected_version``), ``Buyer.DoesNotExist`` when it was
+    deleted in between.
+    """
+    version = buyer.version or 0
+    if expected_version is not None and expected_version != version:
+        raise VersionConflict(version)
+
+    changes = {}
+    for field, new_value in data.items():
+        old_value = getattr(buyer, field)
+        if old_value != new_value:
+            changes[field] = f"{old_value} → {new_value}"
+    if not changes:
+        return buyer
+
+    before = rollup_snapshot(buyer)
+    for field in changes:
+        setattr(buyer, field, data[field])
+    buyer.updated_at = datetime.utcnow()
+    buyer.validate()
+    update_values = mongo_values({field: getattr(buyer, field) for field in changes})
+    update_values['updated_at'] = buyer.updated_at
+    if any(field in changes for field in Buyer.DERIVED_SOURCE_FIELDS):
+        buyer.refresh_derived_fields()
+        update_values.update(Buyer.derived_values({field: getattr(buyer, field) for field in Buyer.DERIVED_SOURCE_FIELDS}))
+
+    collection = Buyer._get_collection()
+    written = collection.find_one_and_update(
+        {'_id': buyer.id, 'version': version_filter(version)},
+        {'$set': update_values, '$inc': {'version': 1}},
+        return_document=ReturnDocument.BEFORE,
+    )
+    if written is None:
+        current = collection.find_one({'_id': buyer.id})
+        if current is None:
+            raise Buyer.DoesNotExist(buyer.id)
+        raise VersionConflict(current.get('version', 0))
+
+    buyer.version = version + 1
+    buyer._clear_changed_fields()
+    record_updated([(before, rollup_snapshot(buyer))])
+    record_history(buyer.id, changed_by, changes)
+    return buyer
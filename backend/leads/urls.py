@@ -3,9 +3,12 @@ from . import views
 
 urlpatterns = [
     path('buyers/', views.BuyerListCreateView.as_view(), name='buyer-list-create'),
+    path('buyers/bulk/', views.bulk_buyers, name='buyer-bulk'),
     path('buyers/<str:pk>/', views.BuyerDetailView.as_view(), name='buyer-detail'),
     path('buyers/<str:buyer_id>/history/', views.BuyerHistoryView.as_view(), name='buyer-history'),
+    path('history/', views.bulk_history, name='bulk-history'),
     path('import/', views.csv_import, name='csv-import'),
+    path('import/<str:job_id>/', views.csv_import_status, name='csv-import-status'),
     path('export/', views.csv_export, name='csv-export'),
     path('template/', views.csv_template, name='csv-template'),
     path('stats/', views.dashboard_stats, name='dashboard-stats'),
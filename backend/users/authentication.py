@@ -1,11 +1,49 @@
 """
 JWT Authentication for the application
 """
+import hashlib
+import time
 import jwt
 from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework.authentication import BaseAuthentication
 from rest_framework.exceptions import AuthenticationFailed
+from utils.cache import TTLCache
+from .tokens import resolve_user, user_cache
+
+# Payloads of tokens whose signature was already verified, keyed by the
+# token's hash and kept no longer than the token's own ``exp``. Tokens
+# without ``exp`` are re-verified every JWT_VERIFIED_CACHE_SECONDS.
+verified_tokens = TTLCache(
+    maxsize=getattr(settings, 'JWT_VERIFIED_CACHE_SIZE', 4096),
+    ttl=getattr(settings, 'JWT_VERIFIED_CACHE_SECONDS', 3600),
+)
+
+
+def decode_token(token):
+    """Verified payload of ``token``; the signature is checked once per token"""
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    payload = verified_tokens.get(key)
+    if payload is not None:
+        # Same rule as jwt.decode (no leeway), checked on every use
+        if 'exp' in payload and payload['exp'] <= time.time():
+            verified_tokens.delete(key)
+            raise jwt.ExpiredSignatureError('Signature has expired')
+        return payload
+
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+    ttl = verified_tokens.ttl
+    if 'exp' in payload:
+        ttl = min(ttl, payload['exp'] - time.time())
+    if ttl > 0:
+        verified_tokens.set(key, payload, ttl)
+    return payload
+
+
+def cache_stats():
+    """Hit/miss counters of the token and user caches"""
+    return {'verified_tokens': verified_tokens.stats(), 'users': user_cache.stats()}
+
 
 class JWTAuthentication(BaseAuthentication):
     def authenticate(self, request):
@@ -17,14 +55,14 @@ class JWTAuthentication(BaseAuthentication):
         token = auth_header.split(' ')[1]
         
         try:
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload = decode_token(token)
             user_id = payload.get('user_id')
             
             if not user_id:
                 raise AuthenticationFailed('Invalid token')
             
             try:
-                user = User.objects.get(id=user_id)
+                user = resolve_user(payload)
             except User.DoesNotExist:
                 raise AuthenticationFailed('User not found')
             
@@ -0,0 +1,17 @@
+"""
+Keep the authentication user cache in step with the user table
+"""
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .tokens import user_changed
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, **kwargs):
+    user_changed(instance.id)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(sender, instance, **kwargs):
+    user_changed(instance.id)
@@ -0,0 +1,185 @@
+"""
+Tests for JWT authentication and cached user resolution
+"""
+import time
+from unittest.mock import patch
+import jwt
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.authentication import JWTAuthentication, cache_stats, verified_tokens
+from users.tokens import issue_token, user_cache
+from users.views import auth_cache_stats
+from utils.cache import TTLCache
+
+
+class TTLCacheTests(TestCase):
+    def setUp(self):
+        self.now = 0
+        self.cache = TTLCache(maxsize=2, ttl=10, timer=lambda: self.now)
+
+    def test_entries_expire(self):
+        self.cache.set('a', 1)
+        self.now = 9
+        self.assertEqual(self.cache.get('a'), 1)
+        self.now = 10
+        self.assertIsNone(self.cache.get('a'))
+
+    def test_least_recently_used_is_evicted(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        self.cache.get('a')
+        self.cache.set('c', 3)
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertIsNone(self.cache.get('b'))
+
+
+class JWTAuthenticationTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        verified_tokens.clear()
+        cache.clear()
+        # Stands in for a shared (Redis/Memcached) cache
+        shared = patch('users.tokens._shared_cache', return_value=cache)
+        shared.start()
+        self.addCleanup(shared.stop)
+        self.user = User.objects.create_user('priya@example.com', 'priya@example.com', 'secret', first_name='Priya')
+        self.token = issue_token(self.user)
+        self.auth = JWTAuthentication()
+
+    def authenticate(self, token=None):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token or self.token}')
+        return self.auth.authenticate(request)
+
+    def test_embedded_claims_authenticate_without_queries(self):
+        # The first request confirms the user in the database
+        with self.assertNumQueries(1):
+            self.authenticate()
+        user_cache.clear()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user.id, self.user.id)
+        self.assertEqual(user.first_name, 'Priya')
+        self.assertEqual(user.date_joined, self.user.date_joined)
+
+    def test_resolved_user_is_cached(self):
+        self.authenticate()
+        with self.assertNumQueries(0):
+            user, _ = self.authenticate()
+        self.assertEqual(user.email, 'priya@example.com')
+
+    def test_saving_user_invalidates_cache_and_older_claims(self):
+        self.authenticate()
+        self.user.first_name = 'Priyanka'
+        self.user.save()
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate()
+        self.assertEqual(user.first_name, 'Priyanka')
+
+    def test_deactivated_user_is_rejected(self):
+        self.authenticate()
+        self.user.is_active = False
+        self.user.save()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+            self.authenticate()
+
+    def test_stale_claims_are_not_trusted(self):
+        old_token = self.token
+        self.user.first_name = 'Priyanka'
+        self.user.save()
+        self.authenticate(issue_token(self.user))
+        user_cache.clear()
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(old_token)
+        self.assertEqual(user.first_name, 'Priyanka')
+
+    def test_deactivation_without_signals_is_rejected_once_unconfirmed(self):
+        self.authenticate()
+        # No post_save signal, and the shared cache lost its marker
+        User.objects.filter(id=self.user.id).update(is_active=False)
+        cache.clear()
+        user_cache.clear()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User is inactive'):
+            self.authenticate()
+
+    def test_deleted_user_is_rejected(self):
+        self.authenticate()
+        self.user.delete()
+        with self.assertRaisesMessage(AuthenticationFailed, 'User not found'):
+            self.authenticate()
+
+    def test_token_without_claims_uses_the_database(self):
+        token = jwt.encode({'user_id': self.user.id}, settings.SECRET_KEY, algorithm='HS256')
+        with self.assertNumQueries(1):
+            user, _ = self.authenticate(token)
+        self.assertEqual(user, self.user)
+
+
+class UnsharedCacheTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        verified_tokens.clear()
+        self.user = User.objects.create_user('ravi@example.com', 'ravi@example.com', 'secret')
+
+    def test_claims_are_not_trusted_without_a_shared_cache(self):
+        auth = JWTAuthentication()
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {issue_token(self.user)}')
+        for alias in [None, 'default']:
+            with override_settings(AUTH_USER_CACHE_ALIAS=alias):
+                auth.authenticate(request)
+                user_cache.clear()
+                with self.assertNumQueries(1):
+                    auth.authenticate(request)
+                user_cache.clear()
+
+
+class VerifiedTokenCacheTests(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        verified_tokens.clear()
+        self.user = User.objects.create_user('amit@example.com', 'amit@example.com', 'secret')
+        self.auth = JWTAuthentication()
+
+    def authenticate(self, token):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.auth.authenticate(request)
+
+    def test_signature_is_verified_once_per_token(self):
+        token = issue_token(self.user)
+        with patch('users.authentication.jwt.decode', wraps=jwt.decode) as decode:
+            for _ in range(3):
+                self.authenticate(token)
+        self.assertEqual(decode.call_count, 1)
+        self.assertEqual(cache_stats()['verified_tokens']['hits'], 2)
+
+    def test_stats_endpoint_is_staff_only(self):
+        self.authenticate(issue_token(self.user))
+        request = APIRequestFactory().get('/api/auth/cache-stats/')
+        force_authenticate(request, user=self.user)
+        self.assertEqual(auth_cache_stats(request).status_code, 403)
+
+        self.user.is_staff = True
+        request = APIRequestFactory().get('/api/auth/cache-stats/')
+        force_authenticate(request, user=self.user)
+        response = auth_cache_stats(request)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['verified_tokens']['misses'], 1)
+        self.assertIn('hit_rate', response.data['users'])
+
+    def test_cached_token_still_expires(self):
+        token = jwt.encode({'user_id': self.user.id, 'exp': int(time.time()) + 60}, settings.SECRET_KEY, algorithm='HS256')
+        self.authenticate(token)
+        with patch('users.authentication.time.time', return_value=time.time() + 61):
+            with self.assertRaisesMessage(AuthenticationFailed, 'Token has expired'):
+                self.authenticate(token)
+        self.assertEqual(len(verified_tokens), 0)
+
+    def test_invalid_tokens_are_not_cached(self):
+        token = jwt.encode({'user_id': self.user.id}, 'another-key', algorithm='HS256')
+        for _ in range(2):
+            with self.assertRaisesMessage(AuthenticationFailed, 'Invalid token'):
+                self.authenticate(token)
+        self.assertEqual(len(verified_tokens), 0)
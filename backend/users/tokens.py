@@ -0,0 +1,147 @@
+"""
+JWT issuing and user resolution
+
+Tokens embed the claims a request needs (name, email, staff flag). An
+authenticated request is served from, in order:
+
+1. a process-local LRU (``AUTH_USER_CACHE_SECONDS``) of resolved users,
+2. the token's own claims, only while the shared cache holds a "validated"
+   marker for the user whose fingerprint matches those claims,
+3. the database, which (for an active user) writes that marker for
+   ``AUTH_USER_CLAIMS_SECONDS``.
+
+Claims fail closed: without a shared ``AUTH_USER_CACHE_ALIAS`` cache, or
+once the marker expires or is evicted, the user is read from the database.
+Saving or deleting a user drops the marker and the local entry; changes
+that bypass signals (``queryset.update()``) are seen within
+``AUTH_USER_CLAIMS_SECONDS``.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone as dt_timezone
+import jwt
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from utils.cache import TTLCache
+
+TOKEN_LIFETIME = timedelta(days=7)
+
+# Bumped when the embedded claims change shape; older tokens use the database
+CLAIMS_VERSION = 1
+
+# Claims compared against the database when deciding whether to trust them
+CLAIM_FIELDS = ['user_id', 'email', 'username', 'first_name', 'last_name', 'is_staff', 'date_joined']
+
+user_cache = TTLCache(
+    maxsize=getattr(settings, 'AUTH_USER_CACHE_SIZE', 1024),
+    ttl=getattr(settings, 'AUTH_USER_CACHE_SECONDS', 60),
+)
+
+
+def user_claims(user):
+    """The profile claims embedded in ``user``'s tokens"""
+    return {
+        'user_id': user.id,
+        'email': user.email,
+        'username': user.username,
+        'first_name': user.first_name,
+        'last_name': user.last_name,
+        'is_staff': user.is_staff,
+        'date_joined': user.date_joined.isoformat() if user.date_joined else None,
+    }
+
+
+def issue_token(user):
+    """Signed access token for ``user`` with its profile claims embedded"""
+    now = datetime.utcnow()
+    payload = dict(user_claims(user), cv=CLAIMS_VERSION, exp=now + TOKEN_LIFETIME, iat=now)
+    return jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+
+
+def _shared_cache():
+    """The cache holding validation markers, or None when claims must not be trusted"""
+    alias = getattr(settings, 'AUTH_USER_CACHE_ALIAS', None)
+    if not alias:
+        return None
+    shared = caches[alias]
+    # A per-process cache would not see a change made by another process
+    if isinstance(shared, (LocMemCache, DummyCache)):
+        return None
+    return shared
+
+
+def _validated_key(user_id):
+    return f'auth_user_validated_{user_id}'
+
+
+def _fingerprint(claims):
+    values = '|'.join(str(claims.get(field)) for field in CLAIM_FIELDS)
+    return hashlib.sha256(values.encode('utf-8')).hexdigest()
+
+
+def user_changed(user_id):
+    """Forget cached copies of a user; its tokens re-check the database"""
+    user_cache.delete(user_id)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_validated_key(user_id))
+
+
+def _mark_validated(user):
+    shared = _shared_cache()
+    if shared is not None:
+        seconds = getattr(settings, 'AUTH_USER_CLAIMS_SECONDS', 300)
+        shared.set(_validated_key(user.id), _fingerprint(user_claims(user)), seconds)
+
+
+def _claims_are_current(payload):
+    if payload.get('cv') != CLAIMS_VERSION:
+        return False
+    shared = _shared_cache()
+    if shared is None:
+        return False
+    # Present only if the database recently showed an active user with these claims
+    return shared.get(_validated_key(payload['user_id'])) == _fingerprint(payload)
+
+
+def user_from_claims(payload):
+    """``User`` built from a token's claims, as if it had been loaded from the database"""
+    date_joined = payload.get('date_joined')
+    user = User(
+        id=payload['user_id'],
+        email=payload.get('email', ''),
+        username=payload.get('username', ''),
+        first_name=payload.get('first_name', ''),
+        last_name=payload.get('last_name', ''),
+        is_staff=payload.get('is_staff', False),
+        is_active=True,
+        date_joined=datetime.fromisoformat(date_joined) if date_joined else None,
+    )
+    if user.date_joined and user.date_joined.tzinfo is None and settings.USE_TZ:
+        user.date_joined = user.date_joined.replace(tzinfo=dt_timezone.utc)
+    user._state.adding = False
+    user._state.db = 'default'
+    return user
+
+
+def resolve_user(payload):
+    """
+    The ``User`` a decoded token belongs to; raises ``User.DoesNotExist``.
+    Only active users are cached.
+    """
+    user_id = payload['user_id']
+    user = user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    if _claims_are_current(payload):
+        user = user_from_claims(payload)
+    else:
+        user = User.objects.get(id=user_id)
+        if user.is_active:
+            _mark_validated(user)
+    if user.is_active:
+        user_cache.set(user_id, user)
+    return user
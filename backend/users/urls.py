@@ -8,4 +8,5 @@ urlpatterns = [
     path('demo-login/', views.demo_login, name='demo-login'),
     path('login/', views.login, name='login'),
     path('profile/', views.profile, name='profile'),
+    path('cache-stats/', views.auth_cache_stats, name='auth-cache-stats'),
 ]
\ No newline at end of file
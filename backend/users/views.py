@@ -1,12 +1,11 @@
-import jwt
-from datetime import datetime, timedelta
-from django.conf import settings
 from django.contrib.auth.models import User
 from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 from .serializers import LoginSerializer, UserSerializer
+from .authentication import cache_stats
+from .tokens import issue_token
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -29,14 +28,7 @@ def demo_login(request):
         demo_user.save()
     
     # Generate JWT token
-    payload = {
-        'user_id': demo_user.id,
-        'email': demo_user.email,
-        'exp': datetime.utcnow() + timedelta(days=7),
-        'iat': datetime.utcnow()
-    }
-    
-    token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+    token = issue_token(demo_user)
     
     return Response({
         'access_token': token,
@@ -53,14 +45,7 @@ def login(request):
         user = serializer.validated_data['user']
         
         # Generate JWT token
-        payload = {
-            'user_id': user.id,
-            'email': user.email,
-            'exp': datetime.utcnow() + timedelta(days=7),
-            'iat': datetime.utcnow()
-        }
-        
-        token = jwt.encode(payload, settings.SECRET_KEY, algorithm='HS256')
+        token = issue_token(user)
         
         return Response({
             'access_token': token,
@@ -73,4 +58,10 @@ def login(request):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def profile(request):
-    return Response(UserSerializer(request.user).data)
\ No newline at end of file
+    return Response(UserSerializer(request.user).data)
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def auth_cache_stats(request):
+    """Size, hits, misses and hit rate of this process's token and user caches (staff only)"""
+    return Response(cache_stats())
\ No newline at end of file
@@ -0,0 +1,196 @@
+"""
+Per-request MongoDB query profiling.
+
+``query_profiler`` is a pymongo command listener (registered in settings
+before the connection is made) that attributes every command to the request
+being served. ``QueryProfilerMiddleware`` adds the totals as response
+headers and keeps a short history of requests, with their slowest query
+shapes, for the ``/api/debug/queries/`` endpoint.
+
+A query shape is the command with every literal replaced by ``?``, so the
+same query with different values is counted together.
+"""
+import contextvars
+import json
+import threading
+from collections import deque
+from django.conf import settings
+from django.http import Http404, JsonResponse
+from pymongo import monitoring
+
+# Driver housekeeping that says nothing about the view's queries
+IGNORED_COMMANDS = {'hello', 'isMaster', 'ismaster', 'ping', 'endSessions', 'explain', 'buildInfo', 'saslStart', 'saslContinue'}
+
+# Commands that can be explained, and the part of the command that shapes them
+SHAPE_FIELDS = {
+    'find': ['filter', 'sort', 'projection'],
+    'aggregate': ['pipeline'],
+    'count': ['query'],
+    'distinct': ['key', 'query'],
+    'findAndModify': ['query', 'sort'],
+    'update': ['updates'],
+    'delete': ['deletes'],
+}
+EXPLAINABLE = {'find', 'aggregate', 'count', 'distinct', 'findAndModify'}
+
+# Keys kept verbatim in shapes: they are structure, not data
+STRUCTURAL_KEYS = {'sort', 'projection', 'key', '$project', '$sort', '$group', '$facet', '$bucket', '$unwind'}
+
+_current = contextvars.ContextVar('query_profiler_recorder', default=None)
+_history = deque(maxlen=50)
+_history_lock = threading.Lock()
+
+
+def redact(value):
+    """``value`` with every literal replaced by ``'?'``"""
+    if isinstance(value, dict):
+        return {key: value[key] if key in STRUCTURAL_KEYS else redact(value[key]) for key in value}
+    if isinstance(value, (list, tuple)):
+        # $in / $all lists of any length share a shape
+        items = [redact(item) for item in value]
+        return items if any(isinstance(item, (dict, list)) for item in items) else ['?']
+    return '?'
+
+
+def query_shape(command_name, command):
+    """Stable text for the shape of a MongoDB command"""
+    collection = command.get(command_name)
+    fields = {field: redact({field: command[field]})[field] for field in SHAPE_FIELDS.get(command_name, []) if field in command}
+    text = f'{command_name} {collection}'
+    if fields:
+        text += ' ' + json.dumps(fields, sort_keys=True, default=str)
+    return text
+
+
+class RequestQueries:
+    """Commands issued while serving one request"""
+
+    def __init__(self, capture_commands=False):
+        self.capture_commands = capture_commands
+        self.count = 0
+        self.total_ms = 0.0
+        self.shapes = {}
+        self.samples = {}
+        self.pending = {}
+
+    def started(self, event):
+        shape = query_shape(event.command_name, event.command)
+        self.pending[(event.connection_id, event.request_id)] = shape
+        if self.capture_commands and event.command_name in EXPLAINABLE and shape not in self.samples:
+            self.samples[shape] = (event.database_name, dict(event.command))
+
+    def finished(self, event):
+        shape = self.pending.pop((event.connection_id, event.request_id), None)
+        if shape is None:
+            return
+        duration_ms = event.duration_micros / 1000.0
+        self.count += 1
+        self.total_ms += duration_ms
+        stats = self.shapes.setdefault(shape, {'shape': shape, 'count': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['total_ms'] += duration_ms
+        stats['max_ms'] = max(stats['max_ms'], duration_ms)
+
+    def slowest(self, limit):
+        return sorted(self.shapes.values(), key=lambda stats: stats['total_ms'], reverse=True)[:limit]
+
+
+class QueryProfiler(monitoring.CommandListener):
+    """Routes driver command events to the current request's ``RequestQueries``"""
+
+    def started(self, event):
+        recorder = _current.get()
+        if recorder is not None and event.command_name not in IGNORED_COMMANDS:
+            recorder.started(event)
+
+    def succeeded(self, event):
+        recorder = _current.get()
+        if recorder is not None:
+            recorder.finished(event)
+
+    def failed(self, event):
+        recorder = _current.get()
+        if recorder is not None:
+            recorder.finished(event)
+
+
+query_profiler = QueryProfiler()
+
+
+def profiler_enabled():
+    return getattr(settings, 'QUERY_PROFILER_ENABLED', settings.DEBUG)
+
+
+def explain_enabled():
+    return settings.DEBUG and getattr(settings, 'QUERY_PROFILER_EXPLAIN', False)
+
+
+def explain_command(database_name, command):
+    """``queryPlanner`` winning plan for a captured command, or the error"""
+    from mongoengine.connection import get_connection
+
+    command = {key: value for key, value in command.items() if not key.startswith('$') and key not in ('lsid', 'txnNumber')}
+    try:
+        result = get_connection()[database_name].command({'explain': command, 'verbosity': 'queryPlanner'})
+    except Exception as e:
+        return {'error': str(e)}
+    plan = result.get('queryPlanner', {}).get('winningPlan', result)
+    # Plans echo the filter values back (ObjectIds, datetimes)
+    return json.loads(json.dumps(plan, default=str))
+
+
+class QueryProfilerMiddleware:
+    """
+    Records the Mongo commands of each request and reports them in the
+    ``X-DB-Query-Count`` and ``X-DB-Query-Time-Ms`` headers.
+
+    Streaming responses only include the commands run before the first
+    chunk is sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not profiler_enabled() or request.path.startswith('/api/debug/'):
+            return self.get_response(request)
+
+        explain = explain_enabled()
+        recorder = RequestQueries(capture_commands=explain)
+        token = _current.set(recorder)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        response['X-DB-Query-Count'] = str(recorder.count)
+        response['X-DB-Query-Time-Ms'] = f'{recorder.total_ms:.1f}'
+
+        slowest = [dict(stats) for stats in recorder.slowest(getattr(settings, 'QUERY_PROFILER_SLOWEST', 5))]
+        if explain:
+            for stats in slowest:
+                sample = recorder.samples.get(stats['shape'])
+                if sample:
+                    stats['explain'] = explain_command(*sample)
+        with _history_lock:
+            _history.appendleft({
+                'method': request.method,
+                'path': request.get_full_path(),
+                'status': response.status_code,
+                'query_count': recorder.count,
+                'query_time_ms': round(recorder.total_ms, 1),
+                'slowest': slowest,
+            })
+        return response
+
+
+def recent_requests():
+    with _history_lock:
+        return list(_history)
+
+
+def debug_queries(request):
+    """Query counts, DB time and slowest query shapes of recent requests (DEBUG only)"""
+    if not settings.DEBUG:
+        raise Http404
+    return JsonResponse({'requests': recent_requests()})
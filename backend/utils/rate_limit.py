@@ -1,36 +1,269 @@
 """
-Simple rate limiting utilities
+Rate limiting utilities
+
+Two algorithms, each atomic on every backend that supports it:
+
+* ``fixed`` - a counter per clock-aligned window, bumped with an atomic
+  increment; the key (and its expiry) changes with the window, so a busy
+  client cannot keep one window alive.
+* ``gcra`` - the generic cell rate algorithm: one "theoretical arrival
+  time" per key, which behaves like a sliding window (requests are allowed
+  again gradually, not all at once when a window rolls over).
+
+Backends:
+
+* ``CacheBackend`` - the Django cache (``add`` + ``incr``); fixed window
+  only, so asking for GCRA on it raises ``ImproperlyConfigured``.
+* ``LocalMemoryBackend`` - per-process counters under a lock.
+* ``RedisBackend`` - any redis-py compatible client (INCR for the fixed
+  window, WATCH/MULTI for GCRA). A GCRA update that keeps losing the race
+  for its key gives up after ``MAX_UPDATE_RETRIES`` and the request is
+  refused (429), so a hot key cannot keep workers spinning.
 """
+import math
+import threading
+import time
+from collections import namedtuple
+from django.conf import settings
 from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
 from django.http import JsonResponse
 from functools import wraps
-import time
 
-def rate_limit(max_requests=100, window=3600):
+try:
+    from redis.exceptions import WatchError
+except ImportError:  # redis is only needed for RATE_LIMIT_BACKEND = 'redis'
+    class WatchError(Exception):
+        pass
+
+ALGORITHMS = ['fixed', 'gcra']
+
+# WATCH/MULTI attempts per GCRA update before the request is refused
+MAX_UPDATE_RETRIES = 10
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'limit', 'remaining', 'retry_after', 'reset_after'])
+
+
+class RateLimitContended(Exception):
+    """An update lost the race for its key on every attempt"""
+
+
+class LocalMemoryBackend:
+    """Counters in this process's memory; exact, but not shared between processes"""
+
+    def __init__(self, timer=time.time):
+        self.timer = timer
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _purge(self, now):
+        # Drop expired keys once the table grows, so old windows do not pile up
+        if len(self._values) > 10000:
+            self._values = {key: item for key, item in self._values.items() if item[1] > now}
+
+    def incr(self, key, ttl):
+        with self._lock:
+            now = self.timer()
+            value, expires_at = self._values.get(key, (0, 0))
+            if expires_at <= now:
+                self._purge(now)
+                value, expires_at = 0, now + ttl
+            self._values[key] = (value + 1, expires_at)
+            return value + 1
+
+    def update(self, key, func):
+        """Atomically replace the value of ``key`` with ``func(value)`` -> (new value or None, ttl, result)"""
+        with self._lock:
+            now = self.timer()
+            value, expires_at = self._values.get(key, (None, 0))
+            if expires_at <= now:
+                value = None
+            new_value, ttl, result = func(value)
+            if new_value is not None:
+                self._values[key] = (new_value, now + ttl)
+            return result
+
+
+class CacheBackend:
+    """
+    The Django cache. ``add`` + ``incr`` is atomic on the Redis, Memcached
+    and local-memory backends; there is no atomic read-modify-write, so GCRA
+    is not available.
+    """
+
+    def __init__(self, cache_backend=None):
+        self.cache = cache_backend or cache
+
+    def incr(self, key, ttl):
+        self.cache.add(key, 0, ttl)
+        try:
+            return self.cache.incr(key)
+        except ValueError:
+            # Expired between add and incr; another request may have added it
+            # again since, so add-or-keep and count this request on top
+            self.cache.add(key, 0, ttl)
+            return self.cache.incr(key)
+
+
+class RedisBackend:
+    """A redis-py compatible client"""
+
+    def __init__(self, client, prefix='rl:'):
+        self.client = client
+        self.prefix = prefix
+
+    def incr(self, key, ttl):
+        pipe = self.client.pipeline()
+        pipe.incr(self.prefix + key)
+        pipe.expire(self.prefix + key, int(math.ceil(ttl)))
+        count, _ = pipe.execute()
+        return count
+
+    def update(self, key, func):
+        """
+        ``LocalMemoryBackend.update`` with WATCH/MULTI; raises ``RateLimitContended``
+        when the key changed under every one of ``MAX_UPDATE_RETRIES`` attempts
+        """
+        key = self.prefix + key
+        with self.client.pipeline() as pipe:
+            for _ in range(MAX_UPDATE_RETRIES):
+                try:
+                    pipe.watch(key)
+                    value = pipe.get(key)
+                    new_value, ttl, result = func(float(value) if value is not None else None)
+                    if new_value is None:
+                        pipe.reset()
+                        return result
+                    pipe.multi()
+                    pipe.set(key, repr(new_value), px=max(1, int(ttl * 1000)))
+                    pipe.execute()
+                    return result
+                except WatchError:
+                    # Another request updated the key first; retry with its value
+                    continue
+        raise RateLimitContended(key)
+
+
+def fixed_window(backend, key, limit, window, now):
+    index = int(now // window)
+    count = backend.incr(f'{key}:{index}', window)
+    reset_after = (index + 1) * window - now
+    allowed = count <= limit
+    return RateLimitResult(allowed, limit, max(0, limit - count), 0 if allowed else reset_after, reset_after)
+
+
+def gcra(backend, key, limit, window, now):
+    interval = window / limit
+
+    def step(tat):
+        tat = max(tat or now, now)
+        new_tat = tat + interval
+        allow_at = new_tat - window
+        # Tolerate float drift from summing intervals
+        if allow_at - now > 1e-9:
+            result = RateLimitResult(False, limit, 0, allow_at - now, tat - now)
+            return None, 0, result
+        remaining = int((now - allow_at) / interval + 1e-9)
+        return new_tat, new_tat - now, RateLimitResult(True, limit, remaining, 0, new_tat - now)
+
+    try:
+        return backend.update(key, step)
+    except RateLimitContended:
+        # The key is hotter than its own limit allows; refuse rather than spin
+        return RateLimitResult(False, limit, 0, interval, interval)
+
+
+class RateLimiter:
+    """``limit`` requests per ``window`` seconds for each key"""
+
+    def __init__(self, limit, window, algorithm='fixed', backend=None, timer=time.time):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f'Unknown rate limit algorithm: {algorithm}')
+        if algorithm == 'gcra' and not supports_update(backend):
+            raise ImproperlyConfigured(
+                "GCRA needs an atomic update; use RATE_LIMIT_BACKEND = 'local' or 'redis', "
+                "or the 'fixed' algorithm"
+            )
+        self.limit = limit
+        self.window = window
+        self.algorithm = fixed_window if algorithm == 'fixed' else gcra
+        self.backend = backend
+        self.timer = timer
+
+    def hit(self, key):
+        """Count a request for ``key``; returns a ``RateLimitResult``"""
+        backend = self.backend or default_backend()
+        return self.algorithm(backend, key, self.limit, self.window, self.timer())
+
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+# RATE_LIMIT_BACKEND values whose backend has an atomic ``update``
+UPDATE_BACKENDS = ['local', 'redis']
+
+
+def default_backend_name():
+    return getattr(settings, 'RATE_LIMIT_BACKEND', 'cache')
+
+
+def supports_update(backend=None):
+    """Whether ``backend`` (default: RATE_LIMIT_BACKEND) can run GCRA, checked without creating it"""
+    if backend is None:
+        return default_backend_name() in UPDATE_BACKENDS
+    return callable(getattr(backend, 'update', None))
+
+
+def default_backend():
+    """The backend named by ``RATE_LIMIT_BACKEND``: 'cache' (default), 'local' or 'redis'"""
+    global _default_backend
+    if _default_backend is None:
+        with _default_backend_lock:
+            if _default_backend is None:
+                name = default_backend_name()
+                if name == 'local':
+                    _default_backend = LocalMemoryBackend()
+                elif name == 'redis':
+                    import redis
+                    _default_backend = RedisBackend(redis.Redis.from_url(settings.RATE_LIMIT_REDIS_URL))
+                else:
+                    _default_backend = CacheBackend()
+    return _default_backend
+
+
+def rate_limit_headers(response, result):
+    response['X-RateLimit-Limit'] = str(result.limit)
+    response['X-RateLimit-Remaining'] = str(result.remaining)
+    response['X-RateLimit-Reset'] = str(math.ceil(result.reset_after))
+    if not result.allowed:
+        response['Retry-After'] = str(max(1, math.ceil(result.retry_after)))
+    return response
+
+
+def rate_limit(max_requests=100, window=3600, algorithm='fixed', key=None, backend=None):
     """
     Rate limiting decorator
     max_requests: Maximum number of requests allowed
     window: Time window in seconds (default: 1 hour)
+    algorithm: 'fixed' window or 'gcra' (smooth, sliding-window-like)
+    key: callable(request) identifying the client (default: client IP)
+    backend: rate limit backend (default: RATE_LIMIT_BACKEND)
     """
+    limiter = RateLimiter(max_requests, window, algorithm, backend)
+
     def decorator(view_func):
         @wraps(view_func)
         def wrapper(request, *args, **kwargs):
-            # Get client IP
-            client_ip = get_client_ip(request)
-            cache_key = f"rate_limit_{client_ip}_{view_func.__name__}"
-            
-            # Get current request count
-            current_requests = cache.get(cache_key, 0)
-            
-            if current_requests >= max_requests:
-                return JsonResponse({
+            client = key(request) if key else get_client_ip(request)
+            result = limiter.hit(f"rate_limit_{client}_{view_func.__name__}")
+
+            if not result.allowed:
+                response = JsonResponse({
                     'error': 'Rate limit exceeded. Please try again later.'
                 }, status=429)
-            
-            # Increment counter
-            cache.set(cache_key, current_requests + 1, window)
-            
-            return view_func(request, *args, **kwargs)
+            else:
+                response = view_func(request, *args, **kwargs)
+            return rate_limit_headers(response, result)
         return wrapper
     return decorator
 
@@ -41,4 +274,4 @@ def get_client_ip(request):
         ip = x_forwarded_for.split(',')[0]
     else:
         ip = request.META.get('REMOTE_ADDR')
-    return ip
\ No newline at end of file
+    return ip
@@ -5,6 +5,9 @@ import { Upload, Download, FileText, CheckCircle, XCircle, AlertCircle } from 'l
 import { buyersApi } from '@/lib/api'
 
 interface ImportResult {
+  id: string
+  status: 'queued' | 'running' | 'completed' | 'failed'
+  error?: string
   total_rows: number
   valid_rows: number
   invalid_rows: number
@@ -14,8 +17,20 @@ interface ImportResult {
     data: any
   }>
   created_buyers: string[]
+  duplicate_rows: number
+  duplicates: Array<{
+    row: number
+    action: 'skipped' | 'updated' | 'created'
+    matched_on: 'email' | 'phone'
+    duplicate_of: string | null
+    duplicate_of_row: number | null
+  }>
 }
 
+const POLL_INTERVAL_MS = 1000
+
+const sleep = (ms: number) => new Promise((resolve) => setTimeout(resolve, ms))
+
 interface CSVImportProps {
   onImportComplete: () => void
 }
@@ -53,9 +68,17 @@ export default function CSVImport({ onImportComplete }: CSVImportProps) {
 
     try {
       const response = await buyersApi.import(file)
-      const importResult = response.data
+      let importResult: ImportResult = response.data
       
-      if (importResult.error) {
+      // Imports run in the background; poll the job until it finishes
+      while (importResult.status === 'queued' || importResult.status === 'running') {
+        await sleep(POLL_INTERVAL_MS)
+        importResult = (await buyersApi.importStatus(importResult.id)).data
+      }
+      
+      if (importResult.status === 'failed') {
+        setError(importResult.error || 'Import failed')
+      } else if (importResult.error) {
         setError(importResult.error)
       } else {
         setResult(importResult)
@@ -205,7 +228,7 @@ export default function CSVImport({ onImportComplete }: CSVImportProps) {
               <div className="flex-1">
                 <h3 className="text-sm font-medium text-green-900">Import Completed</h3>
                 <div className="mt-2 text-sm text-green-700">
-                  <div className="grid grid-cols-1 sm:grid-cols-3 gap-4">
+                  <div className="grid grid-cols-1 sm:grid-cols-4 gap-4">
                     <div>
                       <span className="font-medium">Total Rows:</span> {result.total_rows}
                     </div>
@@ -215,6 +238,9 @@ export default function CSVImport({ onImportComplete }: CSVImportProps) {
                     <div>
                       <span className="font-medium text-red-800">Failed:</span> {result.invalid_rows}
                     </div>
+                    <div>
+                      <span className="font-medium text-yellow-800">Duplicates:</span> {result.duplicate_rows}
+                    </div>
                   </div>
                 </div>
               </div>
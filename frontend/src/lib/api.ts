@@ -48,7 +48,12 @@ export const buyersApi = {
   get: (id: string) => api.get(`/leads/buyers/${id}/`),
   update: (id: string, data: any) => api.put(`/leads/buyers/${id}/`, data),
   delete: (id: string) => api.delete(`/leads/buyers/${id}/`),
-  history: (id: string) => api.get(`/leads/buyers/${id}/history/`),
+  bulkUpdate: (ids: string[], patch: any, versions?: Record<string, number>) =>
+    api.patch('/leads/buyers/bulk/', { ids, patch, versions }),
+  bulkDelete: (ids: string[]) => api.delete('/leads/buyers/bulk/', { data: { ids } }),
+  history: (id: string, params?: any) => api.get(`/leads/buyers/${id}/history/`, { params }),
+  recentHistory: (ids: string[], params?: any) =>
+    api.get('/leads/history/', { params: { ...params, buyer_ids: ids.join(',') } }),
   import: (file: File) => {
     const formData = new FormData()
     formData.append('file', file)
@@ -56,6 +61,7 @@ export const buyersApi = {
       headers: { 'Content-Type': 'multipart/form-data' }
     })
   },
+  importStatus: (jobId: string) => api.get(`/leads/import/${jobId}/`),
   export: (params?: any) => api.get('/leads/export/', { 
     params,
     responseType: 'blob'